@@ -0,0 +1,97 @@
+"""
+Online detection of implausible readings (sensor anomalies).
+
+Vibration or a half-placed bottle makes the scale send spikes that are no
+bottle weight at all.  ``AnomalyDetector`` keeps the last ``WINDOW``
+readings of each station and category, as a ring and as a sorted list, and
+scores every new reading with the robust z-score against their median and
+median absolute deviation.  Being unusual is not enough, since a real
+underweight bottle is unusual too: a reading is a sensor anomaly only if it
+also scores above ``THRESHOLD`` and lies more than ``IMPLAUSIBLE_TOLERANCES``
+times the category's tolerance (upper - lower limit) outside its limits.  It
+is then stored with ``ANOMALY_REMARK`` instead of a Pass/Fail verdict and
+left out of every weight statistic.
+
+Memory per station is the window, and each reading costs one insertion and
+one removal in a list of ``WINDOW`` values.  Every reading, anomalous or
+not, enters the window, so a genuine change of level is learned after half
+a window while isolated spikes never move the median.
+"""
+from bisect import bisect_left, insort
+from collections import deque
+
+ANOMALY_REMARK = "Sensor anomaly"
+WINDOW = 51
+# Readings needed before a station is judged at all.
+MIN_READINGS = 10
+THRESHOLD = 6.0
+# How far outside the limits, in tolerances, a weight stops being a possible bottle.
+IMPLAUSIBLE_TOLERANCES = 1.0
+# Floor for the spread, as a fraction of the tolerance (a process with Cp = 2),
+# so a very steady line does not make every small excursion look extreme.
+MIN_SIGMA_FRACTION = 1 / 12
+# Scales the MAD to the standard deviation of a normal distribution.
+MAD_TO_STD = 1.4826
+
+
+class AnomalyDetector:
+    def __init__(self, window=WINDOW, threshold=THRESHOLD, tolerances=IMPLAUSIBLE_TOLERANCES,
+                 min_readings=MIN_READINGS):
+        self.window = window
+        self.threshold = threshold
+        self.tolerances = tolerances
+        self.min_readings = min_readings
+        self.recent = {}
+
+    def score(self, station, category, weight, lower, upper):
+        """Return the robust z-score of a reading, or None while the window is filling."""
+        state = self.recent.get((station, category))
+        if state is None or len(state[0]) < self.min_readings:
+            return None
+        ordered = state[1]
+        median = _median(ordered)
+        sigma = max(MAD_TO_STD * _median_deviation(ordered, median), MIN_SIGMA_FRACTION * (upper - lower))
+        return (weight - median) / sigma if sigma > 0 else None
+
+    def check(self, station, category, weight, lower, upper):
+        """Score a reading, add it to the window and return True if it is an anomaly.
+
+        Without both limits nothing is implausible, so nothing is flagged.
+        """
+        anomaly = False
+        if lower is not None and upper is not None:
+            margin = self.tolerances * (upper - lower)
+            if weight < lower - margin or weight > upper + margin:
+                z = self.score(station, category, weight, lower, upper)
+                anomaly = z is not None and abs(z) > self.threshold
+        state = self.recent.get((station, category))
+        if state is None:
+            state = self.recent[(station, category)] = (deque(), [])
+        ring, ordered = state
+        if len(ring) == self.window:
+            del ordered[bisect_left(ordered, ring.popleft())]
+        ring.append(weight)
+        insort(ordered, weight)
+        return anomaly
+
+
+def _median(ordered):
+    n = len(ordered)
+    mid = n // 2
+    return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _median_deviation(ordered, median):
+    n = len(ordered)
+    split = bisect_left(ordered, median)
+    below, above = split - 1, split
+    # Walk outwards from the median, always taking the smaller deviation.
+    deviations = []
+    for _ in range(n // 2 + 1):
+        if above >= n or (below >= 0 and median - ordered[below] <= ordered[above] - median):
+            deviations.append(median - ordered[below])
+            below -= 1
+        else:
+            deviations.append(ordered[above] - median)
+            above += 1
+    return deviations[n // 2] if n % 2 else (deviations[n // 2 - 1] + deviations[n // 2]) / 2
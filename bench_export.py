@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark the CSV, CSV.gz and Excel export paths on a synthetic database.
+
+    python bench_export.py [rows]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import exporters
+from record_stats import range_statistics
+from rollups import ensure_rollups
+
+
+def build_db(path, rows):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 220.0, 260.0)")
+    cursor.execute("CREATE INDEX idx_records_timestamp ON records (timestamp)")
+    start = datetime(2025, 1, 1)
+    rnd = random.Random(1)
+
+    def gen():
+        for i in range(rows):
+            w = round(rnd.gauss(240.0, 8.0), 2)
+            ts = (start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S")
+            yield ts, w, "Bottle category 1", "Pass" if 220.0 <= w <= 260.0 else "Fail"
+
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", gen())
+    ensure_rollups(cursor)
+    conn.commit()
+    return conn, start.strftime("%Y-%m-%d %H:%M:%S"), (start + timedelta(seconds=rows)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def timed(label, rows, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.2f}s  {rows / elapsed:>12,.0f} rows/s")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {rows:,} row database...")
+        conn, from_dt, to_dt = build_db(os.path.join(tmp, "bench.db"), rows)
+        cursor = conn.cursor()
+        timed("CSV", rows, lambda: exporters.write_csv(cursor, os.path.join(tmp, "out.csv"), from_dt, to_dt))
+        timed("CSV.gz", rows, lambda: exporters.write_csv(cursor, os.path.join(tmp, "out.csv.gz"), from_dt, to_dt))
+        stats = range_statistics(cursor, from_dt, to_dt)
+        timed("Excel", rows, lambda: exporters.write_excel(cursor, os.path.join(tmp, "out.xlsx"), from_dt, to_dt, stats))
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Process capability report across categories.
+
+Each category is analysed in its own worker process: it opens its own
+connection, streams that category's weights from SQLite into a NumPy array
+and returns Cp/Cpk, moments, percentiles, a histogram and a Jarque-Bera
+normality check.  The parent writes everything into one workbook.  With
+many categories the work spreads over all cores.
+
+    python capability_report.py --from "2025-01-01 00:00:00" --to "2025-01-31 23:59:59" --out capability.xlsx
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from openpyxl import Workbook
+
+from exporters import DB_PATH
+from record_stats import load_weights, summarize_weights
+
+HISTOGRAM_BINS = 30
+# Below this p-value the Jarque-Bera test rejects normality, and Cp/Cpk
+# (which assume a normal process) should be read with care.
+NORMALITY_ALPHA = 0.05
+
+SUMMARY_HEADERS = ["Category", "Count", "Fail", "Fail %", "Mean", "Std", "Min", "Max",
+                   "Lower limit", "Upper limit", "Cp", "Cpk", "Skewness", "Excess kurtosis",
+                   "Jarque-Bera", "p-value", "Normal"]
+
+
+def normality(weights):
+    """Return (skewness, excess kurtosis, Jarque-Bera statistic, p-value)."""
+    n = weights.size
+    if n < 3:
+        return None, None, None, None
+    d = weights - weights.mean()
+    m2 = float(np.mean(d * d))
+    if m2 == 0:
+        return None, None, None, None
+    skew = float(np.mean(d ** 3)) / m2 ** 1.5
+    kurt = float(np.mean(d ** 4)) / (m2 * m2) - 3.0
+    jb = n / 6.0 * (skew * skew + kurt * kurt / 4.0)
+    # JB is chi-squared with 2 degrees of freedom, whose survival function is exp(-x/2).
+    return skew, kurt, jb, math.exp(-jb / 2.0)
+
+
+def category_capability(db_path, from_dt, to_dt, category, lower, upper, bins=HISTOGRAM_BINS):
+    """Worker: load one category's weights and compute its capability figures."""
+    conn = sqlite3.connect(db_path)
+    try:
+        w, failed = load_weights(conn.cursor(), from_dt, to_dt, category)
+    finally:
+        conn.close()
+    result = summarize_weights(w, failed=failed, lower=lower, upper=upper)
+    result["category"] = category
+    result["skewness"], result["kurtosis"], result["jarque_bera"], result["p_value"] = normality(w)
+    if w.size:
+        lo = min(w.min(), lower if lower is not None else w.min())
+        hi = max(w.max(), upper if upper is not None else w.max())
+        counts, edges = np.histogram(w, bins=bins, range=(lo, hi if hi > lo else lo + 1))
+        result["histogram"] = list(zip(edges[:-1].tolist(), edges[1:].tolist(), counts.tolist()))
+    else:
+        result["histogram"] = []
+    return result
+
+
+def capability_by_category(db_path, from_dt, to_dt, workers=None, progress=None):
+    """Return the capability figures of every category with records in the range, by name."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, lower_limit, upper_limit FROM categories")
+        limits = {name: (lo, hi) for name, lo, hi in cursor.fetchall()}
+        cursor.execute("SELECT DISTINCT category FROM records WHERE timestamp BETWEEN ? AND ?", (from_dt, to_dt))
+        categories = sorted(r[0] for r in cursor.fetchall())
+    finally:
+        conn.close()
+
+    jobs = [(db_path, from_dt, to_dt, name) + limits.get(name, (None, None)) for name in categories]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    results = {}
+    if workers < 2:
+        for i, job in enumerate(jobs):
+            results[job[3]] = category_capability(*job)
+            if progress:
+                progress(i + 1, len(jobs))
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(category_capability, *job) for job in jobs]
+        for i, future in enumerate(as_completed(futures)):
+            result = future.result()
+            results[result["category"]] = result
+            if progress:
+                progress(i + 1, len(jobs))
+    return results
+
+
+def write_capability_report(db_path, file_path, from_dt, to_dt, workers=None, progress=None):
+    results = capability_by_category(db_path, from_dt, to_dt, workers, progress)
+    wb = Workbook(write_only=True)
+
+    sheet = wb.create_sheet("Capability")
+    sheet.append(["Report", f"{from_dt} to {to_dt}"])
+    sheet.append([])
+    sheet.append(SUMMARY_HEADERS)
+    for name in sorted(results):
+        r = results[name]
+        normal = "" if r["p_value"] is None else ("Yes" if r["p_value"] >= NORMALITY_ALPHA else "No")
+        sheet.append([name, r["count"], r["fail"], 100.0 * r["fail"] / r["count"] if r["count"] else None,
+                      r["mean"], r["std"], r["min"], r["max"], r["lower_limit"], r["upper_limit"],
+                      r["cp"], r["cpk"], r["skewness"], r["kurtosis"], r["jarque_bera"], r["p_value"], normal])
+
+    sheet = wb.create_sheet("Histograms")
+    sheet.append(["Category", "Bin from", "Bin to", "Count"])
+    for name in sorted(results):
+        for lo, hi, n in results[name]["histogram"]:
+            sheet.append([name, lo, hi, n])
+    wb.save(file_path)
+    return results
+
+
+# ---------------- Command line ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cp/Cpk, histograms and normality checks for every category")
+    parser.add_argument("--from", dest="from_dt", required=True, help="YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--to", dest="to_dt", required=True, help="YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--out", required=True, help="output workbook (.xlsx)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = write_capability_report(args.db, args.out, args.from_dt, args.to_dt, args.workers)
+    print(f"Wrote {len(results)} categories to {args.out} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
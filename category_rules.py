@@ -0,0 +1,131 @@
+"""
+Compiled multi-band category rules.
+
+Besides its pass limits a category may have a hard-reject range and a
+warning band inside the limits:
+
+    reject | fail | warn |   pass   | warn | fail | reject
+       reject_lower  lower  warn_lower  warn_upper  upper  reject_upper
+
+Any of the four extra columns may be NULL, which drops that band.  A
+reading's remark stays "Pass" (pass, warn) or "Fail" (fail, reject); the
+band is extra detail for the operator and the API.
+
+``compile_rules`` turns the ``categories`` table into an immutable
+``CategoryRules``: a dict from name to a slot and flat tuples of band edges
+and codes.  Evaluating a reading is one dict lookup and a bisect over at
+most six edges, however many SKUs there are.  The rule set also carries a
+sorted interval index over the pass limits, answering "which categories
+would pass this weight" with one bisect.  When the table changes a new
+object is compiled and swapped in with a single assignment, so readers
+never see a half-built rule set.
+"""
+import math
+from bisect import bisect_right
+
+BANDS = ("reject", "fail", "warn", "pass")
+BAND_COLUMNS = ("reject_lower", "reject_upper", "warn_lower", "warn_upper")
+# Optional Excel upload columns for the band limits
+BAND_HEADERS = {"Reject Lower": "reject_lower", "Reject Upper": "reject_upper",
+                "Warn Lower": "warn_lower", "Warn Upper": "warn_upper"}
+
+_REMARKS = {"reject": "Fail", "fail": "Fail", "warn": "Pass", "pass": "Pass"}
+
+
+def ensure_rule_columns(cursor):
+    cursor.execute("PRAGMA table_info(categories)")
+    existing = {row[1] for row in cursor.fetchall()}
+    for column in BAND_COLUMNS:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE categories ADD COLUMN {column} REAL")
+
+
+def _band_edges(name, lower, upper, reject_lower, reject_upper, warn_lower, warn_upper):
+    """Return (edges, bands) such that bands[bisect_right(edges, w)] is w's band.
+
+    Every band starts at its edge, so an upper-side edge is moved to the
+    next float up: a reading equal to a limit is still inside it.
+    """
+    limits = [(reject_lower, "fail"), (lower, "pass" if warn_lower is None else "warn"),
+              (warn_lower, "pass"), (warn_upper, "warn"), (upper, "fail"), (reject_upper, "reject")]
+    edges, bands = [], ["reject" if reject_lower is not None else "fail"]
+    for i, (edge, band) in enumerate(limits):
+        if edge is None:
+            continue
+        edge = float(edge)
+        if i >= 3:
+            edge = math.nextafter(edge, math.inf)
+        if edges and edge < edges[-1]:
+            raise ValueError(f"Category {name!r}: limits must satisfy reject_lower <= lower <= warn_lower "
+                             f"<= warn_upper <= upper <= reject_upper")
+        edges.append(edge)
+        bands.append(band)
+    return tuple(edges), tuple(BANDS.index(b) for b in bands)
+
+
+class CategoryRules:
+    """Immutable, array-backed rule set compiled from the categories table."""
+
+    def __init__(self, rows):
+        self._slots = {}
+        limits, edges, codes = [], [], []
+        for row in rows:
+            name, lower, upper = row[0], row[1], row[2]
+            e, c = _band_edges(*row)
+            self._slots[name] = len(limits)
+            limits.append((lower, upper))
+            edges.append(e)
+            codes.append(c)
+        self._limits = tuple(limits)
+        self._edges = tuple(edges)
+        self._codes = tuple(codes)
+        self._build_interval_index()
+
+    def _build_interval_index(self):
+        """Split the weight axis at every limit; each segment lists the categories covering it.
+
+        Segment i is [points[i], points[i + 1]); upper limits are moved to
+        the next float up so they stay inclusive.
+        """
+        names = sorted(self._slots, key=self._slots.get)
+        spans = [(float(lo), math.nextafter(float(hi), math.inf), name)
+                 for name, (lo, hi) in zip(names, self._limits) if lo is not None and hi is not None]
+        events = sorted([(lo, 1, name) for lo, hi, name in spans] + [(hi, 0, name) for lo, hi, name in spans])
+        points, covering, active = [], [], {}
+        for point, starts, name in events:
+            if starts:
+                active[name] = None
+            else:
+                del active[name]
+            if points and points[-1] == point:
+                covering[-1] = tuple(active)
+            else:
+                points.append(point)
+                covering.append(tuple(active))
+        self._points = tuple(points)
+        self._covering = tuple(covering)
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def limits(self, name):
+        return self._limits[self._slots[name]]
+
+    def candidates(self, weight):
+        """Return the names of every category whose pass limits contain ``weight``."""
+        i = bisect_right(self._points, weight) - 1
+        return self._covering[i] if i >= 0 else ()
+
+    def evaluate(self, name, weight):
+        """Return (band, remark) for a reading; raises KeyError for an unknown category."""
+        slot = self._slots[name]
+        band = BANDS[self._codes[slot][bisect_right(self._edges[slot], weight)]]
+        return band, _REMARKS[band]
+
+
+def compile_rules(cursor):
+    cursor.execute("SELECT name, lower_limit, upper_limit, " + ", ".join(BAND_COLUMNS) + " FROM categories")
+    return CategoryRules(cursor.fetchall())
@@ -0,0 +1,119 @@
+"""
+Background export jobs.
+
+Exports run one at a time on a worker thread so the Tk thread and the
+ingest route stay responsive.  A job's work function receives the job and
+calls ``job.report(done, total)`` as it goes; that call raises
+``ExportCancelled`` once the job has been cancelled.
+
+A job with an output file writes to ``job.temp_path`` next to it, which is
+moved over ``output_path`` only when the work succeeds; a cancelled or
+failed job removes the temporary file and leaves any existing file alone.
+"""
+import os
+import queue
+import threading
+import time
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob:
+    def __init__(self, job_id, name, work, output_path=None, unit="rows"):
+        self.id = job_id
+        self.name = name
+        self.work = work
+        self.output_path = output_path
+        self.temp_path = None
+        if output_path:
+            directory, name = os.path.split(os.path.abspath(output_path))
+            self.temp_path = os.path.join(directory, f".part-{name}")
+        self.unit = unit
+        self.status = "Queued"
+        self.done = 0
+        self.total = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def report(self, done, total=None):
+        if self._cancel.is_set():
+            raise ExportCancelled()
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == "Queued":
+            self.status = "Cancelled"
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def progress_text(self):
+        if self.total:
+            return f"{self.done:,}/{self.total:,} {self.unit} ({self.done / self.total:.0%})"
+        return f"{self.done:,} {self.unit}"
+
+    def eta_seconds(self):
+        if self.status != "Running" or not self.total or not self.done:
+            return None
+        elapsed = time.monotonic() - self.started
+        return elapsed * (self.total - self.done) / self.done
+
+
+class ExportJobManager:
+    def __init__(self):
+        self.jobs = []
+        self._queue = queue.Queue()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, name, work, output_path=None, unit="rows"):
+        with self._lock:
+            job = ExportJob(self._next_id, name, work, output_path, unit)
+            self._next_id += 1
+            self.jobs.append(job)
+        self._queue.put(job)
+        return job
+
+    def cancel(self, job_id):
+        for job in self.jobs:
+            if job.id == job_id:
+                job.cancel()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job.cancelled:
+                continue
+            job.status = "Running"
+            job.started = time.monotonic()
+            try:
+                job.work(job)
+                if job.temp_path and os.path.exists(job.temp_path):
+                    os.replace(job.temp_path, job.output_path)
+                job.status = "Done"
+            except ExportCancelled:
+                job.status = "Cancelled"
+                self._discard_output(job)
+            except Exception as e:
+                job.status = "Failed"
+                job.error = str(e)
+                self._discard_output(job)
+            finally:
+                job.finished = time.monotonic()
+
+    @staticmethod
+    def _discard_output(job):
+        if job.temp_path and os.path.exists(job.temp_path):
+            try:
+                os.remove(job.temp_path)
+            except OSError:
+                pass
@@ -0,0 +1,300 @@
+"""
+File exporters for record ranges.
+
+Rows are pulled from SQLite in chunks and written as they arrive, so memory
+use does not depend on the size of the range.
+"""
+import argparse
+import csv
+import gzip
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from openpyxl import Workbook
+
+from record_stats import PERCENTILES
+from records_query import iter_records, max_record_rowid
+from rollups import TS_FORMAT, hourly_totals
+
+EXPORT_HEADERS = ["Timestamp", "Captured value (kg)", "Bottle category", "Remark"]
+EXCEL_MAX_ROWS = 1_048_576
+CSV_CHUNK = 50_000
+
+DB_PATH = os.path.join(os.path.expanduser("~"), ".smart_weighing_scale",
+                       r"E:\bengalbevsmartweighingscalebottle-main\scale.db")
+
+
+def summary_rows(stats):
+    rows = [
+        ["", "", "Summary", ""],
+        ["", "", "Number of Pass", stats["pass"]],
+        ["", "", "Number of Fail", stats["fail"]],
+        ["", "", "Sensor anomalies", stats["anomaly"]],
+        ["", "", "Mean weight", stats["mean"]],
+        ["", "", "Std deviation", stats["std"]],
+        ["", "", "Min weight", stats["min"]],
+        ["", "", "Max weight", stats["max"]],
+    ]
+    for name, cat in stats["categories"].items():
+        rows.append(["", "", f"{name} Cp / Cpk",
+                     "" if cat["cp"] is None else f"{cat['cp']:.3f} / {cat['cpk']:.3f}"])
+    return rows
+
+
+class _SheetWriter:
+    """Appends rows to write-only sheets, starting a new one at Excel's row limit."""
+
+    def __init__(self, workbook, title, headers):
+        self.workbook = workbook
+        self.title = title
+        self.headers = headers
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheets = 0
+
+    def new_sheet(self):
+        self.sheets += 1
+        name = self.title if self.sheets == 1 else f"{self.title[:26]} ({self.sheets})"
+        self.sheet = self.workbook.create_sheet(name)
+        self.sheet.append(self.headers)
+        self.sheet_rows = 1
+
+    def append(self, row):
+        if self.sheet is None or self.sheet_rows >= EXCEL_MAX_ROWS:
+            self.new_sheet()
+        self.sheet.append(row)
+        self.sheet_rows += 1
+
+
+def write_excel(cursor, file_path, from_dt, to_dt, stats, progress=None):
+    """Stream a record range to ``file_path`` followed by the summary rows.
+
+    ``progress(rows_written, total_rows)`` is called after every chunk.
+    """
+    wb = Workbook(write_only=True)
+    writer = _SheetWriter(wb, "Records", EXPORT_HEADERS)
+    written = 0
+    for chunk in iter_records(cursor, from_dt, to_dt):
+        for row in chunk:
+            writer.append(row)
+        written += len(chunk)
+        if progress:
+            progress(written, stats["count"] + stats["anomaly"])
+    for row in summary_rows(stats):
+        writer.append(row)
+    wb.save(file_path)
+    return written
+
+
+# ---------------- Multi-sheet report ----------------
+STATISTICS_HEADERS = (["Category", "Count", "Pass", "Fail", "Fail rate", "Anomalies", "Mean", "Std", "Min", "Max"]
+                      + [f"P{p}" for p in PERCENTILES]
+                      + ["Lower limit", "Upper limit", "Cp", "Cpk"])
+_SHEET_NAME_BAD = re.compile(r"[\\/*?:\[\]]")
+
+
+def _sheet_title(name, taken):
+    """Excel sheet names are at most 31 characters and may not contain []:*?/\\."""
+    base = _SHEET_NAME_BAD.sub("_", name or "(none)")[:31]
+    title, n = base, 1
+    while title.lower() in taken:
+        n += 1
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+    taken.add(title.lower())
+    return title
+
+
+def statistics_rows(stats):
+    rows = []
+    for name, s in [("All", stats)] + sorted(stats["categories"].items()):
+        pct = s.get("percentiles") or {}
+        rows.append([name, s["count"], s["pass"], s["fail"],
+                     s["fail"] / s["count"] if s["count"] else None, s["anomaly"],
+                     s["mean"], s["std"], s["min"], s["max"]]
+                    + [pct.get(f"p{p}") for p in PERCENTILES]
+                    + [s.get("lower_limit"), s.get("upper_limit"), s.get("cp"), s.get("cpk")])
+    return rows
+
+
+def pivot_rows(cursor, from_dt, to_dt, categories):
+    """Hour x category pass/fail/fail-rate table built from the hourly rollups."""
+    totals = hourly_totals(cursor, from_dt, to_dt, by_category=True)
+    headers = ["Hour"]
+    for name in categories + ["Total"]:
+        headers += [f"{name} Pass", f"{name} Fail", f"{name} Fail rate"]
+    rows = []
+    for hour in sorted({hour for hour, _ in totals}):
+        row = [hour + ":00"]
+        n_all = pass_all = fail_all = 0
+        for name in categories:
+            n, n_pass, n_fail, _, _ = totals.get((hour, name), (0, 0, 0, 0.0, 0))
+            row += [n_pass, n_fail, n_fail / n if n else None]
+            n_all += n
+            pass_all += n_pass
+            fail_all += n_fail
+        row += [pass_all, fail_all, fail_all / n_all if n_all else None]
+        rows.append(row)
+    return headers, rows
+
+
+def write_excel_report(cursor, file_path, from_dt, to_dt, stats, progress=None):
+    """Write a report workbook: statistics, an hour x category pivot, then one sheet per category.
+
+    The statistics and pivot come from ``stats`` and the rollups; the records
+    are read once and each row is appended to its category's sheet, so the
+    cost is the row writing regardless of how many categories there are.
+    """
+    wb = Workbook(write_only=True)
+    categories = sorted(stats["categories"])
+
+    sheet = wb.create_sheet("Statistics")
+    sheet.append(["Report", f"{from_dt} to {to_dt}"])
+    sheet.append([])
+    sheet.append(STATISTICS_HEADERS)
+    for row in statistics_rows(stats):
+        sheet.append(row)
+
+    headers, rows = pivot_rows(cursor, from_dt, to_dt, categories)
+    sheet = wb.create_sheet("Pivot")
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(row)
+
+    taken = {"statistics", "pivot"}
+    writers = {}
+    for name in categories:
+        writers[name] = _SheetWriter(wb, _sheet_title(name, taken), EXPORT_HEADERS)
+        writers[name].new_sheet()
+    written = 0
+    for chunk in iter_records(cursor, from_dt, to_dt):
+        for row in chunk:
+            writer = writers.get(row[2])
+            if writer is None:
+                writer = writers[row[2]] = _SheetWriter(wb, _sheet_title(row[2], taken), EXPORT_HEADERS)
+            writer.append(row)
+        written += len(chunk)
+        if progress:
+            progress(written, stats["count"] + stats["anomaly"])
+    wb.save(file_path)
+    return written
+
+
+def write_csv(cursor, file_path, from_dt, to_dt, category=None, total=None, progress=None,
+              min_rowid=None, max_rowid=None):
+    """Stream a record range to CSV; a ``.gz`` path is gzip-compressed.
+
+    With ``min_rowid`` only rows inserted after that rowid are written, in
+    insertion order.
+    """
+    if file_path.endswith(".gz"):
+        f = gzip.open(file_path, "wt", newline="", encoding="utf-8", compresslevel=6)
+    else:
+        f = open(file_path, "w", newline="", encoding="utf-8")
+    written = 0
+    with f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADERS)
+        for chunk in iter_records(cursor, from_dt, to_dt, category, chunk_size=CSV_CHUNK,
+                                  min_rowid=min_rowid, max_rowid=max_rowid,
+                                  rowid_order=min_rowid is not None, descending=min_rowid is None):
+            writer.writerows(chunk)
+            written += len(chunk)
+            if progress:
+                progress(written, total)
+    return written
+
+
+# ---------------- Incremental exports ----------------
+def ensure_export_watermarks(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS export_watermarks
+                      (target TEXT PRIMARY KEY, last_rowid INTEGER NOT NULL, updated_at TEXT)""")
+
+
+def export_watermark(cursor, target):
+    """Return the last rowid exported to ``target`` (0 if it has never run)."""
+    ensure_export_watermarks(cursor)
+    cursor.execute("SELECT last_rowid FROM export_watermarks WHERE target = ?", (target,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def export_since_last(cursor, target, file_path, category=None, progress=None):
+    """Export the rows inserted since ``target``'s last successful export.
+
+    The batch is pinned to MAX(rowid) at start and written to a temporary
+    file next to ``file_path``.  The watermark is then claimed with a
+    compare-and-set inside a transaction, the file moved into place with
+    ``os.replace``, and only then is the transaction committed.  A failed
+    run, including one that lost the compare-and-set to another run, leaves
+    neither a new file nor a moved watermark, so the next run simply picks
+    up the same rows again.  Returns the number of rows written; when there
+    is nothing new no file is written.
+    """
+    conn = cursor.connection
+    last = export_watermark(cursor, target)
+    conn.commit()
+    upto = max_record_rowid(cursor)
+    if upto <= last:
+        return 0
+
+    directory, name = os.path.split(os.path.abspath(file_path))
+    tmp_path = os.path.join(directory, f".part-{name}")
+    try:
+        n = write_csv(cursor, tmp_path, None, None, category, total=upto - last, progress=progress,
+                      min_rowid=last, max_rowid=upto)
+        cursor.execute("""
+            INSERT INTO export_watermarks (target, last_rowid, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(target) DO UPDATE SET last_rowid = excluded.last_rowid, updated_at = excluded.updated_at
+            WHERE export_watermarks.last_rowid = ?
+        """, (target, upto, datetime.now().strftime(TS_FORMAT), last))
+        if cursor.rowcount != 1:
+            raise RuntimeError(f"Export target {target!r} was advanced by another run; rows may be duplicated")
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        conn.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    conn.commit()
+    return n
+
+
+# ---------------- Command line ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export weighing records without the GUI")
+    parser.add_argument("format", choices=["csv"])
+    parser.add_argument("--from", dest="from_dt", help="YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--to", dest="to_dt", help="YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--since-last", metavar="TARGET",
+                        help="export only rows added since TARGET's last successful export")
+    parser.add_argument("--out", required=True, help="output file (.csv or .csv.gz)")
+    parser.add_argument("--category")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+    if not args.since_last and not (args.from_dt and args.to_dt):
+        parser.error("give --from and --to, or --since-last")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        start = time.perf_counter()
+        if args.since_last:
+            n = export_since_last(conn.cursor(), args.since_last, args.out, args.category)
+        else:
+            n = write_csv(conn.cursor(), args.out, args.from_dt, args.to_dt, args.category)
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+    if args.since_last and not n:
+        print(f"No new rows for {args.since_last}")
+        return 0
+    print(f"Exported {n} rows to {args.out} in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Post-verdict analytics worker.
+
+``/send_weight`` stores the verdict and then hands the reading to
+``IngestWorker.submit``, which only puts a tuple on a queue.  The worker
+thread feeds each reading to its handlers with its own SQLite connection
+and commits once per drained batch, so analytics never add to the latency
+of the verdict.
+
+A handler provides ``process(cursor, station, category, weight, lower,
+upper, timestamp)`` and may provide ``flush(cursor)``, which is called
+about every ``FLUSH_SECONDS``.  Sensor anomalies are submitted with
+``anomaly=True`` and only reach ``anomaly_handlers``, the handlers that
+count bottles rather than use their weight.  ``stop`` processes whatever is still
+queued and flushes every handler once more before the thread ends.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+FLUSH_SECONDS = 10
+_STOP = object()
+
+
+class IngestWorker:
+    def __init__(self, db_path, handlers, anomaly_handlers=()):
+        self.db_path = db_path
+        self.handlers = handlers
+        self.anomaly_handlers = anomaly_handlers
+        self._all_handlers = list(handlers) + [h for h in anomaly_handlers if h not in handlers]
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=FLUSH_SECONDS):
+        """Drain the queue, flush the handlers and wait for the thread to end."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, station, category, weight, lower, upper, timestamp, anomaly=False):
+        self._queue.put((anomaly, (station, category, weight, lower, upper, timestamp)))
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            stopping = False
+            try:
+                while item is not None:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    anomaly, reading = item
+                    for handler in self.anomaly_handlers if anomaly else self.handlers:
+                        handler.process(cursor, *reading)
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = None
+                if stopping or time.monotonic() - last_flush >= FLUSH_SECONDS:
+                    for handler in self._all_handlers:
+                        if hasattr(handler, "flush"):
+                            handler.flush(cursor)
+                    last_flush = time.monotonic()
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Ingest analytics failed: {e}")
+            if stopping:
+                conn.close()
+                return
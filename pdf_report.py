@@ -0,0 +1,539 @@
+"""
+PDF report rendering.
+
+Kept free of any Tk imports so pages can be rendered in worker processes.
+Large reports are split into page ranges, rendered in a process pool and
+concatenated with pypdf; without pypdf, or on a single core, they are
+rendered sequentially.  ``render_summary_pdf`` produces the condensed
+statistical report, whose length and memory do not depend on the number
+of rows: it reads the weights once, a chunk at a time.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
+
+from anomaly_detector import ANOMALY_REMARK
+from record_stats import range_statistics
+from records_query import iter_records, iter_rows, count_records, max_record_rowid
+from rollups import bucket_rollups
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+# Write compressed PDF streams as binary instead of ASCII85 text (~25% smaller)
+rl_config.useA85 = 0
+
+# Coca‑Cola theme (same values as the GUI)
+PRIMARY_COLOR = "#E41E2B"
+SUBTEXT_COLOR = "#555555"
+
+ROWS_PER_PAGE = 20
+PARALLEL_MIN_PAGES = 200
+PAGES_PER_PART = 100
+
+
+
+def render_pdf(filepath, rows, from_dt, to_dt, progress=None, total_rows=None,
+               page_offset=0, page_total=None, generated=None):
+    """Render ``rows`` (any iterable) as report pages and return the page count.
+
+    Rows are consumed one page at a time.  ``total_rows`` is needed for the
+    "Page X/Y" footer unless ``rows`` is a list or ``page_total`` is given.
+    ``page_offset``/``page_total`` number the pages when this file is one
+    part of a larger report; ``generated`` keeps the header timestamp the
+    same across parts.
+    """
+    page_w, page_h = A4
+    margin_l = 15*mm
+    margin_r = 15*mm
+    margin_b = 18*mm
+
+    header_h = 22*mm
+    row_h = 8.5*mm
+    max_rows_per_page = ROWS_PER_PAGE
+
+    cols = [
+        ("Timestamp", 0.34),
+        ("Captured value (kg)", 0.20),
+        ("Bottle category", 0.26),
+        ("Remark", 0.20),
+    ]
+    table_w = page_w - margin_l - margin_r
+
+    # Per-page x offsets of each column's text
+    col_x = []
+    x = margin_l
+    for title, frac in cols:
+        col_x.append(x + 2.5*mm)
+        x += table_w * frac
+
+    c = canvas.Canvas(filepath, pagesize=A4, pageCompression=1)
+
+    try:
+        coca_reader = ImageReader("coca_logo.png")
+    except Exception:
+        coca_reader = None
+    try:
+        bengal_reader = ImageReader("bengal_beverages.png")
+    except Exception:
+        bengal_reader = None
+
+    table_top = page_h - header_h - 10*mm
+    generated = generated or datetime.now().strftime("Generated: %Y-%m-%d %H:%M:%S")
+
+    # Everything that is identical on every page (header band, logos and
+    # table header) is recorded once as a form XObject and referenced
+    # from each page instead of being redrawn.
+    c.beginForm("page_chrome")
+    c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+    c.rect(0, page_h - header_h, page_w, header_h, fill=1, stroke=0)
+    c.rect(margin_l, table_top - row_h, table_w, row_h, fill=1, stroke=0)
+
+    c.setFillColor(colors.white)
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(margin_l, page_h - header_h + 12*mm, "Smart Weighing Scale — Report")
+    c.setFont("Helvetica", 9)
+    c.drawString(margin_l, page_h - header_h + 8*mm, f"From: {from_dt}   To: {to_dt}")
+    c.drawString(margin_l, page_h - header_h + 4*mm, generated)
+    c.setFont("Helvetica-Bold", 9)
+    for (title, frac), x in zip(cols, col_x):
+        c.drawString(x, table_top - row_h + 2.8*mm, title)
+
+    if coca_reader:
+        c.drawImage(coca_reader, page_w - margin_r - 35*mm, page_h - header_h + 5*mm,
+                    width=35*mm, height=12*mm, mask='auto')
+    if bengal_reader:
+        c.drawImage(bengal_reader, page_w - margin_r - 50*mm, page_h - header_h + 5*mm,
+                    width=12*mm, height=12*mm, mask='auto')
+    c.endForm()
+
+    stripe = colors.HexColor("#FFF5F6")
+    footer = colors.HexColor(SUBTEXT_COLOR)
+    y_start = table_top - 2
+
+    if total_rows is None and page_total is None:
+        total_rows = len(rows)
+    pages = None if total_rows is None else (total_rows + max_rows_per_page - 1) // max_rows_per_page
+    page_total = page_total or pages
+
+    rows = iter(rows)
+    p = 0
+    while True:
+        page_rows = list(islice(rows, max_rows_per_page))
+        if not page_rows:
+            break
+        first = p * max_rows_per_page
+        c.doForm("page_chrome")
+
+        # Odd rows get a tinted band; even rows sit on the white page.
+        c.setFillColor(stripe)
+        for r in range(len(page_rows)):
+            if (first + r) % 2:
+                c.rect(margin_l, y_start - (r + 1)*row_h, table_w, row_h, fill=1, stroke=0)
+
+        # One text object per page: font and colour are set once.
+        text = c.beginText()
+        text.setFont("Helvetica", 9)
+        text.setFillColor(colors.black)
+        for r, row in enumerate(page_rows):
+            y_text = y_start - (r + 1)*row_h + 2.8*mm
+            for x, value in zip(col_x, (str(row[0]), f"{row[1]:.4f}", str(row[2]), str(row[3]))):
+                text.setTextOrigin(x, y_text)
+                text.textOut(value)
+        c.drawText(text)
+
+        c.setFont("Helvetica", 9)
+        c.setFillColor(footer)
+        c.drawRightString(page_w - margin_r, margin_b/2, f"Page {page_offset + p + 1}/{page_total}")
+        c.showPage()
+        p += 1
+        if progress:
+            progress(p, pages)
+
+    c.save()
+    return p
+
+
+# ---------------- Range rendering ----------------
+def render_range_pdf(db_path, filepath, from_dt, to_dt, total_rows, progress=None, workers=None):
+    """Render every record in a range, in parallel when it is worth it."""
+    pages = (total_rows + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE
+    workers = workers or os.cpu_count() or 1
+    if PdfWriter is None or workers < 2 or pages < PARALLEL_MIN_PAGES:
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            # Pin the range to the rows that exist now so the page count
+            # stays right while ingest keeps appending.
+            max_rowid = max_record_rowid(cursor)
+            total = count_records(cursor, from_dt, to_dt, max_rowid=max_rowid)
+            rows = iter_rows(iter_records(cursor, from_dt, to_dt, max_rowid=max_rowid))
+            render_pdf(filepath, rows, from_dt, to_dt, progress, total_rows=total)
+        finally:
+            conn.close()
+        return
+    _render_parallel(db_path, filepath, from_dt, to_dt, progress, workers)
+
+
+def _part_starts(db_path, from_dt, to_dt, rows_per_part):
+    # One pass over the timestamp index picks the (timestamp, rowid) key each
+    # part starts at, so every worker seeks straight to its slice.
+    conn = sqlite3.connect(db_path)
+    try:
+        starts = []
+        seen = 0
+        for chunk in iter_records(conn.cursor(), from_dt, to_dt, columns=("timestamp", "rowid"),
+                                  chunk_size=rows_per_part):
+            starts.append(chunk[0])
+            seen += len(chunk)
+        return starts, seen
+    finally:
+        conn.close()
+
+
+def _render_part(db_path, part_path, from_dt, to_dt, start_key, n_rows, page_offset, page_total, generated):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = iter_rows(iter_records(conn.cursor(), from_dt, to_dt, start_key=start_key, limit=n_rows))
+        return render_pdf(part_path, rows, from_dt, to_dt, page_offset=page_offset,
+                          page_total=page_total, generated=generated)
+    finally:
+        conn.close()
+
+
+def _render_parallel(db_path, filepath, from_dt, to_dt, progress, workers):
+    rows_per_part = PAGES_PER_PART * ROWS_PER_PAGE
+    starts, total_rows = _part_starts(db_path, from_dt, to_dt, rows_per_part)
+    page_total = (total_rows + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE
+    generated = datetime.now().strftime("Generated: %Y-%m-%d %H:%M:%S")
+
+    tmp_dir = tempfile.mkdtemp(prefix="swsreport_")
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        parts = [os.path.join(tmp_dir, f"part{i:05d}.pdf") for i in range(len(starts))]
+        futures = [
+            pool.submit(_render_part, db_path, parts[i], from_dt, to_dt, start, rows_per_part,
+                        i * PAGES_PER_PART, page_total, generated)
+            for i, start in enumerate(starts)
+        ]
+        done_pages = 0
+        for future in as_completed(futures):
+            done_pages += future.result()
+            if progress:
+                progress(done_pages, page_total)
+
+        writer = PdfWriter()
+        for part in parts:
+            writer.append(part)
+        writer.write(filepath)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# ---------------- Condensed statistical report ----------------
+XBAR_SUBGROUP = 5
+# Shewhart constants for subgroups of 5
+XBAR_A2, R_D3, R_D4 = 0.577, 0.0, 2.114
+CHART_SUBGROUPS = 100
+HISTOGRAM_BINS = 30
+
+
+class ControlChart:
+    """X-bar/R statistics over consecutive subgroups of a stream of weights.
+
+    Weights are added chunk by chunk in order.  Limits use every complete
+    subgroup added; at most ``points`` subgroups, spread evenly over the
+    ``expected`` number of weights, are kept for plotting, so memory stays
+    at one chunk whatever the size of the range.
+    """
+
+    def __init__(self, expected, subgroup=XBAR_SUBGROUP, points=CHART_SUBGROUPS):
+        k = expected // subgroup
+        self.pick = np.unique(np.linspace(0, k - 1, min(points, k)).astype(int))
+        self.subgroup = subgroup
+        self.carry = np.array([])
+        self.subgroups = 0
+        self.mean_sum = self.range_sum = 0.0
+        self.means, self.ranges = [], []
+
+    def add(self, weights):
+        w = np.concatenate((self.carry, weights))
+        k = w.size // self.subgroup
+        self.carry = w[k * self.subgroup:]
+        if not k:
+            return
+        groups = w[:k * self.subgroup].reshape(k, self.subgroup)
+        means = groups.mean(axis=1)
+        ranges = groups.max(axis=1) - groups.min(axis=1)
+        self.mean_sum += float(means.sum())
+        self.range_sum += float(ranges.sum())
+        first, last = np.searchsorted(self.pick, (self.subgroups, self.subgroups + k))
+        keep = self.pick[first:last] - self.subgroups
+        self.means.append(means[keep])
+        self.ranges.append(ranges[keep])
+        self.subgroups += k
+
+    def result(self):
+        """Return the chart figures, or None with fewer than two subgroups."""
+        k = self.subgroups
+        if k < 2:
+            return None
+        xbarbar, rbar = self.mean_sum / k, self.range_sum / k
+        return {
+            "means": np.concatenate(self.means), "ranges": np.concatenate(self.ranges), "subgroups": k,
+            "xbar": xbarbar, "xbar_ucl": xbarbar + XBAR_A2 * rbar, "xbar_lcl": xbarbar - XBAR_A2 * rbar,
+            "rbar": rbar, "r_ucl": R_D4 * rbar, "r_lcl": R_D3 * rbar,
+        }
+
+
+def _weight_figures(cursor, from_dt, to_dt, category, stats):
+    """Stream the range's valid weights once into a histogram and X-bar/R chart.
+
+    The histogram's edges come from the range's min and max, so each chunk
+    is binned as it arrives.  Rows added after ``stats`` was computed may
+    show up in the limits but never change the plotted subgroups.
+    """
+    if not stats["count"]:
+        return None, None, None
+    counts = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    edges = None
+    chart = ControlChart(stats["count"])
+    max_rowid = max_record_rowid(cursor)
+    for chunk in iter_records(cursor, from_dt, to_dt, category, columns=("weight",), chunk_size=100_000,
+                              descending=False, max_rowid=max_rowid, exclude_remark=ANOMALY_REMARK):
+        w = np.fromiter((r[0] for r in chunk), dtype=float, count=len(chunk))
+        binned, edges = np.histogram(w, bins=HISTOGRAM_BINS, range=(stats["min"], stats["max"]))
+        counts += binned
+        chart.add(w)
+    return counts, edges, chart.result()
+
+
+def _period_granularity(from_dt, to_dt):
+    try:
+        days = (datetime.strptime(to_dt, "%Y-%m-%d %H:%M:%S") -
+                datetime.strptime(from_dt, "%Y-%m-%d %H:%M:%S")).total_seconds() / 86400
+    except ValueError:
+        return "day"
+    if days <= 2:
+        return "hour"
+    if days <= 14:
+        return "shift"
+    return "day"
+
+
+def _fmt(value, spec=".4f"):
+    return "—" if value is None else format(value, spec)
+
+
+def render_summary_pdf(cursor, filepath, from_dt, to_dt, category=None, progress=None):
+    """Render a few-page statistical summary of a range instead of every row."""
+    stats = range_statistics(cursor, from_dt, to_dt, category)
+    counts, edges, chart = _weight_figures(cursor, from_dt, to_dt, category, stats)
+    granularity = _period_granularity(from_dt, to_dt)
+    periods = bucket_rollups(cursor, from_dt, to_dt, granularity, category)
+    if progress:
+        progress(1, 4)
+
+    page_w, page_h = A4
+    margin = 15*mm
+    header_h = 22*mm
+    c = canvas.Canvas(filepath, pagesize=A4, pageCompression=1)
+    generated = datetime.now().strftime("Generated: %Y-%m-%d %H:%M:%S")
+    pages = [0]
+
+    def new_page(title):
+        if pages[0]:
+            c.showPage()
+        pages[0] += 1
+        c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+        c.rect(0, page_h - header_h, page_w, header_h, fill=1, stroke=0)
+        c.setFillColor(colors.white)
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(margin, page_h - header_h + 12*mm, "Smart Weighing Scale — Summary Report")
+        c.setFont("Helvetica", 9)
+        scope = f"   Category: {category}" if category else ""
+        c.drawString(margin, page_h - header_h + 8*mm, f"From: {from_dt}   To: {to_dt}{scope}")
+        c.drawString(margin, page_h - header_h + 4*mm, generated)
+        c.setFillColor(colors.HexColor(SUBTEXT_COLOR))
+        c.drawRightString(page_w - margin, 9*mm, f"Page {pages[0]}")
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(margin, page_h - header_h - 10*mm, title)
+        return page_h - header_h - 16*mm
+
+    def table(y, headers, widths, rows, title):
+        row_h = 6.5*mm
+        x_pos = [margin + sum(widths[:i]) for i in range(len(widths))]
+        for i, row in enumerate([headers] + rows):
+            if y < 20*mm:
+                y = new_page(title + " (continued)")
+                c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+                c.rect(margin, y - row_h, sum(widths), row_h, fill=1, stroke=0)
+                c.setFillColor(colors.white)
+                c.setFont("Helvetica-Bold", 8)
+                for x, v in zip(x_pos, headers):
+                    c.drawString(x + 2*mm, y - row_h + 2.2*mm, str(v))
+                y -= row_h
+            if i == 0:
+                c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+                c.rect(margin, y - row_h, sum(widths), row_h, fill=1, stroke=0)
+                c.setFillColor(colors.white)
+                c.setFont("Helvetica-Bold", 8)
+            else:
+                if i % 2 == 0:
+                    c.setFillColor(colors.HexColor("#FFF5F6"))
+                    c.rect(margin, y - row_h, sum(widths), row_h, fill=1, stroke=0)
+                c.setFillColor(colors.black)
+                c.setFont("Helvetica", 8)
+            for x, v in zip(x_pos, row):
+                c.drawString(x + 2*mm, y - row_h + 2.2*mm, str(v))
+            y -= row_h
+        return y - 6*mm
+
+    # Page 1: executive summary and per-category table
+    y = new_page("Executive summary")
+    n = stats["count"]
+    fail_rate = stats["fail"] / n if n else 0.0
+    figures = [
+        ("Bottles", f"{n:,}"), ("Pass", f"{stats['pass']:,}"), ("Fail", f"{stats['fail']:,}"),
+        ("Fail rate", f"{fail_rate:.2%}"), ("Mean weight", _fmt(stats["mean"])),
+        ("Std deviation", _fmt(stats["std"])), ("Min weight", _fmt(stats["min"])),
+        ("Max weight", _fmt(stats["max"])), ("Sensor anomalies", f"{stats['anomaly']:,}"),
+    ]
+    box_w = (page_w - 2*margin) / 4
+    for i, (label, value) in enumerate(figures):
+        bx = margin + (i % 4) * box_w
+        by = y - (i // 4 + 1) * 16*mm
+        c.setFillColor(colors.HexColor("#FFF5F6"))
+        c.rect(bx + 1*mm, by, box_w - 2*mm, 14*mm, fill=1, stroke=0)
+        c.setFillColor(colors.HexColor(SUBTEXT_COLOR))
+        c.setFont("Helvetica", 8)
+        c.drawString(bx + 3*mm, by + 9.5*mm, label)
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(bx + 3*mm, by + 3*mm, value)
+    y -= -(-len(figures) // 4) * 16*mm + 8*mm
+
+    cat_rows = []
+    for name, cat in stats["categories"].items():
+        cat_rows.append([name, f"{cat['count']:,}", f"{cat['pass']:,}", f"{cat['fail']:,}",
+                         _fmt(cat["mean"]), _fmt(cat["std"]), _fmt(cat["cp"], ".2f"), _fmt(cat["cpk"], ".2f")])
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(margin, y, "By category")
+    y = table(y - 3*mm, ["Category", "Bottles", "Pass", "Fail", "Mean", "Std dev", "Cp", "Cpk"],
+              [50*mm, 20*mm, 18*mm, 18*mm, 22*mm, 20*mm, 16*mm, 16*mm], cat_rows, "By category")
+    if progress:
+        progress(2, 4)
+
+    # Page 2: histogram and control charts
+    y = new_page("Weight distribution and control charts")
+    if edges is not None:
+        _draw_histogram(c, margin, y - 70*mm, page_w - 2*margin, 65*mm, counts, edges,
+                        [(cat["lower_limit"], cat["upper_limit"]) for cat in stats["categories"].values()])
+    if chart:
+        w = page_w - 2*margin - 22*mm  # room for the limit labels
+        _draw_line_chart(c, margin, y - 145*mm, w, 60*mm, chart["means"],
+                         chart["xbar"], chart["xbar_lcl"], chart["xbar_ucl"],
+                         f"X-bar chart (subgroups of {XBAR_SUBGROUP}, {chart['subgroups']:,} total)")
+        _draw_line_chart(c, margin, y - 215*mm, w, 55*mm, chart["ranges"],
+                         chart["rbar"], chart["r_lcl"], chart["r_ucl"], "R chart")
+    if progress:
+        progress(3, 4)
+
+    # Remaining pages: per-period table
+    period_rows = [[label, f"{cnt:,}", f"{n_pass:,}", f"{n_fail:,}", f"{rate:.2%}", f"{mean:.4f}", f"{n_anomaly:,}"]
+                   for label, _, _, cnt, n_pass, n_fail, rate, mean, n_anomaly in periods]
+    title = {"hour": "By hour", "shift": "By shift", "day": "By day"}[granularity]
+    y = new_page(title)
+    table(y, ["Period", "Bottles", "Pass", "Fail", "Fail rate", "Mean weight", "Anomalies"],
+          [46*mm, 22*mm, 22*mm, 22*mm, 22*mm, 26*mm, 20*mm], period_rows, title)
+    c.showPage()
+    c.save()
+    if progress:
+        progress(4, 4)
+
+
+def _draw_histogram(c, x, y, w, h, counts, edges, limits):
+    c.setFont("Helvetica-Bold", 10)
+    c.setFillColor(colors.black)
+    c.drawString(x, y + h + 2*mm, "Weight histogram")
+    lo, hi = float(edges[0]), float(edges[-1])
+    span = (hi - lo) or 1.0
+    top = float(counts.max()) or 1.0
+    bar_w = w / len(counts)
+    c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+    for i, n in enumerate(counts):
+        if n:
+            c.rect(x + i * bar_w, y, bar_w * 0.9, h * n / top, fill=1, stroke=0)
+    c.setStrokeColor(colors.black)
+    c.line(x, y, x + w, y)
+    c.setFont("Helvetica", 7)
+    c.setFillColor(colors.HexColor(SUBTEXT_COLOR))
+    for v in np.linspace(lo, hi, 6):
+        c.drawCentredString(x + w * (v - lo) / span, y - 4*mm, f"{v:.1f}")
+    # Category limits that fall inside the plotted range
+    c.setStrokeColor(colors.HexColor(SUBTEXT_COLOR))
+    c.setDash(2, 2)
+    for limit in {v for pair in limits for v in pair if v is not None}:
+        if lo <= limit <= hi:
+            lx = x + w * (limit - lo) / span
+            c.line(lx, y, lx, y + h)
+    c.setDash()
+
+
+def _draw_line_chart(c, x, y, w, h, values, center, lcl, ucl, title):
+    c.setFont("Helvetica-Bold", 10)
+    c.setFillColor(colors.black)
+    c.drawString(x, y + h + 2*mm, title)
+    lo = min(float(values.min()), lcl)
+    hi = max(float(values.max()), ucl)
+    pad = (hi - lo) * 0.05 or 1.0
+    lo, hi = lo - pad, hi + pad
+
+    def sy(v):
+        return y + h * (v - lo) / (hi - lo)
+
+    c.setStrokeColor(colors.black)
+    c.rect(x, y, w, h, fill=0, stroke=1)
+    c.setFont("Helvetica", 7)
+    for v, label, dash in ((ucl, "UCL", (3, 2)), (center, "CL", ()), (lcl, "LCL", (3, 2))):
+        c.setStrokeColor(colors.HexColor(SUBTEXT_COLOR))
+        if dash:
+            c.setDash(*dash)
+        else:
+            c.setDash()
+        c.line(x, sy(v), x + w, sy(v))
+        c.setFillColor(colors.HexColor(SUBTEXT_COLOR))
+        c.drawString(x + w + 1*mm, sy(v) - 1*mm, f"{label} {v:.3f}")
+    c.setDash()
+
+    step = w / max(len(values) - 1, 1)
+    path = c.beginPath()
+    for i, v in enumerate(values):
+        px, py = x + i * step, sy(float(v))
+        if i:
+            path.lineTo(px, py)
+        else:
+            path.moveTo(px, py)
+    c.setStrokeColor(colors.HexColor(PRIMARY_COLOR))
+    c.drawPath(path, stroke=1, fill=0)
+    out = (values > ucl) | (values < lcl)
+    c.setFillColor(colors.HexColor(PRIMARY_COLOR))
+    for i in np.flatnonzero(out):
+        c.circle(x + i * step, sy(float(values[i])), 1.2*mm, fill=1, stroke=0)
+    c.setStrokeColor(colors.black)
@@ -0,0 +1,228 @@
+"""
+Mergeable quantile sketches per hour, category and station.
+
+Each (hour, category, station) keeps a t-digest in ``rollup_sketches``.  The
+ingest worker adds every reading to an in-memory digest for the open hour
+and writes it back every few seconds; a range query merges the stored
+digests of its full hours plus the raw weights of the partial hours at the
+edges, so any percentile over any range needs a few hundred centroids per
+hour in memory, never the records themselves.
+"""
+import math
+
+import numpy as np
+
+from anomaly_detector import ANOMALY_REMARK
+from records_query import iter_records
+from rollups import VALID_SQL, full_hour_span
+
+COMPRESSION = 100
+BUFFER_SIZE = 500
+
+
+class TDigest:
+    """Merging t-digest (Dunning) with the arcsine scale function.
+
+    Centroids are kept as two NumPy arrays; added values are buffered and
+    folded in ``BUFFER_SIZE`` at a time.  With the default compression a
+    digest is about 60 centroids and estimates are typically within 0.1
+    percentile ranks, tightest in the tails.
+    """
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.counts = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    @property
+    def n(self):
+        return int(self.counts.sum()) + len(self._buffer)
+
+    def add(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._compress()
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.size:
+            self._fold(values, np.ones(values.size))
+
+    def merge(self, other):
+        other._compress()
+        if other.counts.size:
+            self._fold(other.means, other.counts, other.min, other.max)
+        return self
+
+    def _compress(self):
+        if self._buffer:
+            values = np.asarray(self._buffer, dtype=float)
+            self._buffer = []
+            self._fold(values, np.ones(values.size))
+
+    def _fold(self, means, counts, lo=None, hi=None):
+        self.min = min(self.min, means.min() if lo is None else lo)
+        self.max = max(self.max, means.max() if hi is None else hi)
+        means = np.concatenate([self.means, means])
+        counts = np.concatenate([self.counts, counts])
+        order = np.argsort(means, kind="stable")
+        means, counts = means[order], counts[order]
+        total = counts.sum()
+        # Each output centroid may span one unit of k = d/(2 pi) * asin(2q - 1).
+        k_scale = self.compression / (2 * math.pi)
+        cum = np.cumsum(counts)
+        k = k_scale * np.arcsin(np.clip(2 * cum / total - 1, -1, 1))
+        out_means, out_counts = [], []
+        m, c = means[0], counts[0]
+        k_start = k_scale * np.arcsin(-1.0)
+        for i in range(1, len(means)):
+            if k[i] - k_start <= 1.0:
+                c_new = c + counts[i]
+                m += (means[i] - m) * counts[i] / c_new
+                c = c_new
+            else:
+                out_means.append(m)
+                out_counts.append(c)
+                k_start = k[i - 1]
+                m, c = means[i], counts[i]
+        out_means.append(m)
+        out_counts.append(c)
+        self.means = np.array(out_means)
+        self.counts = np.array(out_counts)
+
+    def quantiles(self, qs):
+        """Return the values at quantiles ``qs`` (0..1), or None when empty."""
+        self._compress()
+        if not self.counts.size:
+            return [None for _ in qs]
+        if self.counts.size == 1:
+            return [float(self.means[0]) for _ in qs]
+        # Centroid i covers ranks around its centre; interpolate between
+        # centres and pin the ends to the exact min and max.
+        cum = np.cumsum(self.counts)
+        centres = cum - self.counts / 2
+        xs = np.concatenate([[0.0], centres, [cum[-1]]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return [float(v) for v in np.interp(np.asarray(qs, dtype=float) * cum[-1], xs, ys)]
+
+    def to_bytes(self):
+        self._compress()
+        head = np.array([self.compression, self.min, self.max], dtype=float)
+        return np.concatenate([head, self.means, self.counts]).tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        data = np.frombuffer(blob, dtype=float)
+        digest = cls(int(data[0]))
+        digest.min, digest.max = float(data[1]), float(data[2])
+        half = (data.size - 3) // 2
+        digest.means = data[3:3 + half].copy()
+        digest.counts = data[3 + half:].copy()
+        return digest
+
+
+# ---------------- Storage ----------------
+def ensure_sketches(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS rollup_sketches
+                      (hour TEXT, category TEXT, station TEXT, n INTEGER, sketch BLOB,
+                       PRIMARY KEY (hour, category, station))""")
+    cursor.execute("SELECT 1 FROM rollup_sketches LIMIT 1")
+    if cursor.fetchone() is None:
+        rebuild_sketches(cursor)
+
+
+def rebuild_sketches(cursor, station="default"):
+    """Rebuild sketches from ``records``; records carry no station, so all go to ``station``."""
+    cursor.execute("DELETE FROM rollup_sketches")
+    digests = {}
+    for chunk in iter_records(cursor.connection.cursor(), columns=("timestamp", "category", "weight"),
+                              chunk_size=100_000, descending=False, exclude_remark=ANOMALY_REMARK):
+        for ts, category, weight in chunk:
+            key = (ts[:13], category)
+            digest = digests.get(key)
+            if digest is None:
+                digest = digests[key] = TDigest()
+            digest.add(weight)
+    cursor.executemany("INSERT INTO rollup_sketches (hour, category, station, n, sketch) VALUES (?, ?, ?, ?, ?)",
+                       [(hour, category, station, d.n, d.to_bytes()) for (hour, category), d in digests.items()])
+
+
+class SketchStore:
+    """``ingest_worker`` handler keeping the digests of the open hours."""
+
+    def __init__(self):
+        self.open = {}
+        self.dirty = set()
+
+    def process(self, cursor, station, category, weight, lower, upper, timestamp):
+        key = (timestamp[:13], category, station)
+        digest = self.open.get(key)
+        if digest is None:
+            cursor.execute("SELECT sketch FROM rollup_sketches WHERE hour = ? AND category = ? AND station = ?", key)
+            row = cursor.fetchone()
+            digest = self.open[key] = TDigest.from_bytes(row[0]) if row else TDigest()
+        digest.add(weight)
+        self.dirty.add(key)
+
+    def flush(self, cursor):
+        cursor.executemany("""
+            INSERT INTO rollup_sketches (hour, category, station, n, sketch) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(hour, category, station) DO UPDATE SET n = excluded.n, sketch = excluded.sketch
+        """, [key + (self.open[key].n, self.open[key].to_bytes()) for key in self.dirty])
+        self.dirty.clear()
+        # Keep only the newest hour per category/station in memory.
+        newest = {}
+        for hour, category, station in self.open:
+            newest[(category, station)] = max(hour, newest.get((category, station), hour))
+        self.open = {k: d for k, d in self.open.items() if k[0] == newest[(k[1], k[2])]}
+
+
+# ---------------- Queries ----------------
+def hour_digests(cursor, first_hour, last_hour, category=None, station=None):
+    """Merge stored sketches of whole hours into {category: TDigest}."""
+    sql = "SELECT category, sketch FROM rollup_sketches WHERE hour BETWEEN ? AND ?"
+    params = [first_hour, last_hour]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    if station:
+        sql += " AND station = ?"
+        params.append(station)
+    cursor.execute(sql, params)
+    digests = {}
+    for name, blob in cursor.fetchall():
+        part = TDigest.from_bytes(blob)
+        if name in digests:
+            digests[name].merge(part)
+        else:
+            digests[name] = part
+    return digests
+
+
+def range_percentiles(cursor, from_dt, to_dt, percentiles, category=None, station=None):
+    """Return {"p<x>": value} for a range, answered from the sketches.
+
+    Partial hours at the edges are read from ``records``.  Records carry no
+    station, so with ``station`` the range is widened to whole hours.
+    """
+    span = full_hour_span(from_dt, to_dt)
+    if station:
+        span, edges = (from_dt[:13], to_dt[:13]), []
+    elif span is None:
+        edges = [("timestamp BETWEEN ? AND ?", [from_dt, to_dt])]
+    else:
+        edges = [("timestamp >= ? AND timestamp < ?", [from_dt, span[0] + ":00:00"]),
+                 ("timestamp > ? AND timestamp <= ?", [span[1] + ":59:59", to_dt])]
+    digest = TDigest()
+    if span is not None:
+        for part in hour_digests(cursor, span[0], span[1], category, station).values():
+            digest.merge(part)
+    cat_sql, cat_params = (" AND category = ?", [category]) if category else ("", [])
+    for where, params in edges:
+        cursor.execute("SELECT weight FROM records WHERE " + where + VALID_SQL + cat_sql, params + cat_params)
+        digest.add_many([r[0] for r in cursor.fetchall()])
+    values = digest.quantiles([p / 100 for p in percentiles])
+    return {f"p{p:g}": v for p, v in zip(percentiles, values)}
@@ -0,0 +1,125 @@
+"""
+LRU result cache for record range queries.
+
+Entries are keyed by (query kind, range, filters) and checked against a cheap
+watermark before being served: the max rowid of ``records`` plus the counters
+kept in the ``data_versions`` table.  Categories and edits to existing rows
+bump those counters; plain inserts only move the max rowid, and an entry
+survives that as long as none of the new rows fall inside its range.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rough per-row overhead of a 4-tuple of Python objects, excluding string data.
+_ROW_OVERHEAD = 160
+# Flat charge for non-list results such as summary dicts.
+_SMALL_RESULT = 4096
+
+
+def bump_data_version(cursor, name):
+    cursor.execute("""
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
+
+
+def read_watermark(cursor):
+    cursor.execute("SELECT MAX(rowid) FROM records")
+    max_rowid = cursor.fetchone()[0] or 0
+    cursor.execute("SELECT name, version FROM data_versions ORDER BY name")
+    return max_rowid, tuple(cursor.fetchall())
+
+
+def estimate_size(rows):
+    if isinstance(rows, tuple):
+        # e.g. (page rows, next page key)
+        return _SMALL_RESULT + sum(estimate_size(v) for v in rows if isinstance(v, list))
+    if not isinstance(rows, list):
+        return _SMALL_RESULT
+    size = 0
+    for row in rows:
+        size += _ROW_OVERHEAD
+        for v in row:
+            if isinstance(v, str):
+                size += len(v)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "size", "max_rowid", "versions", "from_dt", "to_dt")
+
+    def __init__(self, value, size, max_rowid, versions, from_dt, to_dt):
+        self.value = value
+        self.size = size
+        self.max_rowid = max_rowid
+        self.versions = versions
+        self.from_dt = from_dt
+        self.to_dt = to_dt
+
+
+class RecordQueryCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, cursor, key, from_dt, to_dt, loader):
+        """Return the cached result for ``key`` or call ``loader()`` and cache it.
+
+        ``from_dt``/``to_dt`` bound the timestamps the result depends on, so new
+        rows outside that range do not invalidate it.
+        """
+        max_rowid, versions = read_watermark(cursor)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and self._is_fresh(cursor, entry, max_rowid, versions):
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+            return entry.value
+
+        value = loader()
+        self.misses += 1
+        self._store(key, _Entry(value, estimate_size(value), max_rowid, versions, from_dt, to_dt))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _is_fresh(self, cursor, entry, max_rowid, versions):
+        if entry.versions != versions:
+            return False
+        if entry.max_rowid == max_rowid:
+            return True
+        # Rows were appended since the entry was cached; it is still valid if
+        # none of them landed in its range (always true for closed ranges).
+        cursor.execute("""
+            SELECT 1 FROM records
+            WHERE rowid > ? AND timestamp BETWEEN ? AND ?
+            LIMIT 1
+        """, (entry.max_rowid, entry.from_dt, entry.to_dt))
+        if cursor.fetchone():
+            return False
+        entry.max_rowid = max_rowid
+        return True
+
+    def _store(self, key, entry):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.size
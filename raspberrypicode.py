@@ -56,7 +56,10 @@ try:
             data = response.json()
             print("API Response JSON:", data)
 
-            if data.get("result") == "pass":
+            if data.get("result") == "idle":
+                # Empty scale reading used by the server to track zero drift
+                print("Status: idle")
+            elif data.get("result") == "pass":
                 GPIO.output(PASS_RELAY_PIN, GPIO.LOW)   # Relay ON
                 GPIO.output(FAIL_RELAY_PIN, GPIO.HIGH)  # Relay OFF
                 print("Status: ✅ PASS")
@@ -65,7 +68,8 @@ try:
             else:
                 GPIO.output(PASS_RELAY_PIN, GPIO.HIGH)  # Relay OFF
                 GPIO.output(FAIL_RELAY_PIN, GPIO.LOW)   # Relay ON
-                print("Status: ❌ FAIL")
+                # Anything but pass, including "sensor anomaly", rejects the bottle
+                print("Status: ⚠ SENSOR ANOMALY" if data.get("result") == "sensor anomaly" else "Status: ❌ FAIL")
                 time.sleep(5)  # Keep LED on for 5 seconds
                 GPIO.output(FAIL_RELAY_PIN, GPIO.HIGH)  # Relay OFF
 
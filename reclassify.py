@@ -0,0 +1,95 @@
+"""
+What-if limits and retroactive reclassification.
+
+``WhatIf`` holds a range's weights sorted in a NumPy array, so the pass/fail
+split for any number of candidate limits is two ``searchsorted`` calls.
+``reclassify`` rewrites stored Pass/Fail remarks against new limits in
+chunked transactions, keeping the hourly rollups and the query-cache
+version in step with every chunk.
+"""
+import numpy as np
+
+from query_cache import bump_data_version
+from record_stats import load_weights
+from rollups import apply_remark_changes
+
+RECLASSIFY_CHUNK = 50_000
+
+
+class WhatIf:
+    def __init__(self, weights):
+        self.weights = np.sort(np.asarray(weights, dtype=float))
+
+    @classmethod
+    def load(cls, cursor, from_dt, to_dt, category):
+        return cls(load_weights(cursor, from_dt, to_dt, category)[0])
+
+    def __len__(self):
+        return len(self.weights)
+
+    def counts(self, lower, upper):
+        """Return (n_pass, n_fail) for ``lower <= weight <= upper``.
+
+        ``lower`` and ``upper`` may be arrays (broadcast together) to
+        evaluate a whole sweep of candidate limits at once.
+        """
+        n_pass = (np.searchsorted(self.weights, upper, side="right")
+                  - np.searchsorted(self.weights, lower, side="left"))
+        n_pass = np.maximum(n_pass, 0)
+        return n_pass, len(self.weights) - n_pass
+
+    def sweep(self, lowers, uppers):
+        """Return rows of (lower, upper, n_pass, n_fail, fail_rate) for every combination."""
+        lo, hi = np.meshgrid(np.asarray(lowers, dtype=float), np.asarray(uppers, dtype=float), indexing="ij")
+        lo, hi = lo.ravel(), hi.ravel()
+        n_pass, n_fail = self.counts(lo, hi)
+        total = len(self.weights)
+        rate = n_fail / total if total else np.zeros(len(lo))
+        return [(float(a), float(b), int(p), int(f), float(r))
+                for a, b, p, f, r in zip(lo, hi, n_pass, n_fail, rate)]
+
+
+def reclassify(conn, category, lower, upper, from_dt, to_dt, chunk_rows=RECLASSIFY_CHUNK, progress=None):
+    """Rewrite the Pass/Fail remarks of ``category`` in a range against new limits.
+
+    Works through the range in rowid windows of ``chunk_rows``, one
+    transaction each, so ingest is never blocked for long.  Other remarks are
+    left alone.  Returns the number of records whose remark changed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(rowid), MAX(rowid) FROM records WHERE timestamp BETWEEN ? AND ? AND category = ?",
+                   (from_dt, to_dt, category))
+    first, last = cursor.fetchone()
+    if first is None:
+        return 0
+    changed = 0
+    start = first - 1
+    while start < last:
+        end = min(start + chunk_rows, last)
+        cursor.execute("""
+            UPDATE records
+            SET remark = CASE WHEN weight BETWEEN ? AND ? THEN 'Pass' ELSE 'Fail' END
+            WHERE rowid > ? AND rowid <= ? AND category = ? AND timestamp BETWEEN ? AND ?
+              AND remark IN ('Pass', 'Fail')
+              AND remark != CASE WHEN weight BETWEEN ? AND ? THEN 'Pass' ELSE 'Fail' END
+            RETURNING substr(timestamp, 1, 13), remark
+        """, (lower, upper, start, end, category, from_dt, to_dt, lower, upper))
+        rows = cursor.fetchall()
+        if rows:
+            changes = {}
+            for hour, remark in rows:
+                d = changes.setdefault(hour, [0, 0])
+                if remark == "Pass":
+                    d[0] += 1
+                    d[1] -= 1
+                else:
+                    d[0] -= 1
+                    d[1] += 1
+            apply_remark_changes(cursor, category, changes)
+            bump_data_version(cursor, "records")
+            changed += len(rows)
+        conn.commit()
+        start = end
+        if progress:
+            progress(end - first + 1, last - first + 1)
+    return changed
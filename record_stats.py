@@ -0,0 +1,230 @@
+"""
+Statistics for a range of records: counts, pass/fail, mean, standard
+deviation, min/max, percentiles and process capability (Cp/Cpk) against
+the category limits.
+
+Small ranges are read from ``records`` in a single pass and summarised with
+NumPy.  Ranges larger than ``ROLLUP_MIN_ROWS`` are answered from the hourly
+rollups, with only the partial hours at either end read from ``records``;
+their percentiles are estimated from the hourly quantile sketches, or
+reported as None where the database has none.  Sensor anomalies are left
+out of every figure and counted separately as ``anomaly``, so ``count`` plus
+``anomaly`` is the number of records in the range.
+
+The sketches are written by ``SketchStore.flush`` in their own commit about
+every ten seconds, while the rollups are committed with each record, so a
+crash can leave sketches short of the readings they stand for, and
+``ensure_sketches`` only rebuilds an empty table.  A digest is therefore
+only used when it holds exactly as many readings as the rollups count for
+its category; otherwise that category's percentiles, and the overall ones,
+are None.
+"""
+import sqlite3
+
+import numpy as np
+
+from anomaly_detector import ANOMALY_REMARK
+from quantile_sketch import TDigest, hour_digests
+from records_query import iter_records
+from rollups import VALID_SQL, anomaly_counts, full_hour_span, estimate_count
+
+ROLLUP_MIN_ROWS = 200_000
+FETCH_CHUNK = 50_000
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def range_statistics(cursor, from_dt, to_dt, category=None):
+    limits = _category_limits(cursor)
+    span = full_hour_span(from_dt, to_dt)
+    if span is not None and estimate_count(cursor, from_dt, to_dt, category) >= ROLLUP_MIN_ROWS:
+        result = _from_rollups(cursor, from_dt, to_dt, category, span, limits)
+    else:
+        names, weights, passed, failed = _load_arrays(
+            cursor, [("timestamp BETWEEN ? AND ?", (from_dt, to_dt))], category)
+        result = _from_arrays(names, weights, passed, failed, limits)
+    anomalies = anomaly_counts(cursor, from_dt, to_dt, category)
+    result["anomaly"] = sum(anomalies.values())
+    for name, cat in result["categories"].items():
+        cat["anomaly"] = anomalies.get(name, 0)
+    return result
+
+
+def summarize_weights(weights, passed=None, failed=None, lower=None, upper=None):
+    """Vectorised summary of one group of readings."""
+    w = np.asarray(weights, dtype=float)
+    n = int(w.size)
+    out = {
+        "count": n,
+        "pass": int(np.count_nonzero(passed)) if passed is not None else None,
+        "fail": int(np.count_nonzero(failed)) if failed is not None else None,
+        "mean": None, "std": None, "min": None, "max": None, "percentiles": None,
+    }
+    if n:
+        out["mean"] = float(w.mean())
+        out["std"] = float(w.std(ddof=1)) if n > 1 else None
+        out["min"] = float(w.min())
+        out["max"] = float(w.max())
+        pct = np.percentile(w, PERCENTILES)
+        out["percentiles"] = {f"p{p}": float(v) for p, v in zip(PERCENTILES, pct)}
+    out.update(capability(out["mean"], out["std"], lower, upper))
+    return out
+
+
+def capability(mean, std, lower, upper):
+    cap = {"lower_limit": lower, "upper_limit": upper, "cp": None, "cpk": None}
+    if mean is None or not std or lower is None or upper is None:
+        return cap
+    cap["cp"] = float((upper - lower) / (6 * std))
+    cap["cpk"] = float(min(upper - mean, mean - lower) / (3 * std))
+    return cap
+
+
+def load_weights(cursor, from_dt, to_dt, category=None):
+    """Return the valid weights of a range and their Fail flags as NumPy arrays.
+
+    Sensor anomalies are left out.  Rows are streamed a chunk at a time, so
+    peak memory is the two arrays themselves.
+    """
+    w_parts, f_parts = [], []
+    for chunk in iter_records(cursor, from_dt, to_dt, category, columns=("weight", "remark"),
+                              chunk_size=FETCH_CHUNK, descending=False, exclude_remark=ANOMALY_REMARK):
+        w_parts.append(np.fromiter((r[0] for r in chunk), dtype=float, count=len(chunk)))
+        f_parts.append(np.fromiter((r[1] == "Fail" for r in chunk), dtype=bool, count=len(chunk)))
+    if not w_parts:
+        return np.array([]), np.array([], dtype=bool)
+    return np.concatenate(w_parts), np.concatenate(f_parts)
+
+
+# ---------------- Exact path ----------------
+def _load_arrays(cursor, conditions, category):
+    sql = "SELECT weight, remark = 'Pass', remark = 'Fail', category FROM records WHERE "
+    w_parts, p_parts, f_parts, c_parts = [], [], [], []
+    for where, where_params in conditions:
+        params = list(where_params)
+        q = sql + where + VALID_SQL
+        if category:
+            q += " AND category = ?"
+            params.append(category)
+        cursor.execute(q, params)
+        while True:
+            chunk = cursor.fetchmany(FETCH_CHUNK)
+            if not chunk:
+                break
+            w, p, f, c = zip(*chunk)
+            w_parts.append(np.array(w, dtype=float))
+            p_parts.append(np.array(p, dtype=bool))
+            f_parts.append(np.array(f, dtype=bool))
+            c_parts.append(np.array(c, dtype=object))
+    if not w_parts:
+        return np.array([], dtype=object), np.array([]), np.array([], dtype=bool), np.array([], dtype=bool)
+    return (np.concatenate(c_parts), np.concatenate(w_parts),
+            np.concatenate(p_parts), np.concatenate(f_parts))
+
+
+def _from_arrays(names, weights, passed, failed, limits):
+    result = summarize_weights(weights, passed, failed)
+    result["source"] = "records"
+    result["categories"] = {}
+    if not weights.size:
+        return result
+
+    # Group by category once: sort by (category, weight) so each group is a
+    # contiguous, already sorted slice.
+    keys, inverse = np.unique(names.astype(str), return_inverse=True)
+    order = np.lexsort((weights, inverse))
+    w_sorted, p_sorted, f_sorted = weights[order], passed[order], failed[order]
+    bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+    for i, name in enumerate(keys):
+        s = slice(bounds[i], bounds[i + 1])
+        lower, upper = limits.get(name, (None, None))
+        result["categories"][str(name)] = summarize_weights(w_sorted[s], p_sorted[s], f_sorted[s], lower, upper)
+    return result
+
+
+# ---------------- Rollup path ----------------
+def _from_rollups(cursor, from_dt, to_dt, category, span, limits):
+    first_hour, last_hour = span
+    sql = """
+        SELECT category, SUM(n), SUM(n_pass), SUM(n_fail), SUM(sum_w), SUM(sum_w2), MIN(min_w), MAX(max_w)
+        FROM record_rollups WHERE hour BETWEEN ? AND ?
+    """
+    params = [first_hour, last_hour]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    cursor.execute(sql + " GROUP BY category", params)
+    groups = {name: list(vals) for name, *vals in cursor.fetchall()}
+
+    # Partial hours at the edges of the range come from the raw records.
+    edges = [
+        ("timestamp >= ? AND timestamp < ?", (from_dt, first_hour + ":00:00")),
+        ("timestamp > ? AND timestamp <= ?", (last_hour + ":59:59", to_dt)),
+    ]
+    names, weights, passed, failed = _load_arrays(cursor, edges, category)
+    digests = _sketch_digests(cursor, first_hour, last_hour, category)
+    for name in np.unique(names.astype(str)) if weights.size else []:
+        mask = names == name
+        w = weights[mask]
+        add = [w.size, int(passed[mask].sum()), int(failed[mask].sum()),
+               float(w.sum()), float((w * w).sum()), float(w.min()), float(w.max())]
+        groups[name] = _merge_moments(groups.get(name), add)
+        if digests is not None:
+            digests.setdefault(name, TDigest()).add_many(w)
+    return _summarize_groups(groups, limits, digests)
+
+
+def _sketch_digests(cursor, first_hour, last_hour, category):
+    try:
+        return hour_digests(cursor, first_hour, last_hour, category)
+    except sqlite3.OperationalError:
+        # No rollup_sketches table in this database.
+        return None
+
+
+def _sketch_percentiles(digest):
+    values = digest.quantiles([p / 100 for p in PERCENTILES])
+    return {f"p{p}": v for p, v in zip(PERCENTILES, values)}
+
+
+def _merge_moments(a, b):
+    if a is None or not a[0]:
+        return b
+    return [a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3], a[4] + b[4],
+            min(a[5], b[5]), max(a[6], b[6])]
+
+
+def _moment_summary(n, n_pass, n_fail, s, s2, lo, hi, lower=None, upper=None):
+    mean = s / n if n else None
+    std = None
+    if n > 1:
+        std = float(np.sqrt(max(s2 - s * s / n, 0.0) / (n - 1)))
+    out = {"count": int(n), "pass": int(n_pass), "fail": int(n_fail),
+           "mean": mean, "std": std, "min": lo, "max": hi, "percentiles": None}
+    out.update(capability(mean, std, lower, upper))
+    return out
+
+
+def _summarize_groups(groups, limits, digests=None):
+    total = None
+    total_digest = TDigest()
+    categories = {}
+    for name, vals in sorted(groups.items()):
+        if not vals[0]:
+            continue
+        lower, upper = limits.get(name, (None, None))
+        categories[name] = _moment_summary(*vals, lower=lower, upper=upper)
+        total = _merge_moments(total, vals)
+        if digests and name in digests and digests[name].n == vals[0]:
+            categories[name]["percentiles"] = _sketch_percentiles(digests[name])
+            total_digest.merge(digests[name])
+    result = _moment_summary(*total) if total else summarize_weights([], [], [])
+    if total_digest.n and total_digest.n == total[0]:
+        result["percentiles"] = _sketch_percentiles(total_digest)
+    result["source"] = "rollups"
+    result["categories"] = categories
+    return result
+
+
+def _category_limits(cursor):
+    cursor.execute("SELECT name, lower_limit, upper_limit FROM categories")
+    return {name: (lo, hi) for name, lo, hi in cursor.fetchall()}
@@ -0,0 +1,145 @@
+"""
+Streaming and paginated reads of the records table.
+"""
+from rollups import estimate_count
+
+RECORD_COLUMNS = ("timestamp", "weight", "category", "remark")
+DEFAULT_CHUNK = 5000
+
+# SQL for each column a row source may project; CASTs pin the Python type
+# of every value regardless of how the row was written.
+_COLUMN_SQL = {
+    "rowid": "rowid",
+    "timestamp": "CAST(timestamp AS TEXT)",
+    "weight": "CAST(weight AS REAL)",
+    "category": "CAST(category AS TEXT)",
+    "remark": "CAST(remark AS TEXT)",
+    "raw_weight": "CAST(raw_weight AS REAL)",
+}
+
+
+def iter_records(cursor, from_dt=None, to_dt=None, category=None, columns=RECORD_COLUMNS,
+                 chunk_size=DEFAULT_CHUNK, descending=True, start_key=None, limit=None,
+                 min_rowid=None, max_rowid=None, rowid_order=False, exclude_remark=None):
+    """Yield chunks of record tuples in (timestamp, rowid) order.
+
+    This is the one row source behind every exporter: rows are pulled with
+    ``fetchmany(chunk_size)``, so memory is bounded by the chunk size.
+    ``columns`` projects any of timestamp, weight, category, remark,
+    raw_weight and rowid.  ``start_key`` is an inclusive (timestamp, rowid)
+    to resume from in iteration order; ``min_rowid``/``max_rowid`` bound the
+    rowids, e.g. to pin a range to the rows that existed when it was counted.
+    ``rowid_order`` orders by insertion instead, which turns a
+    ``min_rowid`` bound into a seek on the table itself.  ``exclude_remark``
+    skips the rows with that remark, e.g. sensor anomalies for statistics.
+    """
+    unknown = set(columns) - set(_COLUMN_SQL)
+    if unknown:
+        raise ValueError(f"Unknown record columns: {sorted(unknown)}")
+    where, params = [], []
+    if from_dt is not None:
+        where.append("timestamp >= ?")
+        params.append(from_dt)
+    if to_dt is not None:
+        where.append("timestamp <= ?")
+        params.append(to_dt)
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if start_key is not None:
+        where.append(f"(timestamp, rowid) {'<=' if descending else '>='} (?, ?)")
+        params.extend(start_key)
+    if exclude_remark is not None:
+        where.append("remark IS NOT ?")
+        params.append(exclude_remark)
+    if min_rowid is not None:
+        where.append("rowid > ?")
+        params.append(min_rowid)
+    if max_rowid is not None:
+        where.append("rowid <= ?")
+        params.append(max_rowid)
+
+    direction = "DESC" if descending else "ASC"
+    sql = f"SELECT {', '.join(_COLUMN_SQL[c] for c in columns)} FROM records"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if rowid_order:
+        sql += f" ORDER BY rowid {direction}"
+    else:
+        sql += f" ORDER BY timestamp {direction}, rowid {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    cursor.execute(sql, params)
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_rows(chunks):
+    for chunk in chunks:
+        yield from chunk
+
+
+def count_records(cursor, from_dt, to_dt, category=None, max_rowid=None):
+    sql = "SELECT COUNT(*) FROM records WHERE timestamp BETWEEN ? AND ?"
+    params = [from_dt, to_dt]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    if max_rowid is not None:
+        sql += " AND rowid <= ?"
+        params.append(max_rowid)
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+def max_record_rowid(cursor):
+    cursor.execute("SELECT MAX(rowid) FROM records")
+    return cursor.fetchone()[0] or 0
+
+
+# ---------------- Pagination ----------------
+SORTABLE_COLUMNS = {"timestamp", "weight", "category", "remark"}
+PAGE_SIZE = 500
+
+
+def fetch_page(cursor, from_dt, to_dt, order_by="timestamp", descending=True, after=None,
+               limit=PAGE_SIZE, category=None):
+    """Return one page of records and the key to pass as ``after`` for the next.
+
+    Pages are keyset-paginated on (order_by, rowid), so every page is an
+    index range scan regardless of how deep into the range it is.  The
+    returned key is None on the last page.
+    """
+    if order_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort records by {order_by!r}")
+    direction = "DESC" if descending else "ASC"
+    source = "records"
+    if order_by != "timestamp" and _prefer_sort_index(cursor, from_dt, to_dt, limit, category):
+        source = f"records INDEXED BY idx_records_{order_by}"
+    sql = f"SELECT {order_by}, rowid, timestamp, weight, category, remark FROM {source} WHERE timestamp BETWEEN ? AND ?"
+    params = [from_dt, to_dt]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    if after is not None:
+        sql += f" AND ({order_by}, rowid) {'<' if descending else '>'} (?, ?)"
+        params.extend(after)
+    sql += f" ORDER BY {order_by} {direction}, rowid {direction} LIMIT ?"
+    params.append(limit)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_key = (rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+    return [r[2:] for r in rows], next_key
+
+
+def _prefer_sort_index(cursor, from_dt, to_dt, limit, category):
+    # Walking the sort column's index reads about limit * total / in_range rows
+    # before a page is full; filtering by timestamp and sorting reads in_range
+    # rows.  SQLite has no statistics to make this call, so make it here.
+    in_range = estimate_count(cursor, from_dt, to_dt, category)
+    total = max_record_rowid(cursor)
+    return in_range * in_range > total * limit
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Scheduled shift/day reports.
+
+``ReportScheduler`` runs inside the GUI as a daemon thread.  Once a shift or
+day has ended (plus ``REPORT_DELAY_MINUTES``) it launches one
+``report_scheduler.py generate`` child process per report, at below-normal
+priority, and waits for it before starting the next.  The child writes with
+the same exporters as the GUI buttons and sleeps between chunks so it never
+competes with ingest for the disk or CPU.
+
+Run by hand or from the OS scheduler:
+
+    python report_scheduler.py generate --period shift --format summary
+    python report_scheduler.py generate --from "..." --to "..." --format xlsx --out report.xlsx
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from capability_report import write_capability_report
+from exporters import DB_PATH, write_csv, write_excel, write_excel_report
+from pdf_report import render_range_pdf, render_summary_pdf
+from record_stats import range_statistics
+from rollups import HOUR_FORMAT, TS_FORMAT, bucket_of
+
+# (period, format) pairs generated automatically; formats are
+# "summary", "pdf", "xlsx", "report.xlsx", "capability.xlsx", "csv" and "csv.gz".
+SCHEDULED_REPORTS = [
+    ("shift", "summary"),
+    ("day", "summary"),
+    ("day", "report.xlsx"),
+]
+REPORT_DELAY_MINUTES = 5
+LOOKBACK_HOURS = 24
+CHECK_INTERVAL_SECONDS = 60
+# Fraction of wall time a generator may spend working; it sleeps the rest.
+THROTTLE_DUTY = 0.5
+# A failed report is retried after RETRY_MINUTES, doubling each time, and
+# given up after MAX_ATTEMPTS.
+RETRY_MINUTES = 5
+MAX_ATTEMPTS = 4
+
+EXTENSIONS = {"summary": "summary.pdf", "pdf": "pdf", "xlsx": "xlsx", "report.xlsx": "report.xlsx",
+              "capability.xlsx": "capability.xlsx", "csv": "csv", "csv.gz": "csv.gz"}
+
+
+def completed_periods(period, now, delay_minutes=REPORT_DELAY_MINUTES, lookback_hours=LOOKBACK_HOURS):
+    """Return (label, first_ts, last_ts) for periods that ended within the lookback window."""
+    cutoff = (now - timedelta(minutes=delay_minutes)).strftime(TS_FORMAT)
+    seen = {}
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    for _ in range(lookback_hours + 1):
+        label, first, last = bucket_of(hour.strftime(HOUR_FORMAT), period)
+        if last < cutoff:
+            seen[label] = (label, first, last)
+        hour -= timedelta(hours=1)
+    return sorted(seen.values(), key=lambda p: p[1])
+
+
+def report_filename(label, fmt):
+    return f"{label.replace(' ', '_').replace(':', '')}.{EXTENSIONS[fmt]}"
+
+
+class _Throttle:
+    """Progress callback that sleeps so work takes at most ``duty`` of wall time."""
+
+    def __init__(self, duty=THROTTLE_DUTY):
+        self.factor = (1.0 - duty) / duty
+        self.mark = time.monotonic()
+
+    def __call__(self, done=None, total=None):
+        worked = time.monotonic() - self.mark
+        time.sleep(worked * self.factor)
+        self.mark = time.monotonic()
+
+
+def generate_report(db_path, fmt, from_dt, to_dt, out_path, progress=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        if fmt == "summary":
+            render_summary_pdf(cursor, out_path, from_dt, to_dt, progress=progress)
+        elif fmt == "pdf":
+            stats = range_statistics(cursor, from_dt, to_dt)
+            render_range_pdf(db_path, out_path, from_dt, to_dt, stats["count"] + stats["anomaly"],
+                             progress=progress, workers=1)
+        elif fmt == "xlsx":
+            stats = range_statistics(cursor, from_dt, to_dt)
+            write_excel(cursor, out_path, from_dt, to_dt, stats, progress=progress)
+        elif fmt == "report.xlsx":
+            stats = range_statistics(cursor, from_dt, to_dt)
+            write_excel_report(cursor, out_path, from_dt, to_dt, stats, progress=progress)
+        elif fmt == "capability.xlsx":
+            write_capability_report(db_path, out_path, from_dt, to_dt, workers=1)
+        elif fmt in ("csv", "csv.gz"):
+            write_csv(cursor, out_path, from_dt, to_dt, progress=progress)
+        else:
+            raise ValueError(f"Unknown report format {fmt!r}")
+    finally:
+        conn.close()
+
+
+def _low_priority_kwargs():
+    if os.name == "nt":
+        return {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+    return {"preexec_fn": lambda: os.nice(10)}
+
+
+class ReportScheduler:
+    def __init__(self, db_path, out_dir, reports=None):
+        self.db_path = db_path
+        self.out_dir = out_dir
+        self.reports = SCHEDULED_REPORTS if reports is None else reports
+        self._stop = threading.Event()
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE IF NOT EXISTS report_runs
+                        (name TEXT PRIMARY KEY, created TEXT, path TEXT)""")
+        # status is "done", "retry" (next_try holds when) or "failed"; older rows have none and are done.
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(report_runs)")}
+        for column, sql_type in (("status", "TEXT"), ("attempts", "INTEGER"), ("error", "TEXT"),
+                                 ("next_try", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE report_runs ADD COLUMN {column} {sql_type}")
+        conn.commit()
+        conn.close()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_due(datetime.now())
+            except Exception as e:
+                print(f"Scheduled report check failed: {e}")
+            self._stop.wait(CHECK_INTERVAL_SECONDS)
+
+    def run_due(self, now):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for period, fmt in self.reports:
+                for label, first, last in completed_periods(period, now):
+                    name = f"{label} {fmt}"
+                    run = conn.execute("SELECT status, attempts, next_try FROM report_runs WHERE name = ?",
+                                       (name,)).fetchone()
+                    if run and (run[0] != "retry" or run[2] > now.strftime(TS_FORMAT)):
+                        continue
+                    attempts = (run[1] if run else 0) + 1
+                    path = ""
+                    status, error, next_try = "done", None, None
+                    has_rows = conn.execute("SELECT 1 FROM records WHERE timestamp BETWEEN ? AND ? LIMIT 1",
+                                            (first, last)).fetchone()
+                    if has_rows:
+                        os.makedirs(self.out_dir, exist_ok=True)
+                        path = os.path.join(self.out_dir, report_filename(label, fmt))
+                        try:
+                            self._generate(fmt, first, last, path)
+                        except (subprocess.SubprocessError, OSError) as e:
+                            # Record the failure and go on; one bad report must not hold up the rest
+                            print(f"Scheduled report {name} failed (attempt {attempts}): {e}")
+                            error = str(e)
+                            if attempts >= MAX_ATTEMPTS:
+                                status = "failed"
+                            else:
+                                status = "retry"
+                                wait = timedelta(minutes=RETRY_MINUTES * 2 ** (attempts - 1))
+                                next_try = (now + wait).strftime(TS_FORMAT)
+                    conn.execute("""
+                        INSERT INTO report_runs (name, created, path, status, attempts, error, next_try)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET created = excluded.created, path = excluded.path,
+                            status = excluded.status, attempts = excluded.attempts, error = excluded.error,
+                            next_try = excluded.next_try
+                    """, (name, datetime.now().strftime(TS_FORMAT), path, status, attempts, error, next_try))
+                    conn.commit()
+        finally:
+            conn.close()
+
+    def _generate(self, fmt, from_dt, to_dt, path):
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "generate", "--db", self.db_path,
+             "--format", fmt, "--from", from_dt, "--to", to_dt, "--out", path],
+            check=True, **_low_priority_kwargs())
+
+
+# ---------------- Command line ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate shift/day reports without the GUI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate")
+    gen.add_argument("--format", choices=sorted(EXTENSIONS), required=True)
+    gen.add_argument("--period", choices=["shift", "day"], help="latest completed shift or day")
+    gen.add_argument("--from", dest="from_dt", help="YYYY-MM-DD HH:MM:SS")
+    gen.add_argument("--to", dest="to_dt", help="YYYY-MM-DD HH:MM:SS")
+    gen.add_argument("--out", help="output file (default: <label>.<ext> in the current directory)")
+    gen.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.period:
+        periods = completed_periods(args.period, datetime.now(), delay_minutes=0)
+        if not periods:
+            parser.error(f"no completed {args.period} in the last {LOOKBACK_HOURS} hours")
+        label, from_dt, to_dt = periods[-1]
+        out = args.out or report_filename(label, args.format)
+    elif args.from_dt and args.to_dt and args.out:
+        from_dt, to_dt, out = args.from_dt, args.to_dt, args.out
+    else:
+        parser.error("give --period, or --from, --to and --out")
+
+    generate_report(args.db, args.format, from_dt, to_dt, out, progress=_Throttle())
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Hourly per-category rollups of the records table.
+
+Each ingested reading updates one ``record_rollups`` row in the same
+transaction as the record itself, so long ranges can be summarised from a
+few hundred rollup rows instead of millions of records.  Sensor anomalies
+only count in ``n_anomaly``; the other columns describe valid readings.
+"""
+from datetime import datetime, timedelta
+
+from anomaly_detector import ANOMALY_REMARK
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+HOUR_FORMAT = "%Y-%m-%d %H"
+# Restricts a query on records to the readings that enter weight statistics.
+VALID_SQL = f" AND remark IS NOT '{ANOMALY_REMARK}'"
+
+
+def ensure_rollups(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS record_rollups
+                      (hour TEXT, category TEXT, n INTEGER, n_pass INTEGER, n_fail INTEGER,
+                       sum_w REAL, sum_w2 REAL, min_w REAL, max_w REAL,
+                       n_anomaly INTEGER DEFAULT 0,
+                       PRIMARY KEY (hour, category))""")
+    cursor.execute("PRAGMA table_info(record_rollups)")
+    if "n_anomaly" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE record_rollups ADD COLUMN n_anomaly INTEGER DEFAULT 0")
+    cursor.execute("SELECT 1 FROM record_rollups LIMIT 1")
+    if cursor.fetchone() is None:
+        rebuild_rollups(cursor)
+
+
+def rebuild_rollups(cursor):
+    cursor.execute("DELETE FROM record_rollups")
+    cursor.execute("""
+        INSERT INTO record_rollups (hour, category, n, n_pass, n_fail, sum_w, sum_w2, min_w, max_w, n_anomaly)
+        SELECT substr(timestamp, 1, 13), category, COUNT(*) - SUM(anomaly),
+               SUM(remark = 'Pass'), SUM(remark = 'Fail'),
+               TOTAL(valid), TOTAL(valid * valid), MIN(valid), MAX(valid), SUM(anomaly)
+        FROM (SELECT timestamp, category, remark, remark IS ? AS anomaly,
+                     CASE WHEN remark IS ? THEN NULL ELSE weight END AS valid FROM records)
+        GROUP BY substr(timestamp, 1, 13), category
+    """, (ANOMALY_REMARK, ANOMALY_REMARK))
+
+
+def add_to_rollup(cursor, timestamp, weight, category, remark):
+    if remark == ANOMALY_REMARK:
+        cursor.execute("""
+            INSERT INTO record_rollups (hour, category, n, n_pass, n_fail, sum_w, sum_w2, n_anomaly)
+            VALUES (?, ?, 0, 0, 0, 0.0, 0.0, 1)
+            ON CONFLICT(hour, category) DO UPDATE SET n_anomaly = n_anomaly + 1
+        """, (timestamp[:13], category))
+        return
+    is_pass = int(remark == "Pass")
+    is_fail = int(remark == "Fail")
+    cursor.execute("""
+        INSERT INTO record_rollups (hour, category, n, n_pass, n_fail, sum_w, sum_w2, min_w, max_w)
+        VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(hour, category) DO UPDATE SET
+            n = n + 1,
+            n_pass = n_pass + excluded.n_pass,
+            n_fail = n_fail + excluded.n_fail,
+            sum_w = sum_w + excluded.sum_w,
+            sum_w2 = sum_w2 + excluded.sum_w2,
+            min_w = MIN(COALESCE(min_w, excluded.min_w), excluded.min_w),
+            max_w = MAX(COALESCE(max_w, excluded.max_w), excluded.max_w)
+    """, (timestamp[:13], category, is_pass, is_fail, weight, weight * weight, weight, weight))
+
+
+def apply_remark_changes(cursor, category, changes):
+    """Shift pass/fail counts after remarks were rewritten in place.
+
+    ``changes`` maps hour -> (delta_pass, delta_fail).
+    """
+    cursor.executemany("""
+        UPDATE record_rollups SET n_pass = n_pass + ?, n_fail = n_fail + ?
+        WHERE hour = ? AND category = ?
+    """, [(d_pass, d_fail, hour, category) for hour, (d_pass, d_fail) in changes.items()])
+
+
+def full_hour_span(from_dt, to_dt):
+    """Split a range into (first_full_hour, last_full_hour) rollup keys.
+
+    Returns None when the range does not cover a complete hour or the
+    timestamps cannot be parsed.  Records between ``from_dt`` and the start
+    of the first full hour, and after the end of the last one, are not
+    covered by the returned span and have to be read from ``records``.
+    """
+    try:
+        start = datetime.strptime(from_dt, TS_FORMAT)
+        end = datetime.strptime(to_dt, TS_FORMAT)
+    except ValueError:
+        return None
+    first = start.replace(minute=0, second=0)
+    if first < start:
+        first += timedelta(hours=1)
+    last = end.replace(minute=0, second=0)
+    if end < last + timedelta(minutes=59, seconds=59):
+        last -= timedelta(hours=1)
+    if last < first:
+        return None
+    return first.strftime(HOUR_FORMAT), last.strftime(HOUR_FORMAT)
+
+
+def estimate_count(cursor, from_dt, to_dt, category=None):
+    sql = "SELECT COALESCE(SUM(n), 0) FROM record_rollups WHERE hour BETWEEN ? AND ?"
+    params = [from_dt[:13], to_dt[:13]]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+# ---------------- Buckets ----------------
+# (name, start hour, length in hours); a shift may run past midnight.
+SHIFTS = (("A", 6, 8), ("B", 14, 8), ("C", 22, 8))
+GRANULARITIES = ("hour", "shift", "day")
+
+
+def hourly_totals(cursor, from_dt, to_dt, category=None, by_category=False):
+    """Return {hour: [n, n_pass, n_fail, sum_w, n_anomaly]} for the range.
+
+    With ``by_category`` the keys are (hour, category) pairs instead.
+    Complete hours come from the rollups; the partial hours at either end
+    are aggregated from ``records`` so the totals match the range exactly.
+    """
+    totals = {}
+    width = 2 if by_category else 1
+
+    def add(rows):
+        for row in rows:
+            key = row[:width] if by_category else row[0]
+            n, n_pass, n_fail, s, n_anomaly = row[width:]
+            t = totals.setdefault(key, [0, 0, 0, 0.0, 0])
+            t[0] += n
+            t[1] += n_pass
+            t[2] += n_fail
+            t[3] += s or 0.0
+            t[4] += n_anomaly or 0
+
+    cat_sql, cat_params = (" AND category = ?", [category]) if category else ("", [])
+    group = ", category" if by_category else ""
+    span = full_hour_span(from_dt, to_dt)
+    if span is None:
+        edges = [("timestamp BETWEEN ? AND ?", [from_dt, to_dt])]
+    else:
+        cursor.execute("SELECT hour" + group + """, SUM(n), SUM(n_pass), SUM(n_fail), SUM(sum_w), SUM(n_anomaly)
+            FROM record_rollups WHERE hour BETWEEN ? AND ?""" + cat_sql + " GROUP BY hour" + group,
+                       [span[0], span[1]] + cat_params)
+        add(cursor.fetchall())
+        edges = [("timestamp >= ? AND timestamp < ?", [from_dt, span[0] + ":00:00"]),
+                 ("timestamp > ? AND timestamp <= ?", [span[1] + ":59:59", to_dt])]
+    for where, params in edges:
+        cursor.execute("SELECT substr(timestamp, 1, 13)" + group
+                       + """, COUNT(*) - SUM(remark IS ?), SUM(remark = 'Pass'), SUM(remark = 'Fail'),
+                  SUM(CASE WHEN remark IS ? THEN NULL ELSE weight END), SUM(remark IS ?)
+            FROM records WHERE """ + where + cat_sql + " GROUP BY substr(timestamp, 1, 13)" + group,
+                       [ANOMALY_REMARK] * 3 + params + cat_params)
+        add(cursor.fetchall())
+    return totals
+
+
+def anomaly_counts(cursor, from_dt, to_dt, category=None):
+    """Return {category: number of sensor anomalies} for the range."""
+    counts = {}
+    for (_, name), t in hourly_totals(cursor, from_dt, to_dt, category, by_category=True).items():
+        if t[4]:
+            counts[name] = counts.get(name, 0) + t[4]
+    return counts
+
+
+def bucket_of(hour, granularity):
+    """Map a rollup hour key to (label, first timestamp, last timestamp)."""
+    start = datetime.strptime(hour, HOUR_FORMAT)
+    if granularity == "hour":
+        label = hour + ":00"
+        length = timedelta(hours=1)
+    elif granularity == "day":
+        start = start.replace(hour=0)
+        label = start.strftime("%Y-%m-%d")
+        length = timedelta(days=1)
+    elif granularity == "shift":
+        for name, first, hours in SHIFTS:
+            shift_start = start.replace(hour=first)
+            if shift_start > start:
+                shift_start -= timedelta(days=1)
+            if start < shift_start + timedelta(hours=hours):
+                break
+        else:
+            raise ValueError(f"Hour {hour} is not covered by any shift")
+        start = shift_start
+        label = f"{start.strftime('%Y-%m-%d')} Shift {name}"
+        length = timedelta(hours=hours)
+    else:
+        raise ValueError(f"Unknown granularity {granularity!r}")
+    end = start + length - timedelta(seconds=1)
+    return label, start.strftime(TS_FORMAT), end.strftime(TS_FORMAT)
+
+
+def bucket_rollups(cursor, from_dt, to_dt, granularity, category=None):
+    """Aggregate a range into hour/shift/day buckets, oldest first.
+
+    Each bucket is (label, first_ts, last_ts, count, pass, fail, fail_rate,
+    mean_weight, anomalies), with first_ts/last_ts clipped to the requested
+    range so they can be used directly to drill down into the raw records.
+    Buckets without a valid reading are left out.
+    """
+    buckets = {}
+    for hour, (n, n_pass, n_fail, s, n_anomaly) in hourly_totals(cursor, from_dt, to_dt, category).items():
+        key = bucket_of(hour, granularity)
+        b = buckets.setdefault(key, [0, 0, 0, 0.0, 0])
+        b[0] += n
+        b[1] += n_pass
+        b[2] += n_fail
+        b[3] += s
+        b[4] += n_anomaly
+    out = []
+    for (label, first, last), (n, n_pass, n_fail, s, n_anomaly) in sorted(buckets.items(), key=lambda kv: kv[0][1]):
+        if not n:
+            continue
+        out.append((label, max(first, from_dt), min(last, to_dt), n, n_pass, n_fail,
+                    n_fail / n, s / n, n_anomaly))
+    return out
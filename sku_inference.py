@@ -0,0 +1,47 @@
+"""
+Automatic category (SKU) inference for mixed lines.
+
+A reading's candidates are the categories whose pass limits contain it,
+from the rule set's sorted interval index.  One candidate settles it.
+Several (overlapping limits) are resolved by what the station has mostly
+been running over the last ``WINDOW`` bottles and flagged as ambiguous.
+None means the bottle is out of every range, so it is judged against the
+station's recent majority and simply fails there; with no history the
+operator's selection is used.
+"""
+from collections import Counter, deque
+
+WINDOW = 10
+
+
+class SkuInference:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._recent = {}
+
+    def infer(self, rules, station, weight, fallback=None):
+        """Return (category, ambiguous) for a reading at ``station``."""
+        state = self._recent.get(station)
+        if state is None:
+            state = self._recent[station] = (deque(maxlen=self.window), Counter())
+        recent, counts = state
+        candidates = rules.candidates(weight)
+        ambiguous = len(candidates) > 1
+        if len(candidates) == 1:
+            category = candidates[0]
+        elif candidates:
+            # Most frequent recently; ties and no history keep index order.
+            category = max(candidates, key=lambda name: counts[name])
+        elif counts:
+            category = counts.most_common(1)[0][0]
+        else:
+            category = fallback
+        if category is not None and category in rules:
+            if len(recent) == recent.maxlen:
+                old = recent[0]
+                counts[old] -= 1
+                if not counts[old]:
+                    del counts[old]
+            recent.append(category)
+            counts[category] += 1
+        return category, ambiguous
@@ -0,0 +1,147 @@
+"""
+Real-time SPC drift detection on the ingest stream.
+
+``SpcMonitor`` is an ``ingest_worker`` handler: off the request thread it
+keeps, per (station, category), an EWMA, a two-sided tabular CUSUM and a
+rolling mean/std, each updated in O(1).  When a control rule trips an
+alarm is written to ``spc_alarms`` and passed to ``on_alarm``.
+
+The in-control target is the middle of the category's limits and the
+in-control sigma is a sixth of the tolerance, i.e. what a process with
+Cp = 1 would show; drift is judged against the specification rather than
+against whatever the line happens to be doing.
+"""
+import math
+import sqlite3
+from collections import deque
+
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0
+# CUSUM reference value and decision interval, in sigmas.
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+ROLLING_WINDOW = 50
+# Rolling std alarm when variation exceeds this multiple of the in-control sigma.
+STD_ALARM_RATIO = 1.5
+CLEAR_FRACTION = 0.5
+
+
+def ensure_alarm_table(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS spc_alarms
+                      (id INTEGER PRIMARY KEY, timestamp TEXT, station TEXT, category TEXT,
+                       rule TEXT, value REAL, message TEXT)""")
+
+
+class SpcState:
+    """Streaming control statistics for one station/category."""
+
+    def __init__(self, lower, upper, window=ROLLING_WINDOW):
+        self.limits = (lower, upper)
+        self.target = (lower + upper) / 2
+        self.sigma = (upper - lower) / 6 or 1.0
+        self.ewma = self.target
+        self.ewma_band = EWMA_L * self.sigma * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA))
+        self.cusum_hi = 0.0
+        self.cusum_lo = 0.0
+        self.window = deque(maxlen=window)
+        self.sum = 0.0
+        self.sum2 = 0.0
+        self.active = set()
+
+    @property
+    def n(self):
+        return len(self.window)
+
+    def rolling_mean(self):
+        return self.sum / self.n if self.n else None
+
+    def rolling_std(self):
+        if self.n < 2:
+            return None
+        var = (self.sum2 - self.sum * self.sum / self.n) / (self.n - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def update(self, weight):
+        """Add one reading and return the (rule, value, message) alarms it raises.
+
+        A rule alarms once when it trips and again only after it has cleared,
+        which needs its statistic back below ``CLEAR_FRACTION`` of the trip
+        level so noise around the threshold does not repeat the alarm.
+        """
+        if len(self.window) == self.window.maxlen:
+            old = self.window[0]
+            self.sum -= old
+            self.sum2 -= old * old
+        self.window.append(weight)
+        self.sum += weight
+        self.sum2 += weight * weight
+
+        self.ewma = EWMA_LAMBDA * weight + (1 - EWMA_LAMBDA) * self.ewma
+        z = (weight - self.target) / self.sigma
+        self.cusum_hi = max(0.0, self.cusum_hi + z - CUSUM_K)
+        self.cusum_lo = max(0.0, self.cusum_lo - z - CUSUM_K)
+
+        std = self.rolling_std()
+        full = self.n == self.window.maxlen
+        # (rule, excess over the in-control level, trip level, value, message)
+        checks = [
+            ("ewma_high", self.ewma - self.target, self.ewma_band, self.ewma,
+             f"EWMA {self.ewma:.2f} above {self.target + self.ewma_band:.2f}"),
+            ("ewma_low", self.target - self.ewma, self.ewma_band, self.ewma,
+             f"EWMA {self.ewma:.2f} below {self.target - self.ewma_band:.2f}"),
+            ("cusum_up", self.cusum_hi, CUSUM_H, self.cusum_hi, "CUSUM: sustained upward shift"),
+            ("cusum_down", self.cusum_lo, CUSUM_H, self.cusum_lo, "CUSUM: sustained downward shift"),
+            ("variation", std - self.sigma if full else 0.0, (STD_ALARM_RATIO - 1) * self.sigma, std,
+             f"Rolling std {std or 0.0:.2f} over last {self.n} bottles"),
+        ]
+        alarms = []
+        for rule, excess, level, value, message in checks:
+            if rule in self.active:
+                # Stay latched until the statistic is well back inside.
+                if excess < level * CLEAR_FRACTION:
+                    self.active.discard(rule)
+            elif excess > level:
+                self.active.add(rule)
+                alarms.append((rule, value, message))
+        return alarms
+
+
+class SpcMonitor:
+    """Keeps an ``SpcState`` per station/category and records the alarms they raise."""
+
+    def __init__(self, db_path, on_alarm=None):
+        self.on_alarm = on_alarm
+        self.states = {}
+        conn = sqlite3.connect(db_path)
+        ensure_alarm_table(conn.cursor())
+        conn.commit()
+        conn.close()
+
+    def process(self, cursor, station, category, weight, lower, upper, timestamp):
+        key = (station, category)
+        state = self.states.get(key)
+        if state is None or state.limits != (lower, upper):
+            state = self.states[key] = SpcState(lower, upper)
+        raised = []
+        for rule, value, message in state.update(weight):
+            cursor.execute("""INSERT INTO spc_alarms (timestamp, station, category, rule, value, message)
+                              VALUES (?, ?, ?, ?, ?, ?)""", (timestamp, station, category, rule, value, message))
+            alarm = {"id": cursor.lastrowid, "timestamp": timestamp, "station": station,
+                     "category": category, "rule": rule, "value": value, "message": message}
+            raised.append(alarm)
+            if self.on_alarm:
+                self.on_alarm(alarm)
+        return raised
+
+
+def read_alarms(cursor, since_id=0, station=None, limit=100):
+    sql = "SELECT id, timestamp, station, category, rule, value, message FROM spc_alarms WHERE id > ?"
+    params = [since_id]
+    if station:
+        sql += " AND station = ?"
+        params.append(station)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    cursor.execute(sql, params)
+    keys = ("id", "timestamp", "station", "category", "rule", "value", "message")
+    return [dict(zip(keys, row)) for row in cursor.fetchall()]
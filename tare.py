@@ -0,0 +1,54 @@
+"""
+Tare / zero-drift compensation for the ingest path.
+
+Load cells creep over a shift, so an empty scale slowly stops reading
+zero.  The scale also reports while it is empty: any reading below
+``IDLE_MAX_WEIGHT`` is taken as an idle (empty-pan) reading and folds into
+the station's baseline, an exponential moving average.  Bottle readings
+are corrected by subtracting the current baseline before they are
+classified.  Both steps are O(1) and touch no database on the bottle
+path; the baseline itself is saved on idle readings so a restart keeps it.
+"""
+from datetime import datetime
+
+from rollups import TS_FORMAT
+
+IDLE_MAX_WEIGHT = 20.0
+BASELINE_ALPHA = 0.1
+
+
+def ensure_tare_tables(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS tare_offsets
+                      (station TEXT PRIMARY KEY, baseline REAL, updated_at TEXT)""")
+    # The reading as sent by the scale, before compensation; weight holds the corrected value.
+    cursor.execute("PRAGMA table_info(records)")
+    if "raw_weight" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE records ADD COLUMN raw_weight REAL")
+
+
+class TareCompensator:
+    def __init__(self, idle_max=IDLE_MAX_WEIGHT, alpha=BASELINE_ALPHA):
+        self.idle_max = idle_max
+        self.alpha = alpha
+        self.offsets = {}
+
+    def load(self, cursor):
+        cursor.execute("SELECT station, baseline FROM tare_offsets")
+        self.offsets = dict(cursor.fetchall())
+
+    def is_idle(self, raw):
+        return abs(raw) < self.idle_max
+
+    def update_baseline(self, cursor, station, raw):
+        """Fold an idle reading into the station's baseline and save it; returns the new offset."""
+        offset = self.offsets.get(station)
+        offset = raw if offset is None else offset + self.alpha * (raw - offset)
+        self.offsets[station] = offset
+        cursor.execute("""
+            INSERT INTO tare_offsets (station, baseline, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(station) DO UPDATE SET baseline = excluded.baseline, updated_at = excluded.updated_at
+        """, (station, offset, datetime.now().strftime(TS_FORMAT)))
+        return offset
+
+    def correct(self, station, raw):
+        return raw - self.offsets.get(station, 0.0)
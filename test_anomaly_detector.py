@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for online sensor anomaly detection
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import record_stats
+from anomaly_detector import ANOMALY_REMARK, AnomalyDetector
+from rollups import add_to_rollup, ensure_rollups, rebuild_rollups
+
+
+def test_spikes_flagged_and_scatter_ignored():
+    """Spikes are anomalies; normal scatter and plain fails are not"""
+    print("Testing anomaly detector...")
+    rng = np.random.default_rng(9)
+    detector = AnomalyDetector(window=51)
+    flagged = [detector.check("line1", "Bottle category 1", w, 220.0, 260.0)
+               for w in rng.normal(240.0, 4.0, 2000)]
+    assert sum(flagged) == 0, "Normal scatter must never be flagged"
+
+    assert detector.check("line1", "Bottle category 1", 420.0, 220.0, 260.0), "Vibration spike"
+    assert detector.check("line1", "Bottle category 1", 95.0, 220.0, 260.0), "Half-placed bottle"
+    assert not detector.check("line1", "Bottle category 1", 252.0, 220.0, 260.0), "A plain fail is not an anomaly"
+    assert not detector.check("line2", "Bottle category 1", 420.0, 220.0, 260.0), "Each station starts unjudged"
+    assert not detector.check("line1", "Bottle category 1", 420.0, None, None), "No limits, nothing implausible"
+
+    ring, ordered = detector.recent[("line1", "Bottle category 1")]
+    assert len(ring) == len(ordered) == 51 and ordered == sorted(ring)
+    print("✓ Anomaly detector test passed")
+
+
+def test_tight_line_keeps_pass_and_fail():
+    """On a steady line, in-spec and ordinary underweight bottles are never anomalies"""
+    print("Testing tight line...")
+    rng = np.random.default_rng(2)
+    detector = AnomalyDetector()
+    for w in rng.normal(240.0, 1.0, 60):
+        assert not detector.check("line1", "Bottle category 1", float(w), 220.0, 260.0)
+    for w in (248.0, 259.0, 262.0, 215.0, 200.0, 185.0):
+        assert not detector.check("line1", "Bottle category 1", w, 220.0, 260.0), w
+    for w in (160.0, 12.5, 330.0):
+        assert detector.check("line1", "Bottle category 1", w, 220.0, 260.0), w
+    print("✓ Tight line test passed")
+
+
+def test_anomalies_left_out_of_statistics():
+    """Anomalies are counted apart and excluded from both statistics paths"""
+    print("Testing statistics exclusion...")
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 220.0, 260.0)")
+    ensure_rollups(cursor)
+    rng = np.random.default_rng(4)
+    start = datetime(2025, 1, 1, 5, 0, 0)
+    valid = []
+    for i in range(6000):
+        ts = (start + timedelta(seconds=3 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        if i % 500 == 7:
+            w, remark = 900.0, ANOMALY_REMARK
+        else:
+            w = float(rng.normal(240.0, 4.0))
+            remark = "Pass" if 220.0 <= w <= 260.0 else "Fail"
+            valid.append(w)
+        cursor.execute("INSERT INTO records VALUES (?, ?, 'Bottle category 1', ?)", (ts, w, remark))
+        add_to_rollup(cursor, ts, w, "Bottle category 1", remark)
+    cursor.execute("SELECT * FROM record_rollups ORDER BY hour")
+    incremental = cursor.fetchall()
+    rebuild_rollups(cursor)
+    cursor.execute("SELECT * FROM record_rollups ORDER BY hour")
+    rebuilt = cursor.fetchall()
+    assert len(rebuilt) == len(incremental)
+    for a, b in zip(incremental, rebuilt):
+        assert a[:5] == b[:5] and a[7:] == b[7:] and abs(a[5] - b[5]) < 1e-6, (a, b)
+    assert sum(r[-1] for r in rebuilt) == 12
+
+    exact = record_stats.range_statistics(cursor, "2025-01-01 05:00:00", "2025-01-01 09:59:59")
+    record_stats.ROLLUP_MIN_ROWS, saved = 0, record_stats.ROLLUP_MIN_ROWS
+    try:
+        rolled = record_stats.range_statistics(cursor, "2025-01-01 05:10:00", "2025-01-01 09:59:59")
+    finally:
+        record_stats.ROLLUP_MIN_ROWS = saved
+    assert exact["source"] == "records" and rolled["source"] == "rollups"
+    assert exact["max"] < 300 and rolled["max"] < 300
+    assert exact["count"] == len(valid) and abs(exact["mean"] - np.mean(valid)) < 1e-9
+    assert rolled["count"] == len(valid) - 199, "05:00-05:10 holds 200 readings, one an anomaly"
+    print("✓ Statistics exclusion test passed")
+
+
+if __name__ == "__main__":
+    print("Starting anomaly detector tests...\n")
+
+    try:
+        test_spikes_flagged_and_scatter_ignored()
+        test_tight_line_keeps_pass_and_fail()
+        test_anomalies_left_out_of_statistics()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
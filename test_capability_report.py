@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the parallel capability report
+"""
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from openpyxl import load_workbook
+
+from capability_report import capability_by_category, normality, write_capability_report
+
+
+def make_db(path, n=3000):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.executemany("INSERT INTO categories VALUES (?, ?, ?)",
+                       [("Bottle category 1", 220.0, 260.0), ("Bottle category 2", 230.0, 250.0)])
+    rng = np.random.default_rng(11)
+    start = datetime(2025, 1, 1, 6, 0, 0)
+    rows = []
+    for i in range(n):
+        cat = "Bottle category 1" if i % 2 else "Bottle category 2"
+        lo, hi = (220.0, 260.0) if i % 2 else (230.0, 250.0)
+        # Category 2 is skewed so its normality check must fail
+        w = float(rng.normal(240.0, 4.0)) if i % 2 else 232.0 + float(rng.exponential(4.0))
+        ts = (start + timedelta(seconds=5 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((ts, w, cat, "Pass" if lo <= w <= hi else "Fail"))
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def test_normality_check():
+    """Jarque-Bera accepts normal data and rejects skewed data"""
+    print("Testing normality check...")
+    rng = np.random.default_rng(3)
+    skew, kurt, jb, p = normality(rng.normal(0.0, 1.0, 5000))
+    assert abs(skew) < 0.1 and abs(kurt) < 0.2 and p > 0.01, (skew, kurt, p)
+    skew, kurt, jb, p = normality(rng.exponential(1.0, 5000))
+    assert skew > 1.5 and p < 1e-6, (skew, p)
+    assert normality(np.array([1.0, 1.0, 1.0])) == (None, None, None, None)
+    print("✓ Normality check test passed")
+
+
+def test_parallel_report_matches_numpy():
+    """Worker results match NumPy and do not depend on the number of workers"""
+    print("Testing capability report...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "records.db")
+        rows = make_db(db_path)
+        from_dt, to_dt = "2025-01-01 00:00:00", "2025-01-01 23:59:59"
+        sequential = capability_by_category(db_path, from_dt, to_dt, workers=1)
+        parallel = capability_by_category(db_path, from_dt, to_dt, workers=2)
+        assert sequential.keys() == parallel.keys() == {"Bottle category 1", "Bottle category 2"}
+
+        for name, (lo, hi) in (("Bottle category 1", (220.0, 260.0)), ("Bottle category 2", (230.0, 250.0))):
+            w = np.array([r[1] for r in rows if r[2] == name])
+            r = parallel[name]
+            assert r["count"] == w.size == sum(n for _, _, n in r["histogram"])
+            assert r["fail"] == sum(1 for row in rows if row[2] == name and row[3] == "Fail")
+            std = w.std(ddof=1)
+            assert abs(r["cp"] - (hi - lo) / (6 * std)) < 1e-9
+            assert abs(r["cpk"] - min(hi - w.mean(), w.mean() - lo) / (3 * std)) < 1e-9
+            assert r["histogram"][0][0] <= lo and r["histogram"][-1][1] >= hi
+            for key in ("mean", "std", "cp", "cpk", "p_value"):
+                assert abs(r[key] - sequential[name][key]) < 1e-12, key
+        assert parallel["Bottle category 1"]["p_value"] > 0.01
+        assert parallel["Bottle category 2"]["p_value"] < 1e-6
+
+        out = os.path.join(tmp, "capability.xlsx")
+        write_capability_report(db_path, out, from_dt, to_dt, workers=2)
+        wb = load_workbook(out, read_only=True)
+        summary = list(wb["Capability"].iter_rows(values_only=True))
+        assert [row[0] for row in summary[3:]] == ["Bottle category 1", "Bottle category 2"]
+        assert summary[3][-1] == "Yes" and summary[4][-1] == "No"
+        assert len(list(wb["Histograms"].iter_rows(values_only=True))) == 1 + 2 * 30
+        wb.close()
+    print("✓ Capability report test passed")
+
+
+if __name__ == "__main__":
+    print("Starting capability report tests...\n")
+
+    try:
+        test_normality_check()
+        test_parallel_report_matches_numpy()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled category rule engine
+"""
+import sqlite3
+
+from category_rules import compile_rules, ensure_rule_columns
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 220.0, 260.0)")
+    ensure_rule_columns(cursor)
+    ensure_rule_columns(cursor)
+    conn.commit()
+    return conn, cursor
+
+
+def test_two_band_category_matches_limits():
+    """A category without extra bands must behave exactly like lower <= weight <= upper"""
+    print("Testing plain limits...")
+    conn, cursor = make_db()
+    rules = compile_rules(cursor)
+    for w in (219.99, 220.0, 240.0, 260.0, 260.01):
+        band, remark = rules.evaluate("Bottle category 1", w)
+        assert remark == ("Pass" if 220.0 <= w <= 260.0 else "Fail"), (w, remark)
+        assert band == remark.lower()
+    print("✓ Plain limits test passed")
+
+
+def test_multi_band_category():
+    """Reject, fail, warn and pass bands with inclusive limits"""
+    print("Testing multi-band rules...")
+    conn, cursor = make_db()
+    cursor.execute("""INSERT INTO categories (name, lower_limit, upper_limit, reject_lower, reject_upper,
+                      warn_lower, warn_upper) VALUES ('SKU 7', 220.0, 260.0, 200.0, 280.0, 225.0, 255.0)""")
+    rules = compile_rules(cursor)
+    expected = [(199.9, "reject"), (200.0, "fail"), (219.9, "fail"), (220.0, "warn"), (224.9, "warn"),
+                (225.0, "pass"), (255.0, "pass"), (255.1, "warn"), (260.0, "warn"), (260.1, "fail"),
+                (280.0, "fail"), (280.1, "reject")]
+    for w, band in expected:
+        assert rules.evaluate("SKU 7", w)[0] == band, (w, rules.evaluate("SKU 7", w))
+    assert rules.evaluate("SKU 7", 222.0)[1] == "Pass"
+    assert rules.evaluate("SKU 7", 199.0)[1] == "Fail"
+    assert rules.limits("SKU 7") == (220.0, 260.0)
+    print("✓ Multi-band rules test passed")
+
+
+def test_bad_band_order_is_rejected():
+    """Bands that overlap the limits must fail to compile"""
+    print("Testing invalid bands...")
+    conn, cursor = make_db()
+    cursor.execute("UPDATE categories SET warn_lower = 210.0")
+    try:
+        compile_rules(cursor)
+        assert False, "Compiling should have failed"
+    except ValueError:
+        pass
+    print("✓ Invalid bands test passed")
+
+
+def test_many_skus():
+    """Every SKU of a large catalog evaluates against its own rules"""
+    print("Testing large catalog...")
+    conn, cursor = make_db()
+    cursor.executemany("INSERT INTO categories (name, lower_limit, upper_limit) VALUES (?, ?, ?)",
+                       [(f"SKU {i}", 100.0 + i, 110.0 + i) for i in range(1000)])
+    rules = compile_rules(cursor)
+    assert len(rules) == 1001
+    for i in range(0, 1000, 97):
+        assert rules.evaluate(f"SKU {i}", 105.0 + i) == ("pass", "Pass")
+        assert rules.evaluate(f"SKU {i}", 111.0 + i) == ("fail", "Fail")
+    assert "SKU 1000" not in rules
+    print("✓ Large catalog test passed")
+
+
+if __name__ == "__main__":
+    print("Starting category rule tests...\n")
+
+    try:
+        test_two_band_category_matches_limits()
+        test_multi_band_category()
+        test_bad_band_order_is_rejected()
+        test_many_skus()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for background export jobs
+"""
+import os
+import tempfile
+import threading
+import time
+
+from export_jobs import ExportJobManager
+
+
+def wait_for(job, statuses=("Done", "Cancelled", "Failed"), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in statuses:
+        assert time.monotonic() < deadline, f"{job.name} stuck in {job.status}"
+        time.sleep(0.01)
+
+
+def test_cancel_queued_and_running_jobs():
+    """A queued job never runs; a running one stops at its next report and keeps the old file"""
+    print("Testing export cancellation...")
+    manager = ExportJobManager()
+    release, started, ran = threading.Event(), threading.Event(), []
+
+    def blocking(job):
+        started.set()
+        release.wait(5)
+
+    def looping(job):
+        for i in range(1000):
+            with open(job.temp_path, "a") as f:
+                f.write("row\n")
+            job.report(i + 1, 1000)
+            time.sleep(0.005)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "records.csv")
+        with open(target, "w") as f:
+            f.write("previous export\n")
+
+        first = manager.submit("blocking", blocking)
+        queued = manager.submit("queued", lambda job: ran.append(job.name), target)
+        assert started.wait(5)
+        queued.cancel()
+        assert queued.status == "Cancelled"
+        running = manager.submit("running", looping, target)
+        release.set()
+        wait_for(first)
+        wait_for(running, ("Running",))
+        while running.done < 3:
+            time.sleep(0.01)
+        running.cancel()
+        wait_for(running)
+
+        assert ran == [], "A job cancelled while queued must never run"
+        assert first.status == "Done" and running.status == "Cancelled"
+        assert 3 <= running.done < 1000
+        assert os.listdir(tmp) == ["records.csv"], "The temporary file must be removed"
+        with open(target) as f:
+            assert f.read() == "previous export\n", "Cancelling must not touch the existing file"
+    print("✓ Export cancellation test passed")
+
+
+def test_failure_removes_output_and_success_replaces_it():
+    """A failed job leaves the old file; a finished one replaces it"""
+    print("Testing export failure and success...")
+    manager = ExportJobManager()
+
+    def failing(job):
+        with open(job.temp_path, "w") as f:
+            f.write("partial")
+        raise OSError("disk full")
+
+    def writing(job):
+        with open(job.temp_path, "w") as f:
+            f.write("new export\n")
+        job.report(1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "report.xlsx")
+        with open(target, "w") as f:
+            f.write("previous export\n")
+        failed = manager.submit("failing", failing, target)
+        wait_for(failed)
+        assert failed.status == "Failed" and failed.error == "disk full"
+        assert os.listdir(tmp) == ["report.xlsx"]
+        with open(target) as f:
+            assert f.read() == "previous export\n"
+
+        done = manager.submit("writing", writing, target)
+        wait_for(done)
+        assert done.status == "Done" and os.listdir(tmp) == ["report.xlsx"]
+        with open(target) as f:
+            assert f.read() == "new export\n"
+    print("✓ Export failure and success test passed")
+
+
+if __name__ == "__main__":
+    print("Starting export job tests...\n")
+
+    try:
+        test_cancel_queued_and_running_jobs()
+        test_failure_removes_output_and_success_replaces_it()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental "since last export" exports
+"""
+import csv
+import gzip
+import os
+import sqlite3
+import tempfile
+
+from openpyxl import load_workbook
+
+import exporters
+from exporters import (_sheet_title, export_since_last, export_watermark, pivot_rows, summary_rows, write_csv,
+                       write_excel)
+from record_stats import range_statistics
+from rollups import ensure_rollups
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    conn.commit()
+    return conn, cursor
+
+
+def add_rows(conn, cursor, start, n):
+    cursor.executemany(
+        "INSERT INTO records (timestamp, weight, category, remark) VALUES (?, ?, ?, ?)",
+        [(f"2025-01-01 08:{start + i:02d}:00", 240.0 + i, "Bottle category 1", "Pass") for i in range(n)]
+    )
+    conn.commit()
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))[1:]
+
+
+def test_each_run_exports_only_new_rows():
+    """A second run must write exactly the rows inserted after the first"""
+    print("Testing incremental export...")
+    conn, cursor = make_db()
+    add_rows(conn, cursor, 0, 3)
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "mes.csv")
+        assert export_since_last(cursor, "mes", out) == 3
+        assert len(read_csv(out)) == 3
+        assert export_watermark(cursor, "mes") == 3
+
+        assert export_since_last(cursor, "mes", out) == 0, "Nothing new must be a no-op"
+
+        add_rows(conn, cursor, 10, 2)
+        assert export_since_last(cursor, "mes", out) == 2
+        assert [r[0] for r in read_csv(out)] == ["2025-01-01 08:10:00", "2025-01-01 08:11:00"]
+        assert export_since_last(cursor, "other", os.path.join(tmp, "other.csv")) == 5, \
+            "Targets must keep separate watermarks"
+    print("✓ Incremental export test passed")
+
+
+def test_failed_export_keeps_watermark():
+    """A run that fails while writing must leave no file and an unchanged watermark"""
+    print("Testing failed incremental export...")
+    conn, cursor = make_db()
+    add_rows(conn, cursor, 0, 3)
+
+    def fail(done, total):
+        raise RuntimeError("disk full")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "mes.csv")
+        try:
+            export_since_last(cursor, "mes", out, progress=fail)
+            assert False, "Export should have failed"
+        except RuntimeError:
+            pass
+        assert os.listdir(tmp) == [], "Partial output must be removed"
+        assert export_watermark(cursor, "mes") == 0
+        assert export_since_last(cursor, "mes", out) == 3
+    print("✓ Failed export test passed")
+
+
+def test_lost_watermark_race_leaves_target_alone():
+    """A run that loses the compare-and-set must not replace the file it lost to"""
+    print("Testing concurrent incremental export...")
+    conn, cursor = make_db()
+    add_rows(conn, cursor, 0, 3)
+
+    def other_run_finishes(done, total):
+        other = conn.cursor()
+        other.execute("INSERT INTO export_watermarks (target, last_rowid) VALUES ('mes', 3)")
+        conn.commit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "mes.csv")
+        with open(out, "w", encoding="utf-8") as f:
+            f.write("written by the other run\n")
+        try:
+            export_since_last(cursor, "mes", out, progress=other_run_finishes)
+            assert False, "Export should have lost the race"
+        except RuntimeError:
+            pass
+        assert os.listdir(tmp) == ["mes.csv"]
+        with open(out, encoding="utf-8") as f:
+            assert f.read() == "written by the other run\n"
+        assert export_watermark(cursor, "mes") == 3
+    print("✓ Concurrent export test passed")
+
+
+def test_csv_round_trip():
+    """Plain and gzip CSV read back to the same rows; the CLI writes the same file"""
+    print("Testing CSV export...")
+    conn, cursor = make_db()
+    add_rows(conn, cursor, 0, 20)
+    cursor.execute("INSERT INTO records VALUES ('2025-01-01 08:05:30', 231.5, 'Bottle, \"special\"', 'Fail')")
+    conn.commit()
+    cursor.execute("SELECT timestamp, weight, category, remark FROM records "
+                   "WHERE timestamp BETWEEN '2025-01-01 08:03:00' AND '2025-01-01 08:12:00' "
+                   "ORDER BY timestamp DESC")
+    expected = [[ts, repr(w), cat, remark] for ts, w, cat, remark in cursor.fetchall()]
+
+    progress = []
+    with tempfile.TemporaryDirectory() as tmp:
+        plain, packed = os.path.join(tmp, "range.csv"), os.path.join(tmp, "range.csv.gz")
+        assert write_csv(cursor, plain, "2025-01-01 08:03:00", "2025-01-01 08:12:00",
+                         total=11, progress=lambda done, total: progress.append((done, total))) == 11
+        assert progress[-1] == (11, 11)
+        assert write_csv(cursor, packed, "2025-01-01 08:03:00", "2025-01-01 08:12:00") == 11
+        with open(plain, newline="", encoding="utf-8") as f:
+            plain_rows = list(csv.reader(f))
+        with gzip.open(packed, "rt", newline="", encoding="utf-8") as f:
+            packed_rows = list(csv.reader(f))
+        assert plain_rows[0] == exporters.EXPORT_HEADERS
+        assert plain_rows[1:] == packed_rows[1:] == expected
+
+        db_path = os.path.join(tmp, "scale.db")
+        disk = sqlite3.connect(db_path)
+        conn.backup(disk)
+        disk.close()
+        cli_out = os.path.join(tmp, "cli.csv.gz")
+        assert exporters.main(["csv", "--db", db_path, "--from", "2025-01-01 08:03:00",
+                               "--to", "2025-01-01 08:12:00", "--out", cli_out]) == 0
+        with gzip.open(cli_out, "rt", newline="", encoding="utf-8") as f:
+            assert list(csv.reader(f)) == packed_rows
+    print("✓ CSV export test passed")
+
+
+def test_excel_rolls_over_to_new_sheets():
+    """Records and the summary rows spill onto numbered sheets at the row limit"""
+    print("Testing Excel sheet rollover...")
+    conn, cursor = make_db()
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 220.0, 260.0)")
+    add_rows(conn, cursor, 0, 12)
+    ensure_rollups(cursor)
+    stats = range_statistics(cursor, "2025-01-01 00:00:00", "2025-01-01 23:59:59")
+    summary = summary_rows(stats)
+    assert len(summary) == 9
+    assert ["", "", "Sensor anomalies", 0] in summary
+
+    saved, exporters.EXCEL_MAX_ROWS = exporters.EXCEL_MAX_ROWS, 5
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "records.xlsx")
+            assert write_excel(cursor, out, "2025-01-01 00:00:00", "2025-01-01 23:59:59", stats) == 12
+            wb = load_workbook(out, read_only=True)
+            # 12 records + 9 summary rows at 4 data rows per sheet
+            assert wb.sheetnames == ["Records"] + [f"Records ({n})" for n in range(2, 7)]
+            sheets = [list(wb[name].iter_rows(values_only=True)) for name in wb.sheetnames]
+            wb.close()
+    finally:
+        exporters.EXCEL_MAX_ROWS = saved
+    assert [len(rows) for rows in sheets] == [5, 5, 5, 5, 5, 2]
+    assert all(list(rows[0]) == exporters.EXPORT_HEADERS for rows in sheets)
+    data = [row for rows in sheets for row in rows[1:]]
+    assert [row[0] for row in data[:12]] == [f"2025-01-01 08:{i:02d}:00" for i in range(11, -1, -1)]
+    assert [row[2] for row in data[12:]] == [row[2] for row in summary], "Summary follows the records"
+    print("✓ Excel rollover test passed")
+
+
+def test_pivot_rows_match_records():
+    """The hour x category pivot agrees with the records, including partial edge hours"""
+    print("Testing report pivot...")
+    conn, cursor = make_db()
+    rows = [(f"2025-01-01 {6 + i // 30:02d}:{(2 * i) % 60:02d}:00", 240.0,
+             "Bottle category 1" if i % 3 else "Bottle category 2", "Fail" if i % 4 == 0 else "Pass")
+            for i in range(120)]
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+    ensure_rollups(cursor)
+    from_dt, to_dt = "2025-01-01 06:30:00", "2025-01-01 09:29:59"
+    categories = ["Bottle category 1", "Bottle category 2"]
+    headers, table = pivot_rows(cursor, from_dt, to_dt, categories)
+    assert headers[:4] == ["Hour", "Bottle category 1 Pass", "Bottle category 1 Fail", "Bottle category 1 Fail rate"]
+    assert headers[-3:] == ["Total Pass", "Total Fail", "Total Fail rate"]
+    assert [row[0] for row in table] == ["2025-01-01 06:00", "2025-01-01 07:00", "2025-01-01 08:00",
+                                         "2025-01-01 09:00"]
+    for row in table:
+        in_hour = [r for r in rows if r[0].startswith(row[0][:13]) and from_dt <= r[0] <= to_dt]
+        for i, name in enumerate(categories + [None]):
+            picked = [r for r in in_hour if name is None or r[2] == name]
+            n_fail = sum(r[3] == "Fail" for r in picked)
+            assert row[1 + 3 * i:4 + 3 * i] == [len(picked) - n_fail, n_fail, n_fail / len(picked)], (row, name)
+    print("✓ Report pivot test passed")
+
+
+def test_sheet_titles_are_valid_and_unique():
+    """Category names become legal, unique Excel sheet names"""
+    print("Testing sheet titles...")
+    taken = {"statistics", "pivot"}
+    assert _sheet_title("Bottle 1/2 [500ml]: *new?*", taken) == "Bottle 1_2 _500ml__ _new__"
+    assert _sheet_title("Pivot", taken) == "Pivot (2)", "Names are unique regardless of case"
+    assert _sheet_title(None, taken) == "(none)"
+    long_name = "A very long bottle category name indeed"
+    first, second = _sheet_title(long_name, taken), _sheet_title(long_name, taken)
+    assert first == long_name[:31] and second == long_name[:27] + " (2)"
+    assert len(second) == 31 and first.lower() in taken and second.lower() in taken
+    print("✓ Sheet title test passed")
+
+
+if __name__ == "__main__":
+    print("Starting exporter tests...\n")
+
+    try:
+        test_each_run_exports_only_new_rows()
+        test_failed_export_keeps_watermark()
+        test_lost_watermark_race_leaves_target_alone()
+        test_csv_round_trip()
+        test_excel_rolls_over_to_new_sheets()
+        test_pivot_rows_match_records()
+        test_sheet_titles_are_valid_and_unique()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the HTTP query endpoints
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+from flask import Flask
+
+import v7
+from rollups import ensure_rollups
+from spc_monitor import ensure_alarm_table
+
+
+def make_client(tmp):
+    db_path = os.path.join(tmp, "scale.db")
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 220.0, 260.0)")
+    cursor.executemany("INSERT INTO records VALUES (?, ?, 'Bottle category 1', ?)",
+                       [(f"2025-01-01 08:{i:02d}:00", 230.0 + i, "Pass" if i < 31 else "Fail") for i in range(40)])
+    ensure_rollups(cursor)
+    ensure_alarm_table(cursor)
+    conn.commit()
+    conn.close()
+
+    # Routes only need the database path, so skip the GUI and license start-up
+    scale = v7.SmartWeighingScale.__new__(v7.SmartWeighingScale)
+    scale.db_path = db_path
+    scale.app = Flask("test")
+    scale.setup_flask_routes()
+    return scale.app.test_client()
+
+
+def test_json_queries():
+    """Query endpoints validate their range and answer from their own connection"""
+    print("Testing JSON query endpoints...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client = make_client(tmp)
+        for path in ("/stats", "/percentiles", "/histogram", "/throughput"):
+            response = client.get(path + "?from=2025-01-01 08:00:00")
+            assert response.status_code == 400 and "required" in response.get_json()["error"], path
+
+        stats = client.get("/stats?from=2025-01-01 08:00:00&to=2025-01-01 08:59:59").get_json()
+        assert (stats["count"], stats["pass"], stats["fail"]) == (40, 31, 9)
+        response = client.get("/percentiles?from=2025-01-01 08:00:00&to=2025-01-01 08:59:59&p=x")
+        assert response.status_code == 400, "Bad input is reported, not raised"
+        assert client.get("/alarms").get_json() == {"alarms": []}
+    print("✓ JSON query endpoint test passed")
+
+
+def test_records_stream():
+    """/records streams NDJSON or CSV, gzip-compressed only when the client accepts it"""
+    print("Testing record streaming...")
+    with tempfile.TemporaryDirectory() as tmp:
+        client = make_client(tmp)
+        query = "/records?from=2025-01-01 08:10:00&to=2025-01-01 08:19:59"
+        response = client.get(query)
+        assert response.mimetype == "application/x-ndjson" and "Content-Encoding" not in response.headers
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [r["timestamp"] for r in rows] == [f"2025-01-01 08:{i:02d}:00" for i in range(19, 9, -1)]
+        assert rows[0] == {"timestamp": "2025-01-01 08:19:00", "weight": 249.0,
+                           "category": "Bottle category 1", "remark": "Pass"}
+
+        response = client.get(query + "&format=csv", headers={"Accept-Encoding": "gzip, deflate"})
+        assert response.headers["Content-Encoding"] == "gzip" and response.mimetype == "text/csv"
+        table = list(csv.reader(io.StringIO(gzip.decompress(response.get_data()).decode("utf-8"))))
+        assert table[0] == ["timestamp", "weight", "category", "remark"] and len(table) == 11
+
+        response = client.get(query, headers={"Accept-Encoding": "gzip;q=0, identity"})
+        assert "Content-Encoding" not in response.headers, "q=0 refuses gzip"
+        assert len(response.get_data(as_text=True).splitlines()) == 10
+
+        assert client.get(query + "&format=xml").status_code == 400
+        assert client.get("/records?from=2025-01-01 08:10:00").status_code == 400
+    print("✓ Record streaming test passed")
+
+
+if __name__ == "__main__":
+    print("Starting HTTP endpoint tests...\n")
+
+    try:
+        test_json_queries()
+        test_records_stream()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the post-verdict analytics worker
+"""
+import os
+import sqlite3
+import tempfile
+
+from ingest_worker import IngestWorker
+
+
+class CountingHandler:
+    def __init__(self, table="counts"):
+        self.table = table
+        self.pending = 0
+
+    def process(self, cursor, station, category, weight, lower, upper, timestamp):
+        self.pending += 1
+
+    def flush(self, cursor):
+        cursor.execute(f"UPDATE {self.table} SET n = n + ?", (self.pending,))
+        self.pending = 0
+
+
+def test_stop_flushes_pending_readings():
+    """Stopping the worker must process the queue and flush before the thread ends"""
+    print("Testing ingest worker shutdown...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scale.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE counts (n INTEGER)")
+        conn.execute("INSERT INTO counts VALUES (0)")
+        conn.commit()
+
+        worker = IngestWorker(db_path, [CountingHandler()])
+        worker.start()
+        for i in range(250):
+            worker.submit("line1", "Bottle category 1", 240.0, 220.0, 260.0, "2025-01-01 06:00:00")
+        worker.stop()
+        assert worker._thread is None
+        assert conn.execute("SELECT n FROM counts").fetchone()[0] == 250
+        worker.stop()
+        conn.close()
+    print("✓ Ingest worker shutdown test passed")
+
+
+def test_anomalies_only_reach_anomaly_handlers():
+    """Anomalous readings go to the bottle-counting handlers only"""
+    print("Testing anomaly routing...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scale.db")
+        conn = sqlite3.connect(db_path)
+        for table in ("weights", "bottles"):
+            conn.execute(f"CREATE TABLE {table} (n INTEGER)")
+            conn.execute(f"INSERT INTO {table} VALUES (0)")
+        conn.commit()
+
+        bottles = CountingHandler("bottles")
+        worker = IngestWorker(db_path, [CountingHandler("weights"), bottles], anomaly_handlers=[bottles])
+        worker.start()
+        for i in range(100):
+            worker.submit("line1", "Bottle category 1", 240.0, 220.0, 260.0, "2025-01-01 06:00:00",
+                          anomaly=i % 10 == 0)
+        worker.stop()
+        assert conn.execute("SELECT n FROM weights").fetchone()[0] == 90
+        assert conn.execute("SELECT n FROM bottles").fetchone()[0] == 100
+        conn.close()
+    print("✓ Anomaly routing test passed")
+
+
+if __name__ == "__main__":
+    print("Starting ingest worker tests...\n")
+
+    try:
+        test_stop_flushes_pending_readings()
+        test_anomalies_only_reach_anomaly_handlers()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the PDF reports
+"""
+import os
+import re
+import sqlite3
+import tempfile
+
+import numpy as np
+from pypdf import PdfReader
+
+import pdf_report
+from anomaly_detector import ANOMALY_REMARK
+from pdf_report import ControlChart, render_range_pdf, render_summary_pdf
+from rollups import ensure_rollups
+
+FROM_DT, TO_DT = "2025-01-01 00:00:00", "2025-01-01 23:59:59"
+
+
+def make_db(path, n):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE INDEX idx_records_timestamp ON records (timestamp)")
+    cursor.executemany(
+        "INSERT INTO records (timestamp, weight, category, remark) VALUES (?, ?, ?, ?)",
+        [(f"2025-01-01 {8 + i // 60:02d}:{i % 60:02d}:00", 240.0 + i / 100, "Bottle category 1",
+          "Fail" if i % 7 == 0 else "Pass") for i in range(n)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def page_texts(path):
+    return [page.extract_text() for page in PdfReader(path).pages]
+
+
+def footers(texts):
+    return [re.search(r"Page (\d+)/(\d+)", text).groups() for text in texts]
+
+
+def test_parallel_render_matches_sequential():
+    """Rendering in parts gives the same pages and page numbers as one pass"""
+    print("Testing parallel PDF rendering...")
+    saved = pdf_report.PAGES_PER_PART, pdf_report.PARALLEL_MIN_PAGES
+    pdf_report.PAGES_PER_PART, pdf_report.PARALLEL_MIN_PAGES = 2, 1
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "scale.db")
+            make_db(db_path, 150)
+            sequential, parallel = os.path.join(tmp, "seq.pdf"), os.path.join(tmp, "par.pdf")
+            render_range_pdf(db_path, sequential, FROM_DT, TO_DT, 150, workers=1)
+            progress = []
+            render_range_pdf(db_path, parallel, FROM_DT, TO_DT, 150, workers=2,
+                             progress=lambda done, total: progress.append((done, total)))
+            seq_texts, par_texts = page_texts(sequential), page_texts(parallel)
+    finally:
+        pdf_report.PAGES_PER_PART, pdf_report.PARALLEL_MIN_PAGES = saved
+
+    # 150 rows at 20 per page, rendered as 4 parts of 2 pages
+    assert len(seq_texts) == len(par_texts) == 8
+    assert len(progress) == 4 and progress[-1] == (8, 8)
+    assert footers(par_texts) == footers(seq_texts) == [(str(i), "8") for i in range(1, 9)]
+    strip = lambda text: re.sub(r"Generated: \S+ \S+", "", text)
+    assert [strip(t) for t in par_texts] == [strip(t) for t in seq_texts], "Parts must hold the same rows in order"
+    print("✓ Parallel PDF rendering test passed")
+
+
+def test_control_chart_streams_chunks():
+    """Chunked X-bar/R figures match the chart computed on all weights at once"""
+    print("Testing streamed control chart...")
+    weights = np.random.default_rng(7).normal(240.0, 2.0, 10_003)
+    groups = weights[:10_000].reshape(2000, 5)
+    means, ranges = groups.mean(axis=1), groups.max(axis=1) - groups.min(axis=1)
+    pick = np.unique(np.linspace(0, 1999, 100).astype(int))
+
+    chart = ControlChart(weights.size)
+    for chunk in np.array_split(weights, 37):
+        chart.add(chunk)
+    result = chart.result()
+    assert result["subgroups"] == 2000
+    assert np.array_equal(result["means"], means[pick]) and np.array_equal(result["ranges"], ranges[pick])
+    assert abs(result["xbar"] - means.mean()) < 1e-9 and abs(result["rbar"] - ranges.mean()) < 1e-9
+
+    short = ControlChart(7)
+    short.add(np.ones(7))
+    assert short.result() is None, "One complete subgroup is not a chart"
+    print("✓ Streamed control chart test passed")
+
+
+def test_summary_pdf_leaves_out_anomalies():
+    """The summary report renders from the streamed weights, skipping anomalies"""
+    print("Testing summary PDF...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scale.db")
+        make_db(db_path, 150)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+        cursor.execute("INSERT INTO categories VALUES ('Bottle category 1', 238.0, 244.0)")
+        cursor.execute("INSERT INTO records VALUES ('2025-01-01 09:00:30', 9999.0, 'Bottle category 1', ?)",
+                       (ANOMALY_REMARK,))
+        ensure_rollups(cursor)
+        conn.commit()
+        stats = pdf_report.range_statistics(cursor, FROM_DT, TO_DT)
+        counts, edges, chart = pdf_report._weight_figures(cursor, FROM_DT, TO_DT, None, stats)
+        assert counts.sum() == 150 and edges[0] == 240.0 and edges[-1] == 241.49
+        assert chart["subgroups"] == 30
+
+        out = os.path.join(tmp, "summary.pdf")
+        progress = []
+        render_summary_pdf(cursor, out, FROM_DT, TO_DT, progress=lambda done, total: progress.append(done))
+        conn.close()
+        texts = page_texts(out)
+    assert progress == [1, 2, 3, 4]
+    assert "Bottles" in texts[0] and "150" in texts[0]
+    assert "X-bar chart (subgroups of 5, 30 total)" in texts[1]
+    print("✓ Summary PDF test passed")
+
+
+if __name__ == "__main__":
+    print("Starting PDF report tests...\n")
+
+    try:
+        test_parallel_render_matches_sequential()
+        test_control_chart_streams_chunks()
+        test_summary_pdf_leaves_out_anomalies()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming quantile sketches
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from quantile_sketch import SketchStore, TDigest, ensure_sketches, range_percentiles
+
+PERCENTILES = [1, 5, 25, 50, 75, 95, 99]
+# Allowed error, in percentile ranks, of a sketch estimate.
+MAX_RANK_ERROR = 0.005
+
+
+def rank_errors(sorted_values, estimates, percentiles):
+    return [abs(np.searchsorted(sorted_values, e) / len(sorted_values) - p / 100)
+            for e, p in zip(estimates, percentiles)]
+
+
+def test_single_digest_accuracy():
+    """One digest fed value by value must track np.percentile in rank"""
+    print("Testing single digest accuracy...")
+    rng = np.random.default_rng(11)
+    values = np.concatenate([rng.normal(240.0, 6.0, 40_000), rng.normal(255.0, 2.0, 5_000)])
+    digest = TDigest()
+    for v in values:
+        digest.add(float(v))
+    estimates = digest.quantiles([p / 100 for p in PERCENTILES])
+    exact = np.percentile(values, PERCENTILES)
+    assert max(rank_errors(np.sort(values), estimates, PERCENTILES)) < MAX_RANK_ERROR, (estimates, exact)
+    assert np.allclose(estimates, exact, atol=0.5), (estimates, exact)
+    assert digest.quantiles([0.0, 1.0]) == [values.min(), values.max()]
+    print("✓ Single digest accuracy test passed")
+
+
+def test_merged_digests_accuracy():
+    """Digests merged after a round trip through bytes must stay accurate"""
+    print("Testing merged digest accuracy...")
+    rng = np.random.default_rng(5)
+    hours = [rng.normal(240.0 + h * 0.3, 5.0, 2_000) for h in range(48)]
+    merged = TDigest()
+    for values in hours:
+        part = TDigest()
+        part.add_many(values)
+        merged.merge(TDigest.from_bytes(part.to_bytes()))
+    values = np.concatenate(hours)
+    assert merged.n == values.size
+    estimates = merged.quantiles([p / 100 for p in PERCENTILES])
+    assert max(rank_errors(np.sort(values), estimates, PERCENTILES)) < MAX_RANK_ERROR
+    assert len(merged.to_bytes()) < 4096, "A digest must stay small however much it has seen"
+    print("✓ Merged digest accuracy test passed")
+
+
+def test_range_percentiles_from_store():
+    """Range percentiles from ingested sketches plus edge records must match the exact values"""
+    print("Testing range percentiles...")
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    ensure_sketches(cursor)
+    store = SketchStore()
+    rng = np.random.default_rng(9)
+    start = datetime(2025, 1, 1, 6, 0, 0)
+    rows = []
+    for i in range(30_000):
+        ts = (start + timedelta(seconds=3 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        w = float(rng.normal(240.0, 5.0))
+        rows.append((ts, w, "Bottle category 1", "Pass"))
+        store.process(cursor, "line1", "Bottle category 1", w, 220.0, 260.0, ts)
+        if i % 5000 == 0:
+            store.flush(cursor)
+    store.flush(cursor)
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+
+    from_dt, to_dt = "2025-01-01 07:20:00", "2025-01-01 22:40:00"
+    exact = np.sort([w for ts, w, _, _ in rows if from_dt <= ts <= to_dt])
+    result = range_percentiles(cursor, from_dt, to_dt, PERCENTILES, category="Bottle category 1")
+    estimates = [result[f"p{p}"] for p in PERCENTILES]
+    assert max(rank_errors(exact, estimates, PERCENTILES)) < MAX_RANK_ERROR, (estimates,)
+    print("✓ Range percentiles test passed")
+
+
+if __name__ == "__main__":
+    print("Starting quantile sketch tests...\n")
+
+    try:
+        test_single_digest_accuracy()
+        test_merged_digests_accuracy()
+        test_range_percentiles_from_store()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the record range query cache
+"""
+import sqlite3
+
+from query_cache import RecordQueryCache, bump_data_version
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE data_versions (name TEXT PRIMARY KEY, version INTEGER)")
+    cursor.executemany(
+        "INSERT INTO records (timestamp, weight, category, remark) VALUES (?, ?, ?, ?)",
+        [
+            ("2025-01-01 08:00:00", 240.0, "Bottle category 1", "Pass"),
+            ("2025-01-01 09:00:00", 270.0, "Bottle category 1", "Fail"),
+        ]
+    )
+    conn.commit()
+    return conn, cursor
+
+
+def counting_loader(cursor, from_dt, to_dt, calls):
+    def load():
+        calls.append(1)
+        cursor.execute("SELECT * FROM records WHERE timestamp BETWEEN ? AND ?", (from_dt, to_dt))
+        return cursor.fetchall()
+    return load
+
+
+def test_closed_range_survives_inserts():
+    """Rows appended outside a cached range must not invalidate it"""
+    print("Testing closed range caching...")
+    conn, cursor = make_db()
+    cache = RecordQueryCache()
+    calls = []
+    rng = ("2025-01-01 00:00:00", "2025-01-01 23:59:59")
+    load = counting_loader(cursor, *rng, calls)
+
+    assert len(cache.get_or_load(cursor, ("records",) + rng, *rng, load)) == 2
+    cursor.execute("INSERT INTO records VALUES ('2025-01-02 08:00:00', 241.0, 'Bottle category 1', 'Pass')")
+    assert len(cache.get_or_load(cursor, ("records",) + rng, *rng, load)) == 2
+    assert len(calls) == 1 and cache.hits == 1
+
+    cursor.execute("INSERT INTO records VALUES ('2025-01-01 10:00:00', 241.0, 'Bottle category 1', 'Pass')")
+    assert len(cache.get_or_load(cursor, ("records",) + rng, *rng, load)) == 3
+    assert len(calls) == 2
+    print("✓ Closed range caching test passed")
+
+
+def test_version_bump_invalidates():
+    """Bumping a data version must force a reload"""
+    print("\nTesting data version invalidation...")
+    conn, cursor = make_db()
+    cache = RecordQueryCache()
+    calls = []
+    rng = ("2025-01-01 00:00:00", "2025-01-01 23:59:59")
+    load = counting_loader(cursor, *rng, calls)
+
+    cache.get_or_load(cursor, ("records",) + rng, *rng, load)
+    bump_data_version(cursor, "categories")
+    cache.get_or_load(cursor, ("records",) + rng, *rng, load)
+    cache.get_or_load(cursor, ("records",) + rng, *rng, load)
+    assert len(calls) == 2
+    print("✓ Data version invalidation test passed")
+
+
+def test_byte_cap_evicts_lru():
+    """The oldest entry is evicted once the byte cap is exceeded"""
+    print("\nTesting LRU eviction...")
+    conn, cursor = make_db()
+    cache = RecordQueryCache(max_bytes=1000)
+    rows = [("2025-01-01 08:00:00", 240.0, "Bottle category 1", "Pass")] * 4
+
+    for i in range(3):
+        cache.get_or_load(cursor, ("records", i), "", "", lambda: rows)
+    assert cache.total_bytes <= 1000
+    assert ("records", 0) not in cache._entries
+    assert ("records", 2) in cache._entries
+    print("✓ LRU eviction test passed")
+
+
+if __name__ == "__main__":
+    print("Starting query cache tests...\n")
+
+    try:
+        test_closed_range_survives_inserts()
+        test_version_bump_invalidates()
+        test_byte_cap_evicts_lru()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
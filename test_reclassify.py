@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for what-if limits and retroactive reclassification
+"""
+import sqlite3
+
+import numpy as np
+
+from reclassify import WhatIf, reclassify
+from rollups import ensure_rollups
+
+
+def make_db(weights):
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE data_versions (name TEXT PRIMARY KEY, version INTEGER)")
+    cursor.executemany(
+        "INSERT INTO records (timestamp, weight, category, remark) VALUES (?, ?, ?, ?)",
+        [(f"2025-01-01 {8 + i // 60:02d}:{i % 60:02d}:00", w, "Bottle category 1",
+          "Pass" if 220.0 <= w <= 260.0 else "Fail") for i, w in enumerate(weights)]
+    )
+    ensure_rollups(cursor)
+    conn.commit()
+    return conn, cursor
+
+
+def test_sweep_matches_brute_force():
+    """Every candidate pair must match a direct count, including limits equal to a weight"""
+    print("Testing what-if sweep...")
+    rng = np.random.default_rng(3)
+    weights = np.round(rng.normal(240.0, 10.0, 5000), 1)
+    whatif = WhatIf(weights)
+    lowers = [215.0, 220.0, weights[0]]
+    uppers = [255.0, 260.0, weights[1], 100.0]
+    for lo, hi, n_pass, n_fail, rate in whatif.sweep(lowers, uppers):
+        expected = int(np.count_nonzero((weights >= lo) & (weights <= hi)))
+        assert n_pass == expected, (lo, hi, n_pass, expected)
+        assert n_pass + n_fail == len(weights)
+        assert abs(rate - n_fail / len(weights)) < 1e-12
+    print("✓ What-if sweep test passed")
+
+
+def test_reclassify_updates_remarks_and_rollups():
+    """Reclassification must rewrite remarks in chunks and keep the rollups exact"""
+    print("Testing reclassification...")
+    weights = [215.0, 225.0, 235.0, 245.0, 255.0, 265.0] * 30
+    conn, cursor = make_db(weights)
+    changed = reclassify(conn, "Bottle category 1", 230.0, 250.0,
+                         "2025-01-01 00:00:00", "2025-01-01 23:59:59", chunk_rows=7)
+    assert changed == 60, changed
+
+    cursor.execute("SELECT weight, remark FROM records")
+    for w, remark in cursor.fetchall():
+        assert remark == ("Pass" if 230.0 <= w <= 250.0 else "Fail"), (w, remark)
+
+    cursor.execute("SELECT hour, n_pass, n_fail FROM record_rollups ORDER BY hour")
+    incremental = cursor.fetchall()
+    cursor.execute("""SELECT substr(timestamp, 1, 13), SUM(remark = 'Pass'), SUM(remark = 'Fail')
+                      FROM records GROUP BY 1 ORDER BY 1""")
+    assert incremental == cursor.fetchall()
+
+    cursor.execute("SELECT version FROM data_versions WHERE name = 'records'")
+    assert cursor.fetchone()[0] > 0, "Cached ranges must be invalidated"
+    print("✓ Reclassification test passed")
+
+
+if __name__ == "__main__":
+    print("Starting reclassification tests...\n")
+
+    try:
+        test_sweep_matches_brute_force()
+        test_reclassify_updates_remarks_and_rollups()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the record range statistics engine
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import record_stats
+from anomaly_detector import ANOMALY_REMARK
+from quantile_sketch import ensure_sketches
+from rollups import ensure_rollups, rebuild_rollups
+
+
+def make_db(n=2000):
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    cursor.execute("CREATE TABLE categories (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)")
+    cursor.executemany("INSERT INTO categories VALUES (?, ?, ?)",
+                       [("Bottle category 1", 220.0, 260.0), ("Bottle category 2", 230.0, 250.0)])
+    rng = np.random.default_rng(7)
+    start = datetime(2025, 1, 1, 6, 0, 0)
+    rows = []
+    for i in range(n):
+        cat = "Bottle category 1" if i % 3 else "Bottle category 2"
+        w = float(rng.normal(240.0, 4.0))
+        lo, hi = (220.0, 260.0) if cat == "Bottle category 1" else (230.0, 250.0)
+        ts = (start + timedelta(seconds=7 * i)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((ts, w, cat, "Pass" if lo <= w <= hi else "Fail"))
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)", rows)
+    ensure_rollups(cursor)
+    conn.commit()
+    return cursor, rows
+
+
+def test_exact_statistics():
+    """Exact statistics match a direct NumPy computation"""
+    print("Testing exact statistics...")
+    cursor, rows = make_db()
+    stats = record_stats.range_statistics(cursor, "2025-01-01 00:00:00", "2025-01-01 23:59:59")
+    w = np.array([r[1] for r in rows])
+    assert stats["source"] == "records"
+    assert stats["count"] == len(rows)
+    assert stats["pass"] + stats["fail"] == len(rows)
+    assert abs(stats["mean"] - w.mean()) < 1e-9
+    assert abs(stats["std"] - w.std(ddof=1)) < 1e-9
+    assert abs(stats["percentiles"]["p50"] - np.median(w)) < 1e-9
+
+    cat = stats["categories"]["Bottle category 2"]
+    cw = np.array([r[1] for r in rows if r[2] == "Bottle category 2"])
+    assert abs(cat["cp"] - 20.0 / (6 * cw.std(ddof=1))) < 1e-9
+    print("✓ Exact statistics test passed")
+
+
+def test_rollup_statistics_match_exact():
+    """Rollup-backed statistics agree with the exact path, including partial edge hours"""
+    print("\nTesting rollup statistics...")
+    cursor, rows = make_db()
+    from_dt, to_dt = "2025-01-01 06:17:03", "2025-01-01 09:41:00"
+    exact = record_stats.range_statistics(cursor, from_dt, to_dt)
+    record_stats.ROLLUP_MIN_ROWS, saved = 0, record_stats.ROLLUP_MIN_ROWS
+    try:
+        rolled = record_stats.range_statistics(cursor, from_dt, to_dt)
+    finally:
+        record_stats.ROLLUP_MIN_ROWS = saved
+    assert rolled["source"] == "rollups"
+    for key in ("count", "pass", "fail", "min", "max"):
+        assert rolled[key] == exact[key], key
+    assert abs(rolled["mean"] - exact["mean"]) < 1e-9
+    assert abs(rolled["std"] - exact["std"]) < 1e-6
+    assert abs(rolled["categories"]["Bottle category 1"]["cpk"] - exact["categories"]["Bottle category 1"]["cpk"]) < 1e-6
+    print("✓ Rollup statistics test passed")
+
+
+def test_incomplete_sketches_give_no_percentiles():
+    """Sketches that miss readings, e.g. after a crash, must not pass for the whole range"""
+    print("\nTesting rollup percentiles with missing sketches...")
+    cursor, rows = make_db()
+    ensure_sketches(cursor)
+    from_dt, to_dt = "2025-01-01 06:17:03", "2025-01-01 09:41:00"
+    record_stats.ROLLUP_MIN_ROWS, saved = 0, record_stats.ROLLUP_MIN_ROWS
+    try:
+        complete = record_stats.range_statistics(cursor, from_dt, to_dt)
+        cursor.execute("DELETE FROM rollup_sketches WHERE hour = '2025-01-01 08' AND category = 'Bottle category 2'")
+        partial = record_stats.range_statistics(cursor, from_dt, to_dt)
+    finally:
+        record_stats.ROLLUP_MIN_ROWS = saved
+    assert complete["source"] == partial["source"] == "rollups"
+    w = np.array([r[1] for r in rows if from_dt <= r[0] <= to_dt])
+    assert abs(complete["percentiles"]["p50"] - np.median(w)) < 0.5
+    assert complete["categories"]["Bottle category 2"]["percentiles"] is not None
+    assert partial["categories"]["Bottle category 2"]["percentiles"] is None
+    assert partial["percentiles"] is None
+    assert partial["categories"]["Bottle category 1"]["percentiles"] == complete["categories"]["Bottle category 1"]["percentiles"]
+    assert partial["count"] == complete["count"], "Counts still come from the rollups"
+    print("✓ Missing sketch test passed")
+
+
+def test_load_weights_skips_anomalies():
+    """The shared weight loader returns valid weights with their Fail flags"""
+    print("\nTesting weight loading...")
+    cursor, rows = make_db()
+    cursor.execute("INSERT INTO records VALUES ('2025-01-01 07:00:00', 9999.0, 'Bottle category 2', ?)",
+                   (ANOMALY_REMARK,))
+    from_dt, to_dt = "2025-01-01 06:30:00", "2025-01-01 08:30:00"
+    weights, failed = record_stats.load_weights(cursor, from_dt, to_dt, "Bottle category 2")
+    picked = [r for r in rows if from_dt <= r[0] <= to_dt and r[2] == "Bottle category 2"]
+    assert weights.tolist() == [r[1] for r in picked]
+    assert failed.tolist() == [r[3] == "Fail" for r in picked]
+    weights, failed = record_stats.load_weights(cursor, "2025-02-01 00:00:00", "2025-02-01 23:59:59")
+    assert weights.size == 0 and failed.dtype == bool
+    print("✓ Weight loading test passed")
+
+
+def test_anomalies_counted_on_both_paths():
+    """Anomalies are left out of the figures but counted, from records and from the rollups"""
+    print("\nTesting anomaly counts...")
+    cursor, rows = make_db()
+    anomalies = [("2025-01-01 06:20:00", "Bottle category 1"), ("2025-01-01 08:05:00", "Bottle category 2"),
+                 ("2025-01-01 08:06:00", "Bottle category 2"), ("2025-01-01 09:40:00", "Bottle category 1")]
+    cursor.executemany("INSERT INTO records VALUES (?, 9999.0, ?, ?)",
+                       [(ts, cat, ANOMALY_REMARK) for ts, cat in anomalies])
+    rebuild_rollups(cursor)
+    from_dt, to_dt = "2025-01-01 06:17:03", "2025-01-01 09:41:00"
+    exact = record_stats.range_statistics(cursor, from_dt, to_dt)
+    record_stats.ROLLUP_MIN_ROWS, saved = 0, record_stats.ROLLUP_MIN_ROWS
+    try:
+        rolled = record_stats.range_statistics(cursor, from_dt, to_dt)
+    finally:
+        record_stats.ROLLUP_MIN_ROWS = saved
+    cursor.execute("SELECT COUNT(*) FROM records WHERE timestamp BETWEEN ? AND ?", (from_dt, to_dt))
+    in_range = cursor.fetchone()[0]
+    for stats in (exact, rolled):
+        assert stats["anomaly"] == 4 and stats["count"] + stats["anomaly"] == in_range, stats["source"]
+        assert stats["max"] < 9999.0
+        assert stats["categories"]["Bottle category 1"]["anomaly"] == 2
+        assert stats["categories"]["Bottle category 2"]["anomaly"] == 2
+    print("✓ Anomaly count test passed")
+
+
+if __name__ == "__main__":
+    print("Starting statistics engine tests...\n")
+
+    try:
+        test_exact_statistics()
+        test_rollup_statistics_match_exact()
+        test_incomplete_sketches_give_no_percentiles()
+        test_load_weights_skips_anomalies()
+        test_anomalies_counted_on_both_paths()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for keyset pagination of the records grid
+"""
+import sqlite3
+
+import records_query
+from records_query import fetch_page
+from rollups import ensure_rollups
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    for column in ("timestamp", "weight", "category", "remark"):
+        cursor.execute(f"CREATE INDEX idx_records_{column} ON records ({column})")
+    # Few distinct weights and remarks, so pages must break ties on rowid
+    cursor.executemany("INSERT INTO records VALUES (?, ?, ?, ?)",
+                       [(f"2025-01-01 {6 + i // 60:02d}:{i % 60:02d}:00", 240.0 + i % 5,
+                         f"Bottle category {1 + i % 2}", "Pass" if i % 3 else "Fail") for i in range(100)])
+    ensure_rollups(cursor)
+    return cursor
+
+
+def all_pages(cursor, order_by, descending, from_dt="2025-01-01 06:10:00", to_dt="2025-01-01 07:20:00"):
+    rows, after, pages = [], None, 0
+    while True:
+        page, after = fetch_page(cursor, from_dt, to_dt, order_by, descending, after, limit=7)
+        rows += page
+        pages += 1
+        if after is None:
+            return rows, pages
+
+
+def test_pages_cover_range_in_order():
+    """Walking every page returns each record once, in sort order, with or without the sort index"""
+    print("Testing keyset pagination...")
+    cursor = make_db()
+    cursor.execute("SELECT rowid, timestamp, weight, category, remark FROM records "
+                   "WHERE timestamp BETWEEN '2025-01-01 06:10:00' AND '2025-01-01 07:20:00'")
+    expected = cursor.fetchall()
+    assert len(expected) == 71
+    saved = records_query._prefer_sort_index
+    try:
+        for prefer_index in (False, True):
+            records_query._prefer_sort_index = lambda *args: prefer_index
+            for order_by, pos in (("timestamp", 1), ("weight", 2), ("category", 3), ("remark", 4)):
+                for descending in (True, False):
+                    rows, pages = all_pages(cursor, order_by, descending)
+                    want = sorted(expected, key=lambda r: (r[pos], r[0]), reverse=descending)
+                    assert rows == [r[1:] for r in want], (order_by, descending, prefer_index)
+                    assert pages == 11, "71 rows at 7 per page"
+    finally:
+        records_query._prefer_sort_index = saved
+
+    page, after = fetch_page(cursor, "2025-01-02 00:00:00", "2025-01-02 23:59:59")
+    assert page == [] and after is None
+    try:
+        fetch_page(cursor, "2025-01-01 00:00:00", "2025-01-01 23:59:59", order_by="rowid; DROP TABLE records")
+        assert False, "Unknown sort columns must be refused"
+    except ValueError:
+        pass
+    print("✓ Keyset pagination test passed")
+
+
+if __name__ == "__main__":
+    print("Starting records query tests...\n")
+
+    try:
+        test_pages_cover_range_in_order()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script for scheduled report failure handling
+"""
+import os
+import sqlite3
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+
+import report_scheduler
+from report_scheduler import ReportScheduler
+
+
+def test_failed_report_is_retried_without_blocking_others():
+    """A failing report backs off and gives up; the reports after it still run"""
+    print("Testing scheduled report failures...")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scale.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+        conn.execute("INSERT INTO records VALUES ('2025-01-01 07:00:00', 240.0, 'Bottle category 1', 'Pass')")
+        conn.commit()
+
+        scheduler = ReportScheduler(db_path, os.path.join(tmp, "reports"), [("shift", "pdf"), ("shift", "csv")])
+        calls = []
+
+        def generate(fmt, from_dt, to_dt, path):
+            calls.append((fmt, from_dt))
+            if fmt == "pdf":
+                raise subprocess.CalledProcessError(1, "generate")
+            open(path, "w").close()
+
+        scheduler._generate = generate
+        now = datetime(2025, 1, 1, 14, 30, 0)
+        scheduler.run_due(now)
+        assert calls == [("pdf", "2025-01-01 06:00:00"), ("csv", "2025-01-01 06:00:00")], calls
+
+        scheduler.run_due(now + timedelta(minutes=1))
+        assert len(calls) == 2, "Retry must wait for the backoff"
+
+        # Backoff doubles: 5, 10, 20 minutes after attempts 1, 2, 3
+        for minutes in (5, 15, 35, 300):
+            scheduler.run_due(now + timedelta(minutes=minutes))
+        assert [c[0] for c in calls] == ["pdf", "csv", "pdf", "pdf", "pdf"], calls
+        assert len(calls) == 1 + report_scheduler.MAX_ATTEMPTS
+
+        runs = dict((name, rest) for name, *rest in conn.execute(
+            "SELECT name, status, attempts, error FROM report_runs"))
+        assert runs["2025-01-01 Shift A pdf"][:2] == ["failed", report_scheduler.MAX_ATTEMPTS]
+        assert "exit status 1" in runs["2025-01-01 Shift A pdf"][2]
+        assert runs["2025-01-01 Shift A csv"][:2] == ["done", 1]
+        conn.close()
+    print("✓ Scheduled report failure test passed")
+
+
+if __name__ == "__main__":
+    print("Starting report scheduler tests...\n")
+
+    try:
+        test_failed_report_is_retried_without_blocking_others()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for hour/shift/day rollup buckets
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from anomaly_detector import ANOMALY_REMARK
+from rollups import bucket_of, bucket_rollups, ensure_rollups
+
+
+def test_bucket_of():
+    """Hours map to their hour, day and shift, with shift C crossing midnight"""
+    print("Testing bucket mapping...")
+    assert bucket_of("2025-01-01 09", "hour") == ("2025-01-01 09:00", "2025-01-01 09:00:00", "2025-01-01 09:59:59")
+    assert bucket_of("2025-01-01 09", "day") == ("2025-01-01", "2025-01-01 00:00:00", "2025-01-01 23:59:59")
+    assert bucket_of("2025-01-01 06", "shift") == ("2025-01-01 Shift A", "2025-01-01 06:00:00", "2025-01-01 13:59:59")
+    assert bucket_of("2025-01-01 13", "shift")[0] == "2025-01-01 Shift A"
+    assert bucket_of("2025-01-01 14", "shift")[0] == "2025-01-01 Shift B"
+    night = ("2025-01-01 Shift C", "2025-01-01 22:00:00", "2025-01-02 05:59:59")
+    assert bucket_of("2025-01-01 22", "shift") == night
+    assert bucket_of("2025-01-02 00", "shift") == night, "After midnight still belongs to the evening's shift"
+    assert bucket_of("2025-01-02 05", "shift") == night
+    try:
+        bucket_of("2025-01-01 09", "week")
+        assert False, "Unknown granularity must be refused"
+    except ValueError:
+        pass
+    print("✓ Bucket mapping test passed")
+
+
+def test_bucket_rollups_clip_and_drill_down():
+    """Buckets are clipped to the range and their bounds select exactly their records"""
+    print("Testing rollup buckets...")
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    start = datetime(2025, 1, 1, 21, 0, 0)
+    cursor.executemany("INSERT INTO records VALUES (?, ?, 'Bottle category 1', ?)",
+                       [((start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"), 240.0 + i % 3,
+                         "Fail" if i % 10 == 0 else "Pass") for i in range(10 * 60)])
+    cursor.executemany("INSERT INTO records VALUES (?, 9999.0, 'Bottle category 1', ?)",
+                       [(ts, ANOMALY_REMARK) for ts in ("2025-01-01 21:45:30", "2025-01-01 23:10:30",
+                                                        "2025-01-02 03:00:30", "2025-01-02 06:10:30")])
+    ensure_rollups(cursor)
+
+    # Both ends fall inside an hour, so the edge hours come from the records
+    from_dt, to_dt = "2025-01-01 21:30:00", "2025-01-02 06:29:59"
+    buckets = bucket_rollups(cursor, from_dt, to_dt, "shift")
+    assert [(b[0], b[1], b[2], b[3]) for b in buckets] == [
+        ("2025-01-01 Shift B", "2025-01-01 21:30:00", "2025-01-01 21:59:59", 30),
+        ("2025-01-01 Shift C", "2025-01-01 22:00:00", "2025-01-02 05:59:59", 480),
+        ("2025-01-02 Shift A", "2025-01-02 06:00:00", "2025-01-02 06:29:59", 30),
+    ]
+    assert [b[8] for b in buckets] == [1, 2, 1], "Anomalies are counted apart from the bottles"
+    for label, first, last, n, n_pass, n_fail, fail_rate, mean, n_anomaly in buckets:
+        cursor.execute("SELECT COUNT(*), SUM(remark = 'Pass'), SUM(remark = 'Fail'), AVG(weight) "
+                       "FROM records WHERE timestamp BETWEEN ? AND ? AND remark IS NOT ?",
+                       (first, last, ANOMALY_REMARK))
+        count, passed, failed, avg = cursor.fetchone()
+        assert (n, n_pass, n_fail) == (count, passed, failed), label
+        assert abs(mean - avg) < 1e-9 and abs(fail_rate - failed / count) < 1e-12
+
+    hours = bucket_rollups(cursor, from_dt, to_dt, "hour")
+    assert len(hours) == 10 and hours[0][1:4] == ("2025-01-01 21:30:00", "2025-01-01 21:59:59", 30)
+    [day1, day2] = bucket_rollups(cursor, from_dt, to_dt, "day")
+    assert day1[1:4] == ("2025-01-01 21:30:00", "2025-01-01 23:59:59", 150)
+    assert day2[1:4] == ("2025-01-02 00:00:00", "2025-01-02 06:29:59", 390)
+    print("✓ Rollup bucket test passed")
+
+
+if __name__ == "__main__":
+    print("Starting rollup tests...\n")
+
+    try:
+        test_bucket_of()
+        test_bucket_rollups_clip_and_drill_down()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script for automatic category inference
+"""
+from category_rules import CategoryRules
+from sku_inference import SkuInference
+
+
+def make_rules():
+    # Two overlapping bottle sizes and one far away
+    return CategoryRules([
+        ("330 ml", 300.0, 340.0, None, None, None, None),
+        ("350 ml", 330.0, 370.0, None, None, None, None),
+        ("1 l", 950.0, 1050.0, None, None, None, None),
+    ])
+
+
+def test_unique_band_wins():
+    """A weight inside exactly one category's limits picks it without ambiguity"""
+    print("Testing unique match...")
+    rules = make_rules()
+    inference = SkuInference()
+    assert inference.infer(rules, "line1", 310.0) == ("330 ml", False)
+    assert inference.infer(rules, "line1", 1000.0) == ("1 l", False)
+    print("✓ Unique match test passed")
+
+
+def test_overlap_resolved_by_recent_majority():
+    """In an overlap the station's recent run decides, and the reading is flagged"""
+    print("Testing overlap resolution...")
+    rules = make_rules()
+    inference = SkuInference(window=5)
+    for _ in range(5):
+        inference.infer(rules, "line1", 360.0)
+    assert inference.infer(rules, "line1", 335.0) == ("350 ml", True)
+    assert inference.infer(rules, "line2", 335.0)[1], "Other stations keep their own history"
+    for _ in range(5):
+        inference.infer(rules, "line1", 305.0)
+    assert inference.infer(rules, "line1", 335.0) == ("330 ml", True), "The window must slide"
+    print("✓ Overlap resolution test passed")
+
+
+def test_out_of_range_uses_running_category():
+    """A reject bottle is judged against what the line is running, or the operator's choice"""
+    print("Testing out-of-range readings...")
+    rules = make_rules()
+    inference = SkuInference()
+    assert inference.infer(rules, "line1", 500.0, fallback="1 l") == ("1 l", False)
+    for _ in range(3):
+        inference.infer(rules, "line1", 310.0)
+    assert inference.infer(rules, "line1", 280.0, fallback="1 l") == ("330 ml", False)
+    print("✓ Out-of-range test passed")
+
+
+if __name__ == "__main__":
+    print("Starting SKU inference tests...\n")
+
+    try:
+        test_unique_band_wins()
+        test_overlap_resolved_by_recent_majority()
+        test_out_of_range_uses_running_category()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming SPC drift detection
+"""
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+
+from spc_monitor import SpcMonitor, SpcState, read_alarms
+
+
+def test_in_control_stream_is_quiet():
+    """A centred, capable process must not raise alarms"""
+    print("Testing in-control stream...")
+    rng = np.random.default_rng(7)
+    state = SpcState(220.0, 260.0)
+    alarms = []
+    for w in rng.normal(240.0, 4.0, 5000):
+        alarms += state.update(float(w))
+    assert alarms == [], alarms
+    print("✓ In-control test passed")
+
+
+def test_rolling_stats_match_numpy():
+    """The O(1) rolling mean/std must equal a direct computation over the window"""
+    print("Testing rolling statistics...")
+    rng = np.random.default_rng(1)
+    weights = rng.normal(240.0, 5.0, 500)
+    state = SpcState(220.0, 260.0, window=50)
+    for w in weights:
+        state.update(float(w))
+    assert abs(state.rolling_mean() - weights[-50:].mean()) < 1e-9
+    assert abs(state.rolling_std() - weights[-50:].std(ddof=1)) < 1e-9
+    print("✓ Rolling statistics test passed")
+
+
+def test_drift_raises_alarm_once():
+    """A slow upward drift must alarm before bottles fail, once per rule, and be stored"""
+    print("Testing drift detection...")
+    rng = np.random.default_rng(2)
+    weights = np.concatenate([rng.normal(240.0, 3.0, 300), 240.0 + np.linspace(0, 15, 300) + rng.normal(0, 3.0, 300)])
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "scale.db")
+        monitor = SpcMonitor(db)
+        conn = sqlite3.connect(db)
+        cursor = conn.cursor()
+        first_alarm = None
+        for i, w in enumerate(weights):
+            raised = monitor.process(cursor, "line1", "Bottle category 1", float(w), 220.0, 260.0,
+                                     f"2025-01-01 08:{i // 60:02d}:{i % 60:02d}")
+            if raised and first_alarm is None:
+                first_alarm = i
+        conn.commit()
+        assert first_alarm is not None and 300 < first_alarm < 500, first_alarm
+        assert np.all(weights[300:first_alarm] < 260.0 + 10.0)
+        alarms = read_alarms(cursor)
+        rules = [a["rule"] for a in alarms]
+        assert "cusum_up" in rules and "ewma_high" in rules, rules
+        assert rules.count("cusum_up") == 1, "A sustained shift must alarm once"
+        conn.close()
+    print("✓ Drift detection test passed")
+
+
+if __name__ == "__main__":
+    print("Starting SPC monitor tests...\n")
+
+    try:
+        test_in_control_stream_is_quiet()
+        test_rolling_stats_match_numpy()
+        test_drift_raises_alarm_once()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
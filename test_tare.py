@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Test script for tare / zero-drift compensation
+"""
+import sqlite3
+
+from tare import TareCompensator, ensure_tare_tables
+
+
+def make_db():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE records (timestamp TEXT, weight REAL, category TEXT, remark TEXT)")
+    ensure_tare_tables(cursor)
+    ensure_tare_tables(cursor)
+    return conn, cursor
+
+
+def test_raw_weight_column_added_once():
+    """The raw_weight column must be added to an existing records table exactly once"""
+    print("Testing schema upgrade...")
+    conn, cursor = make_db()
+    cursor.execute("PRAGMA table_info(records)")
+    columns = [row[1] for row in cursor.fetchall()]
+    assert columns == ["timestamp", "weight", "category", "remark", "raw_weight"], columns
+    print("✓ Schema upgrade test passed")
+
+
+def test_baseline_tracks_idle_drift():
+    """Idle readings move the baseline and bottle readings are corrected by it"""
+    print("Testing drift compensation...")
+    conn, cursor = make_db()
+    tare = TareCompensator()
+    assert tare.correct("line1", 240.0) == 240.0, "No baseline yet means no correction"
+    assert not tare.is_idle(240.0) and tare.is_idle(1.5) and tare.is_idle(-0.8)
+
+    drift = 0.0
+    for _ in range(200):
+        drift += 0.01
+        tare.update_baseline(cursor, "line1", drift)
+    assert abs(tare.offsets["line1"] - drift) < 0.1, tare.offsets["line1"]
+    assert abs(tare.correct("line1", 240.0 + drift) - 240.0) < 0.1
+    assert tare.correct("line2", 240.0) == 240.0, "Stations drift independently"
+
+    restarted = TareCompensator()
+    restarted.load(cursor)
+    assert restarted.offsets == tare.offsets
+    print("✓ Drift compensation test passed")
+
+
+if __name__ == "__main__":
+    print("Starting tare tests...\n")
+
+    try:
+        test_raw_weight_column_added_once()
+        test_baseline_tracks_idle_drift()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for line throughput and downtime analytics
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from throughput import ThroughputTracker, downtime_between, ensure_throughput_tables, line_efficiency
+
+
+def run_line(cursor, tracker, start, gaps, station="line1"):
+    t = start
+    tracker.process(cursor, station, "Bottle category 1", 240.0, 220.0, 260.0, t.strftime("%Y-%m-%d %H:%M:%S"))
+    for gap in gaps:
+        t += timedelta(seconds=gap)
+        tracker.process(cursor, station, "Bottle category 1", 240.0, 220.0, 260.0, t.strftime("%Y-%m-%d %H:%M:%S"))
+    return t
+
+
+def test_throughput_and_stop_across_hours():
+    """Cycle time, bottles per minute and a stop spanning an hour boundary"""
+    print("Testing throughput and downtime...")
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    ensure_throughput_tables(cursor)
+    tracker = ThroughputTracker(downtime_seconds=60)
+    # 06:00:00 - 06:50:00 at 2 s per bottle, a 20 minute stop, then 10 more minutes
+    end = run_line(cursor, tracker, datetime(2025, 1, 1, 6, 0, 0), [2] * 1500)
+    tracker.flush(cursor)
+    end = run_line(cursor, tracker, end + timedelta(minutes=20), [2] * 300)
+    # The first reading after the stop closes it
+    tracker.flush(cursor)
+
+    [shift] = line_efficiency(cursor, "2025-01-01 06:00:00", "2025-01-01 13:59:59", "shift")
+    assert shift["bottles"] == 1802
+    assert abs(shift["bpm"] - 30.0) < 1e-9
+    assert shift["stops"] == 1
+    assert abs(shift["downtime_minutes"] - 20.0) < 1e-9
+    assert abs(shift["availability"] - 60 / 80) < 1e-9
+    assert shift["gap_histogram"]["gap_2"] == 1800 and shift["gap_histogram"]["gap_long"] == 1
+
+    hours = {b["bucket"]: b for b in line_efficiency(cursor, "2025-01-01 06:00:00", "2025-01-01 07:59:59", "hour")}
+    assert abs(hours["2025-01-01 06:00"]["downtime_minutes"] - 10.0) < 1e-9, "Stop must be split at the hour"
+    assert abs(hours["2025-01-01 07:00"]["downtime_minutes"] - 10.0) < 1e-9
+
+    [stop] = downtime_between(cursor, "2025-01-01 06:00:00", "2025-01-01 07:59:59")
+    assert stop == ("line1", "2025-01-01 06:50:00", "2025-01-01 07:10:00", 1200.0)
+    print("✓ Throughput and downtime test passed")
+
+
+def test_stations_are_independent():
+    """Interleaved stations must not see each other's gaps"""
+    print("Testing station separation...")
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    ensure_throughput_tables(cursor)
+    tracker = ThroughputTracker()
+    run_line(cursor, tracker, datetime(2025, 1, 1, 6, 0, 0), [3] * 100, station="line1")
+    run_line(cursor, tracker, datetime(2025, 1, 1, 6, 0, 1), [5] * 100, station="line2")
+    tracker.flush(cursor)
+    [one] = line_efficiency(cursor, "2025-01-01 06:00:00", "2025-01-01 06:59:59", "hour", station="line1")
+    [two] = line_efficiency(cursor, "2025-01-01 06:00:00", "2025-01-01 06:59:59", "hour", station="line2")
+    assert abs(one["bpm"] - 20.0) < 1e-9 and abs(two["bpm"] - 12.0) < 1e-9
+    assert one["stops"] == two["stops"] == 0
+    print("✓ Station separation test passed")
+
+
+if __name__ == "__main__":
+    print("Starting throughput tests...\n")
+
+    try:
+        test_throughput_and_stop_across_hours()
+        test_stations_are_independent()
+        print("\n🎉 All tests passed successfully!")
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,163 @@
+"""
+Line throughput and downtime from inter-arrival gaps.
+
+``ThroughputTracker`` is an ``ingest_worker`` handler.  Per station it only
+remembers the previous reading's time; each new reading adds one gap to
+the station's hourly row in ``throughput_rollups`` (count, sum, sum of
+squares, max and a fixed-bin histogram).  A gap longer than
+``DOWNTIME_SECONDS`` is a stop: it goes to ``downtime_intervals`` and its
+length is split over the hours it spans instead of counting as cycle time.
+
+Queries read only those two tables, at hour resolution, so line
+efficiency for a shift or a month never touches ``records``.
+"""
+import math
+from datetime import datetime, timedelta
+
+from rollups import HOUR_FORMAT, TS_FORMAT, bucket_of
+
+DOWNTIME_SECONDS = 60
+# Upper edges (seconds) of the inter-arrival histogram; longer gaps go to gap_long.
+GAP_BINS = (1, 2, 5, 10, 30, 60)
+GAP_COLUMNS = tuple(f"gap_{edge}" for edge in GAP_BINS) + ("gap_long",)
+_SUMS = ("n", "n_gaps", "sum_gap", "sum_gap2", "downtime_s") + GAP_COLUMNS
+
+
+def ensure_throughput_tables(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS throughput_rollups
+                      (hour TEXT, station TEXT, n INTEGER, n_gaps INTEGER, sum_gap REAL, sum_gap2 REAL,
+                       max_gap REAL, downtime_s REAL, """
+                   + ", ".join(f"{c} INTEGER" for c in GAP_COLUMNS)
+                   + ", PRIMARY KEY (hour, station))")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS downtime_intervals
+                      (id INTEGER PRIMARY KEY, station TEXT, start TEXT, end TEXT, seconds REAL)""")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_downtime_end ON downtime_intervals (end)")
+
+
+def gap_column(gap):
+    for edge, column in zip(GAP_BINS, GAP_COLUMNS):
+        if gap <= edge:
+            return column
+    return "gap_long"
+
+
+def split_by_hour(start, end):
+    """Yield (hour key, seconds) for the part of [start, end) in each hour."""
+    while start < end:
+        next_hour = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        stop = min(next_hour, end)
+        yield start.strftime(HOUR_FORMAT), (stop - start).total_seconds()
+        start = stop
+
+
+class ThroughputTracker:
+    def __init__(self, downtime_seconds=DOWNTIME_SECONDS):
+        self.downtime_seconds = downtime_seconds
+        self.last = {}
+        self.pending = {}
+
+    def _row(self, hour, station):
+        row = self.pending.get((hour, station))
+        if row is None:
+            row = self.pending[(hour, station)] = dict.fromkeys(_SUMS, 0)
+            row["max_gap"] = 0.0
+        return row
+
+    def process(self, cursor, station, category, weight, lower, upper, timestamp):
+        now = datetime.strptime(timestamp, TS_FORMAT)
+        row = self._row(timestamp[:13], station)
+        row["n"] += 1
+        previous = self.last.get(station)
+        self.last[station] = now
+        if previous is None or now < previous:
+            return
+        gap = (now - previous).total_seconds()
+        row[gap_column(gap)] += 1
+        if gap > self.downtime_seconds:
+            cursor.execute("INSERT INTO downtime_intervals (station, start, end, seconds) VALUES (?, ?, ?, ?)",
+                           (station, previous.strftime(TS_FORMAT), timestamp, gap))
+            for hour, seconds in split_by_hour(previous, now):
+                self._row(hour, station)["downtime_s"] += seconds
+        else:
+            row["n_gaps"] += 1
+            row["sum_gap"] += gap
+            row["sum_gap2"] += gap * gap
+            row["max_gap"] = max(row["max_gap"], gap)
+
+    def flush(self, cursor):
+        if not self.pending:
+            return
+        columns = _SUMS + ("max_gap",)
+        cursor.executemany(
+            "INSERT INTO throughput_rollups (hour, station, " + ", ".join(columns) + ") VALUES (?, ?"
+            + ", ?" * len(columns) + ") ON CONFLICT(hour, station) DO UPDATE SET "
+            + ", ".join(f"{c} = {c} + excluded.{c}" for c in _SUMS)
+            + ", max_gap = MAX(max_gap, excluded.max_gap)",
+            [(hour, station) + tuple(row[c] for c in columns) for (hour, station), row in self.pending.items()])
+        self.pending = {}
+
+
+# ---------------- Queries ----------------
+def line_efficiency(cursor, from_dt, to_dt, granularity="shift", station=None):
+    """Per-bucket throughput for the hours overlapping a range.
+
+    Each bucket is a dict with bottles, running and effective bottles per
+    minute, availability, mean/std inter-arrival, longest running gap,
+    stops and the inter-arrival histogram.
+    """
+    sql = ("SELECT hour, SUM(n), SUM(n_gaps), SUM(sum_gap), SUM(sum_gap2), MAX(max_gap), SUM(downtime_s), "
+           + ", ".join(f"SUM({c})" for c in GAP_COLUMNS)
+           + " FROM throughput_rollups WHERE hour BETWEEN ? AND ?")
+    params = [from_dt[:13], to_dt[:13]]
+    if station:
+        sql += " AND station = ?"
+        params.append(station)
+    cursor.execute(sql + " GROUP BY hour", params)
+    buckets = {}
+    for hour, *vals in cursor.fetchall():
+        key = bucket_of(hour, granularity)
+        b = buckets.get(key)
+        if b is None:
+            buckets[key] = list(vals)
+        else:
+            for i, v in enumerate(vals):
+                b[i] = max(b[i], v) if i == 4 else b[i] + v
+    stops = _stop_counts(cursor, from_dt, to_dt, granularity, station)
+
+    out = []
+    for (label, first, last), (n, n_gaps, sum_gap, sum_gap2, max_gap, downtime, *hist) in sorted(
+            buckets.items(), key=lambda kv: kv[0][1]):
+        observed = sum_gap + downtime
+        std = None
+        if n_gaps > 1:
+            std = math.sqrt(max(sum_gap2 - sum_gap * sum_gap / n_gaps, 0.0) / (n_gaps - 1))
+        out.append({
+            "bucket": label, "from": first, "to": last, "bottles": n,
+            "bpm": 60 * n_gaps / sum_gap if sum_gap else None,
+            "effective_bpm": 60 * n / observed if observed else None,
+            "availability": sum_gap / observed if observed else None,
+            "run_minutes": sum_gap / 60, "downtime_minutes": downtime / 60,
+            "stops": stops.get(label, 0),
+            "mean_gap": sum_gap / n_gaps if n_gaps else None, "std_gap": std, "max_gap": max_gap,
+            "gap_histogram": dict(zip(GAP_COLUMNS, hist)),
+        })
+    return out
+
+
+def _stop_counts(cursor, from_dt, to_dt, granularity, station):
+    counts = {}
+    for row in downtime_between(cursor, from_dt[:13] + ":00:00", to_dt[:13] + ":59:59", station):
+        label = bucket_of(row[2][:13], granularity)[0]
+        counts[label] = counts.get(label, 0) + 1
+    return counts
+
+
+def downtime_between(cursor, from_dt, to_dt, station=None):
+    """Return (station, start, end, seconds) stops that ended inside a range."""
+    sql = "SELECT station, start, end, seconds FROM downtime_intervals WHERE end BETWEEN ? AND ?"
+    params = [from_dt, to_dt]
+    if station:
+        sql += " AND station = ?"
+        params.append(station)
+    cursor.execute(sql + " ORDER BY start", params)
+    return cursor.fetchall()
@@ -6,15 +6,33 @@ import pandas as pd
 from tkcalendar import DateEntry
 import threading
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import subprocess
+import csv
+import io
+import json
+import zlib
 
 from PIL import Image, ImageTk
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
+
+from query_cache import RecordQueryCache, bump_data_version
+from record_stats import range_statistics
+from rollups import ensure_rollups, add_to_rollup, bucket_rollups
+from records_query import RECORD_COLUMNS, iter_records, fetch_page
+from exporters import write_excel, write_excel_report, write_csv
+from export_jobs import ExportJobManager
+from pdf_report import render_range_pdf, render_summary_pdf
+from report_scheduler import ReportScheduler
+from reclassify import WhatIf, reclassify
+from spc_monitor import SpcMonitor, read_alarms
+from quantile_sketch import SketchStore, ensure_sketches, range_percentiles
+from ingest_worker import IngestWorker
+from category_rules import BAND_HEADERS, compile_rules, ensure_rule_columns
+from sku_inference import SkuInference
+from throughput import ThroughputTracker, ensure_throughput_tables, line_efficiency, downtime_between
+from tare import TareCompensator, ensure_tare_tables
+from weight_histogram import WeightHistogram, ensure_histograms, weight_histogram
+from anomaly_detector import ANOMALY_REMARK, AnomalyDetector
 
 # Coca‑Cola theme
 BACKGROUND_COLOR = "#FAFAFA"
@@ -25,16 +43,37 @@ TEXT_COLOR       = "#2B2B2B"
 SUBTEXT_COLOR    = "#555555"
 
 LICENSE_PROMPT_PATH = r"e:/bengalbevsmartweighingscalebottle-main/license_prompt.py"
+# End-of-shift/day reports are written here (see report_scheduler.SCHEDULED_REPORTS)
+REPORT_DIR = r"e:/bengalbevsmartweighingscalebottle-main/reports"
 
 
 class SmartWeighingScale:
     DB_PATH = r"E:\bengalbevsmartweighingscalebottle-main\scale.db"
+    # Records tab view -> rollup bucket granularity (None lists every bottle)
+    RECORD_VIEWS = {"Bottles": None, "Hourly": "hour", "By shift": "shift", "Daily": "day"}
 
     def __init__(self, master):
         self.master = master
+        self.query_cache = RecordQueryCache()
+        self.sku_inference = SkuInference()
+        self.tare = TareCompensator()
+        self.anomalies = AnomalyDetector()
+        self.export_jobs = ExportJobManager()
         self.create_database()
+        self.spc = SpcMonitor(self.db_path, on_alarm=lambda alarm: self.master.after(0, self.show_spc_alarm, alarm))
+        throughput = ThroughputTracker()
+        # Anomalous readings are still bottles on the line, so throughput sees them too
+        self.ingest_worker = IngestWorker(self.db_path, [self.spc, SketchStore(), throughput, WeightHistogram()],
+                                          anomaly_handlers=[throughput])
+        self.ingest_worker.start()
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
         self.check_license()
 
+    def on_close(self):
+        # Write out the analytics still held in memory (sketches, histograms, throughput)
+        self.ingest_worker.stop()
+        self.master.destroy()
+
     # ---------------- License flow ----------------
     def check_license(self):
         try:
@@ -55,6 +94,7 @@ class SmartWeighingScale:
                 self.app = Flask(__name__)
                 self.setup_flask_routes()
                 threading.Thread(target=self.app.run, kwargs={"host": "0.0.0.0", "port": 5000}, daemon=True).start()
+                ReportScheduler(self.db_path, REPORT_DIR).start()
                 self.create_main_window()
             else:
                 self.run_license_program()
@@ -73,18 +113,39 @@ class SmartWeighingScale:
         db_dir = os.path.join(os.path.expanduser("~"), ".smart_weighing_scale")
         os.makedirs(db_dir, exist_ok=True)
         full_db_path = os.path.join(db_dir, self.DB_PATH)
+        self.db_path = full_db_path
 
         self.conn = sqlite3.connect(full_db_path, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        # Reads from the Tk thread (statistics, grid pages, buckets) run several queries and fetch in
+        # chunks; on the shared cursor an ingest execute from the Flask thread would cut them short
+        self.stats_conn = sqlite3.connect(full_db_path)
 
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS records
                                (timestamp TEXT, weight REAL, category TEXT, remark TEXT)""")
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS categories
                                (name TEXT PRIMARY KEY, lower_limit REAL, upper_limit REAL)""")
+        # Optional reject/warning band limits
+        ensure_rule_columns(self.cursor)
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS license_keys
                                (id INTEGER PRIMARY KEY, license_key TEXT, expiry_date TEXT)""")
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS current_license_key
                                (id INTEGER PRIMARY KEY, license_key TEXT)""")
+        # Change counters used to validate cached query results
+        self.cursor.execute("""CREATE TABLE IF NOT EXISTS data_versions
+                               (name TEXT PRIMARY KEY, version INTEGER)""")
+        # Lets range queries stream in timestamp order without a sort step
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records (timestamp)")
+        # Back the sortable columns of the Records grid
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_weight ON records (weight)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_category ON records (category)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_records_remark ON records (remark)")
+        ensure_rollups(self.cursor)
+        ensure_sketches(self.cursor)
+        ensure_histograms(self.cursor)
+        ensure_throughput_tables(self.cursor)
+        ensure_tare_tables(self.cursor)
+        self.tare.load(self.cursor)
 
         # Seed categories
         self.cursor.execute("SELECT COUNT(*) FROM categories")
@@ -113,6 +174,8 @@ class SmartWeighingScale:
             self.cursor.execute("INSERT INTO current_license_key (license_key) VALUES (?)",
                                 ("LICENSE_KEY_BEFORE_AUG_2025",))
         self.conn.commit()
+        # Compiled category rules for the ingest path; replaced whole on change
+        self.rules = compile_rules(self.cursor)
 
     # ---------------- Style ----------------
     def create_style(self):
@@ -274,21 +337,37 @@ class SmartWeighingScale:
         vals = self.category_dropdown["values"]
         if vals:
             self.category_var.set(vals[0])
+        # Infer the category from each reading instead of the selection above
+        self.auto_category_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(form, text="Auto-detect", variable=self.auto_category_var, bg=ACCENT_COLOR,
+                       fg=SUBTEXT_COLOR, font=("Helvetica", 11)).pack(side="left", padx=(10, 0))
+
+        self.detected_var = tk.StringVar(value="")
+        self.detected_label = tk.Label(card, textvariable=self.detected_var, bg=ACCENT_COLOR, fg=SUBTEXT_COLOR,
+                                       font=("Helvetica", 11))
+        self.detected_label.grid(row=5, column=0)
+
+        self.spc_var = tk.StringVar(value="SPC: no alarms")
+        self.spc_label = tk.Label(card, textvariable=self.spc_var, bg=ACCENT_COLOR, fg=SUBTEXT_COLOR,
+                                  font=("Helvetica", 11))
+        self.spc_label.grid(row=6, column=0, pady=(0, 18))
 
     def setup_settings_tab(self):
         tk.Label(self.tab_settings, text="Bottle Categories", font=("Helvetica", 20, "bold"),
                  bg=BACKGROUND_COLOR, fg=TEXT_COLOR).pack(pady=20)
 
         self.cat_tree = ttk.Treeview(
-            self.tab_settings, columns=("Category Name", "Lower Limit", "Upper Limit"), show="headings"
+            self.tab_settings, columns=("Category Name", "Lower Limit", "Upper Limit") + tuple(BAND_HEADERS),
+            show="headings"
         )
         for col in self.cat_tree["columns"]:
             self.cat_tree.heading(col, text=col)
-            self.cat_tree.column(col, width=200)
+            self.cat_tree.column(col, width=200 if col == "Category Name" else 110)
         self.cat_tree.pack(padx=30, pady=10, fill="both")
 
         self.refresh_category_tree()
         ttk.Button(self.tab_settings, text="Upload Excel to Add Category", command=self.upload_excel).pack(pady=10)
+        ttk.Button(self.tab_settings, text="What-if limits", command=self.open_whatif_dialog).pack(pady=(0, 10))
 
     def setup_records_tab(self):
         tk.Label(self.tab_records, text="Records",
@@ -321,11 +400,21 @@ class SmartWeighingScale:
         tk.Label(date_frame, text=":", font=("Helvetica", 10), bg=BACKGROUND_COLOR).grid(row=0, column=12)
         self.to_time_second = ttk.Entry(date_frame, width=3, font=("Helvetica", 10)); self.to_time_second.grid(row=0, column=13); self.to_time_second.insert(0, "59")
 
+        tk.Label(date_frame, text="View", font=("Helvetica", 10), fg=TEXT_COLOR,
+                 bg=BACKGROUND_COLOR).grid(row=0, column=14, padx=(50, 10))
+        self.view_var = tk.StringVar(value="Bottles")
+        ttk.Combobox(date_frame, textvariable=self.view_var, state="readonly", width=10,
+                     values=list(self.RECORD_VIEWS)).grid(row=0, column=15)
+
         columns = ("Timestamp", "Captured value (kg)", "Bottle category", "Remark")
         self.records_tree = ttk.Treeview(self.tab_records, columns=columns, show="headings", height=12)
 
-        for col in columns:
-            self.records_tree.heading(col, text=col)
+        self.sort_column = "timestamp"
+        self.sort_desc = True
+        self.page_keys = [None]
+        self.next_page_key = None
+        for col, db_col in zip(columns, RECORD_COLUMNS):
+            self.records_tree.heading(col, text=col, command=lambda c=db_col: self.sort_records(c))
         self.records_tree.column("Timestamp", width=260)
         self.records_tree.column("Captured value (kg)", width=180)
         self.records_tree.column("Bottle category", width=220)
@@ -333,14 +422,56 @@ class SmartWeighingScale:
 
         self.records_tree.tag_configure('oddrow', background='#F8F9FA')
         self.records_tree.tag_configure('evenrow', background='#FFFFFF')
-        self.records_tree.pack(pady=(20, 18), padx=80, fill="both")
-
-        # Three action buttons
+        self.records_tree.pack(pady=(20, 6), padx=80, fill="both")
+
+        # Aggregated view: one row per hour/shift/day, double-click to drill down
+        agg_columns = ("Period", "Bottles", "Pass", "Fail", "Fail rate", "Mean weight", "Anomalies")
+        self.agg_tree = ttk.Treeview(self.tab_records, columns=agg_columns, show="headings", height=12)
+        for col in agg_columns:
+            self.agg_tree.heading(col, text=col)
+            self.agg_tree.column(col, width=120)
+        self.agg_tree.column("Period", width=220)
+        self.agg_tree.tag_configure('oddrow', background='#F8F9FA')
+        self.agg_tree.tag_configure('evenrow', background='#FFFFFF')
+        self.agg_tree.bind("<Double-1>", self.drill_down_bucket)
+        self.agg_buckets = {}
+
+        self.stats_var = tk.StringVar(value="")
+        stats_row = self.stats_row = tk.Frame(self.tab_records, bg=BACKGROUND_COLOR)
+        stats_row.pack(padx=80, pady=(0, 12), fill="x")
+        tk.Label(stats_row, textvariable=self.stats_var, font=("Helvetica", 10),
+                 fg=SUBTEXT_COLOR, bg=BACKGROUND_COLOR, anchor="w").pack(side="left")
+        self.page_var = tk.StringVar(value="")
+        ttk.Button(stats_row, text="Next ›", command=self.next_records_page).pack(side="right")
+        tk.Label(stats_row, textvariable=self.page_var, font=("Helvetica", 10),
+                 fg=SUBTEXT_COLOR, bg=BACKGROUND_COLOR).pack(side="right", padx=8)
+        ttk.Button(stats_row, text="‹ Prev", command=self.prev_records_page).pack(side="right")
+
+        # Action buttons
         button_frame = ttk.Frame(self.tab_records)
         button_frame.pack(pady=8)
         ttk.Button(button_frame, text="Show records", command=self.show_records).grid(row=0, column=0, padx=15)
         ttk.Button(button_frame, text="Export to Excel", command=self.export_to_excel).grid(row=0, column=1, padx=15)
         ttk.Button(button_frame, text="Export to PDF", command=self.export_to_pdf).grid(row=0, column=2, padx=15)
+        ttk.Button(button_frame, text="Export to CSV", command=self.export_to_csv).grid(row=0, column=3, padx=15)
+        ttk.Button(button_frame, text="Summary PDF", command=self.export_summary_pdf).grid(row=0, column=4, padx=15)
+        ttk.Button(button_frame, text="Excel report", command=self.export_excel_report).grid(row=0, column=5, padx=15)
+
+        # Background export jobs
+        jobs_frame = tk.Frame(self.tab_records, bg=BACKGROUND_COLOR)
+        jobs_frame.pack(padx=80, pady=(8, 12), fill="x")
+        job_columns = ("Export", "Status", "Progress", "ETA")
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=job_columns, show="headings", height=3)
+        for col in job_columns:
+            self.jobs_tree.heading(col, text=col)
+        self.jobs_tree.column("Export", width=320)
+        self.jobs_tree.column("Status", width=100)
+        self.jobs_tree.column("Progress", width=220)
+        self.jobs_tree.column("ETA", width=80)
+        self.jobs_tree.pack(side="left", fill="x", expand=True)
+        ttk.Button(jobs_frame, text="Cancel export", command=self.cancel_export_job).pack(side="left", padx=(15, 0))
+        self.reported_jobs = set()
+        self.refresh_export_jobs()
 
     # ---------------- Helpers ----------------
     def get_categories(self):
@@ -350,9 +481,10 @@ class SmartWeighingScale:
     def refresh_category_tree(self):
         for i in self.cat_tree.get_children():
             self.cat_tree.delete(i)
-        self.cursor.execute("SELECT name, lower_limit, upper_limit FROM categories")
+        self.cursor.execute("SELECT name, lower_limit, upper_limit, " + ", ".join(BAND_HEADERS.values())
+                            + " FROM categories")
         for row in self.cursor.fetchall():
-            self.cat_tree.insert("", tk.END, values=row)
+            self.cat_tree.insert("", tk.END, values=["" if v is None else v for v in row])
 
     def upload_excel(self):
         file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
@@ -364,23 +496,148 @@ class SmartWeighingScale:
             if not all(c in df.columns for c in expected):
                 messagebox.showerror("Error", "Missing columns in Excel file")
                 return
+            bands = [(header, column) for header, column in BAND_HEADERS.items() if header in df.columns]
+            sql = ("INSERT OR REPLACE INTO categories (name, lower_limit, upper_limit"
+                   + "".join(f", {column}" for _, column in bands)
+                   + ") VALUES (?, ?, ?" + ", ?" * len(bands) + ")")
             for _, r in df.iterrows():
                 self.cursor.execute(
-                    "INSERT OR REPLACE INTO categories (name, lower_limit, upper_limit) VALUES (?, ?, ?)",
-                    (str(r["Category"]), float(r["Lower Limit"]), float(r["Upper Limit"]))
+                    sql,
+                    [str(r["Category"]), float(r["Lower Limit"]), float(r["Upper Limit"])]
+                    + [None if pd.isna(r[header]) else float(r[header]) for header, _ in bands]
                 )
+            try:
+                rules = compile_rules(self.cursor)
+            except ValueError:
+                self.conn.rollback()
+                raise
+            bump_data_version(self.cursor, "categories")
             self.conn.commit()
+            self.rules = rules
             messagebox.showinfo("Success", "Categories updated successfully")
             self.refresh_category_tree()
             self.category_dropdown["values"] = self.get_categories()
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    # ---------------- What-if limits ----------------
+    def open_whatif_dialog(self):
+        """Preview limit changes on the Records tab range and optionally reclassify it."""
+        from_dt, to_dt = self._range_strings()
+        win = tk.Toplevel(self.master)
+        win.title("What-if limits")
+        win.configure(bg=BACKGROUND_COLOR)
+        tk.Label(win, text=f"Range: {from_dt} to {to_dt}", bg=BACKGROUND_COLOR, fg=SUBTEXT_COLOR)\
+            .grid(row=0, column=0, columnspan=4, padx=12, pady=(12, 6), sticky="w")
+
+        form = tk.Frame(win, bg=BACKGROUND_COLOR)
+        form.grid(row=1, column=0, columnspan=4, padx=12, sticky="w")
+        category_var = tk.StringVar(value=self.category_var.get())
+        lower_var = tk.StringVar()
+        upper_var = tk.StringVar()
+        tk.Label(form, text="Category", bg=BACKGROUND_COLOR).grid(row=0, column=0, sticky="w")
+        ttk.Combobox(form, textvariable=category_var, values=self.get_categories(), state="readonly",
+                     width=24).grid(row=0, column=1, padx=6, pady=2)
+        tk.Label(form, text="Lower limits", bg=BACKGROUND_COLOR).grid(row=1, column=0, sticky="w")
+        ttk.Entry(form, textvariable=lower_var, width=40).grid(row=1, column=1, padx=6, pady=2)
+        tk.Label(form, text="Upper limits", bg=BACKGROUND_COLOR).grid(row=2, column=0, sticky="w")
+        ttk.Entry(form, textvariable=upper_var, width=40).grid(row=2, column=1, padx=6, pady=2)
+        tk.Label(form, text="Comma-separated values are swept in every combination",
+                 bg=BACKGROUND_COLOR, fg=SUBTEXT_COLOR).grid(row=3, column=1, sticky="w", padx=6)
+
+        columns = ("Lower", "Upper", "Pass", "Fail", "Fail rate", "Change in fails")
+        tree = ttk.Treeview(win, columns=columns, show="headings", height=12)
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=110, anchor="e")
+        tree.grid(row=2, column=0, columnspan=4, padx=12, pady=8)
+        status_var = tk.StringVar()
+        tk.Label(win, textvariable=status_var, bg=BACKGROUND_COLOR, fg=SUBTEXT_COLOR)\
+            .grid(row=3, column=0, columnspan=4, padx=12, sticky="w")
+
+        loaded = {}
+
+        def limits_of(category):
+            self.cursor.execute("SELECT lower_limit, upper_limit FROM categories WHERE name=?", (category,))
+            return self.cursor.fetchone()
+
+        def preview():
+            category = category_var.get()
+            current = limits_of(category)
+            if not current:
+                messagebox.showerror("Error", "Select a category", parent=win)
+                return
+            try:
+                lowers = [float(v) for v in lower_var.get().split(",") if v.strip()] or [current[0]]
+                uppers = [float(v) for v in upper_var.get().split(",") if v.strip()] or [current[1]]
+            except ValueError:
+                messagebox.showerror("Error", "Limits must be numbers", parent=win)
+                return
+            if loaded.get("key") != (category, from_dt, to_dt):
+                loaded["key"] = (category, from_dt, to_dt)
+                # Own connection: ingest on the shared cursor would cut the chunked load short
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    loaded["whatif"] = WhatIf.load(conn.cursor(), from_dt, to_dt, category)
+                finally:
+                    conn.close()
+            whatif = loaded["whatif"]
+            base_fail = int(whatif.counts(current[0], current[1])[1])
+            tree.delete(*tree.get_children())
+            for lo, hi, n_pass, n_fail, rate in whatif.sweep(lowers, uppers):
+                tree.insert("", tk.END, values=(f"{lo:g}", f"{hi:g}", n_pass, n_fail, f"{rate:.2%}",
+                                                f"{n_fail - base_fail:+d}"))
+            status_var.set(f"{len(whatif):,} bottles; current limits {current[0]:g}-{current[1]:g} "
+                           f"give {base_fail:,} fails")
+
+        def apply_current_limits():
+            category = category_var.get()
+            current = limits_of(category)
+            if not current:
+                messagebox.showerror("Error", "Select a category", parent=win)
+                return
+            if not messagebox.askyesno(
+                    "Reclassify", f"Rewrite Pass/Fail for every {category} bottle from {from_dt} to {to_dt} "
+                                  f"using the current limits {current[0]:g}-{current[1]:g}?", parent=win):
+                return
+
+            def work(job):
+                conn = sqlite3.connect(self.db_path)
+                try:
+                    reclassify(conn, category, current[0], current[1], from_dt, to_dt, progress=job.report)
+                finally:
+                    conn.close()
+
+            self.export_jobs.submit(f"Reclassify {category}", work)
+            loaded.clear()
+
+        ttk.Button(win, text="Preview", command=preview).grid(row=4, column=0, padx=12, pady=12, sticky="w")
+        ttk.Button(win, text="Reclassify range with current limits", command=apply_current_limits)\
+            .grid(row=4, column=1, pady=12, sticky="w")
+
     # ---------------- Live reading ----------------
-    def display_remote_weight(self, weight, remark):
+    def display_remote_weight(self, weight, remark, band=None):
         self.weight_var.set(f"{weight:.4f} g")
         bg = "#28A745" if remark == "Pass" else PRIMARY_COLOR
-        self.result_label.config(text=remark, bg=bg, fg="white")
+        text = remark
+        if band == "warn":
+            bg, text = "#E0A800", "Pass (warning)"
+        elif band == "reject":
+            text = "Fail (reject)"
+        self.result_label.config(text=text, bg=bg, fg="white")
+
+    def show_detected_category(self, category, ambiguous):
+        if ambiguous:
+            self.detected_var.set(f"Detected: {category} (overlapping limits - check category)")
+            self.detected_label.config(fg=PRIMARY_COLOR)
+        else:
+            self.detected_var.set(f"Detected: {category}")
+            self.detected_label.config(fg=SUBTEXT_COLOR)
+
+    def show_spc_alarm(self, alarm):
+        self.spc_var.set(f"SPC alarm {alarm['timestamp']} - {alarm['station']} / {alarm['category']}: "
+                         f"{alarm['message']}")
+        self.spc_label.config(fg=PRIMARY_COLOR)
 
     def setup_flask_routes(self):
         SCALE = self
@@ -388,93 +645,307 @@ class SmartWeighingScale:
         @self.app.route('/send_weight', methods=['GET'])
         def receive_weight():
             try:
-                weight = float(request.args.get('weight'))
+                raw_weight = float(request.args.get('weight'))
+                station = request.args.get('station', 'default')
+                if SCALE.tare.is_idle(raw_weight):
+                    # Empty scale: track the zero baseline, nothing to classify
+                    baseline = SCALE.tare.update_baseline(SCALE.cursor, station, raw_weight)
+                    SCALE.conn.commit()
+                    return jsonify({"result": "idle", "baseline": baseline})
+                weight = SCALE.tare.correct(station, raw_weight)
                 category = SCALE.category_var.get()
+                rules = SCALE.rules
+                auto = SCALE.auto_category_var.get()
+                if auto:
+                    category, ambiguous = SCALE.sku_inference.infer(rules, station, weight, fallback=category)
                 if not category:
                     return jsonify({"result": "fail", "error": "No category selected"}), 400
-
-                SCALE.cursor.execute("SELECT lower_limit, upper_limit FROM categories WHERE name=?", (category,))
-                limits = SCALE.cursor.fetchone()
-                if not limits:
+                if category not in rules:
                     return jsonify({"result": "fail", "error": "Category not found"}), 400
 
-                lo, hi = limits
-                remark = "Pass" if lo <= weight <= hi else "Fail"
+                lo, hi = rules.limits(category)
+                anomaly = SCALE.anomalies.check(station, category, weight, lo, hi)
+                if anomaly:
+                    # Implausible spike: rejected, but kept out of the pass/fail and weight statistics
+                    band, remark = "anomaly", ANOMALY_REMARK
+                else:
+                    band, remark = rules.evaluate(category, weight)
 
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 SCALE.cursor.execute(
-                    "INSERT INTO records (timestamp, weight, category, remark) VALUES (?, ?, ?, ?)",
-                    (timestamp, weight, category, remark)
+                    "INSERT INTO records (timestamp, weight, category, remark, raw_weight) VALUES (?, ?, ?, ?, ?)",
+                    (timestamp, weight, category, remark, raw_weight)
                 )
+                add_to_rollup(SCALE.cursor, timestamp, weight, category, remark)
                 SCALE.conn.commit()
-
-                SCALE.master.after(0, SCALE.display_remote_weight, weight, remark)
-                return jsonify({"result": remark.lower()})
+                SCALE.ingest_worker.submit(station, category, weight, lo, hi, timestamp, anomaly)
+
+                SCALE.master.after(0, SCALE.display_remote_weight, weight, remark, band)
+                if auto:
+                    SCALE.master.after(0, SCALE.show_detected_category, category, ambiguous)
+                    return jsonify({"result": remark.lower(), "band": band, "category": category,
+                                    "ambiguous": ambiguous})
+                return jsonify({"result": remark.lower(), "band": band})
             except Exception as ex:
                 return jsonify({"result": "fail", "error": str(ex)}), 400
 
+        def json_query(query, needs_range=True):
+            """Run ``query(cursor, from_dt, to_dt)`` on its own connection and return the result as JSON."""
+            from_dt = request.args.get('from')
+            to_dt = request.args.get('to')
+            if needs_range and (not from_dt or not to_dt):
+                return jsonify({"error": "'from' and 'to' are required"}), 400
+            conn = sqlite3.connect(SCALE.db_path)
+            try:
+                return jsonify(query(conn.cursor(), from_dt, to_dt))
+            except Exception as ex:
+                return jsonify({"error": str(ex)}), 400
+            finally:
+                conn.close()
+
+        @self.app.route('/stats', methods=['GET'])
+        def range_stats():
+            return json_query(lambda cursor, from_dt, to_dt: range_statistics(
+                cursor, from_dt, to_dt, request.args.get('category')))
+
+        @self.app.route('/percentiles', methods=['GET'])
+        def percentiles():
+            def query(cursor, from_dt, to_dt):
+                ps = [float(p) for p in request.args.get('p', '1,5,50,95,99').split(',')]
+                return range_percentiles(cursor, from_dt, to_dt, ps,
+                                         request.args.get('category'), request.args.get('station'))
+            return json_query(query)
+
+        @self.app.route('/histogram', methods=['GET'])
+        def histogram():
+            return json_query(lambda cursor, from_dt, to_dt: weight_histogram(
+                cursor, from_dt, to_dt, request.args.get('category'), int(request.args.get('bins', 30))))
+
+        @self.app.route('/throughput', methods=['GET'])
+        def throughput():
+            def query(cursor, from_dt, to_dt):
+                station = request.args.get('station')
+                buckets = line_efficiency(cursor, from_dt, to_dt, request.args.get('granularity', 'shift'), station)
+                stops = [{"station": st, "start": start, "end": end, "seconds": sec}
+                         for st, start, end, sec in downtime_between(cursor, from_dt, to_dt, station)]
+                return {"buckets": buckets, "downtime": stops}
+            return json_query(query)
+
+        @self.app.route('/alarms', methods=['GET'])
+        def spc_alarms():
+            return json_query(lambda cursor, from_dt, to_dt: {"alarms": read_alarms(
+                cursor, int(request.args.get('since', 0)), request.args.get('station'),
+                int(request.args.get('limit', 100)))}, needs_range=False)
+
+        @self.app.route('/records', methods=['GET'])
+        def stream_records():
+            from_dt = request.args.get('from')
+            to_dt = request.args.get('to')
+            fmt = request.args.get('format', 'ndjson')
+            if not from_dt or not to_dt:
+                return jsonify({"error": "'from' and 'to' are required"}), 400
+            if fmt not in ("ndjson", "csv"):
+                return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+            category = request.args.get('category')
+            # Honours q-values, so "gzip;q=0" means no
+            use_gzip = request.accept_encodings["gzip"] > 0
+
+            def generate():
+                # Own connection so a long download never holds the ingest cursor
+                conn = sqlite3.connect(SCALE.db_path)
+                zipper = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+
+                def encode(text):
+                    data = text.encode("utf-8")
+                    if zipper:
+                        data = zipper.compress(data)
+                    if data:
+                        yield data
+
+                try:
+                    if fmt == "csv":
+                        yield from encode(",".join(RECORD_COLUMNS) + "\r\n")
+                    for chunk in iter_records(conn.cursor(), from_dt, to_dt, category):
+                        if fmt == "csv":
+                            buf = io.StringIO()
+                            csv.writer(buf).writerows(chunk)
+                            text = buf.getvalue()
+                        else:
+                            text = "".join(json.dumps(dict(zip(RECORD_COLUMNS, row))) + "\n" for row in chunk)
+                        yield from encode(text)
+                    if zipper:
+                        yield zipper.flush()
+                finally:
+                    conn.close()
+
+            mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+            headers = {"Content-Encoding": "gzip"} if use_gzip else {}
+            return Response(generate(), mimetype=mimetype, headers=headers)
+
     # ---------------- Records actions ----------------
     def _range_strings(self):
         from_dt = f"{self.from_date.get_date().strftime('%Y-%m-%d')} {self.from_time_hour.get()}:{self.from_time_minute.get()}:{self.from_time_second.get()}"
         to_dt   = f"{self.to_date.get_date().strftime('%Y-%m-%d')} {self.to_time_hour.get()}:{self.to_time_minute.get()}:{self.to_time_second.get()}"
         return from_dt, to_dt
 
-    def _fetch_records(self, from_dt, to_dt):
-        self.cursor.execute("""
-            SELECT timestamp, weight, category, remark FROM records
-            WHERE timestamp BETWEEN ? AND ?
-            ORDER BY timestamp DESC
-        """, (from_dt, to_dt))
-        return self.cursor.fetchall()
+    def _fetch_stats(self, from_dt, to_dt):
+        cursor = self.stats_conn.cursor()
+        return self.query_cache.get_or_load(cursor, ("stats", from_dt, to_dt), from_dt, to_dt,
+                                            lambda: range_statistics(cursor, from_dt, to_dt))
+
+    def _stats_text(self, stats):
+        if not stats["count"] + stats["anomaly"]:
+            return "No records in range"
+        text = f"Bottles: {stats['count']}   Pass: {stats['pass']}   Fail: {stats['fail']}"
+        if stats["anomaly"]:
+            text += f"   Sensor anomalies: {stats['anomaly']}"
+        if not stats["count"]:
+            return text
+        text += f"   Mean: {stats['mean']:.4f}"
+        if stats["std"] is not None:
+            text += f"   Std dev: {stats['std']:.4f}"
+        text += f"   Min: {stats['min']:.4f}   Max: {stats['max']:.4f}"
+        return text
 
     def show_records(self):
+        granularity = self.RECORD_VIEWS[self.view_var.get()]
+        if granularity:
+            self._show_grid(self.agg_tree, self.records_tree)
+            self._load_buckets(granularity)
+        else:
+            self._show_grid(self.records_tree, self.agg_tree)
+            self.page_keys = [None]
+            self._load_records_page()
+        from_dt, to_dt = self._range_strings()
+        self.stats_var.set(self._stats_text(self._fetch_stats(from_dt, to_dt)))
+
+    def _show_grid(self, shown, hidden):
+        if hidden.winfo_manager():
+            hidden.pack_forget()
+        if not shown.winfo_manager():
+            shown.pack(pady=(20, 6), padx=80, fill="both", before=self.stats_row)
+
+    def _load_buckets(self, granularity):
+        self.agg_tree.delete(*self.agg_tree.get_children())
+        self.agg_buckets = {}
+        from_dt, to_dt = self._range_strings()
+        cursor = self.stats_conn.cursor()
+        buckets = self.query_cache.get_or_load(
+            cursor, ("buckets", from_dt, to_dt, granularity), from_dt, to_dt,
+            lambda: bucket_rollups(cursor, from_dt, to_dt, granularity))
+        for i, (label, first, last, n, n_pass, n_fail, fail_rate, mean, n_anomaly) in enumerate(buckets):
+            tag = 'evenrow' if i % 2 == 0 else 'oddrow'
+            item = self.agg_tree.insert("", tk.END, tags=(tag,), values=(
+                label, n, n_pass, n_fail, f"{fail_rate:.2%}", f"{mean:.4f}", n_anomaly))
+            self.agg_buckets[item] = (first, last)
+        self.page_var.set("")
+
+    def drill_down_bucket(self, event):
+        item = self.agg_tree.identify_row(event.y)
+        if item not in self.agg_buckets:
+            return
+        first, last = self.agg_buckets[item]
+        self._set_range(first, last)
+        self.view_var.set("Bottles")
+        self.show_records()
+
+    def _set_range(self, from_dt, to_dt):
+        for ts, date_entry, fields in (
+            (from_dt, self.from_date, (self.from_time_hour, self.from_time_minute, self.from_time_second)),
+            (to_dt, self.to_date, (self.to_time_hour, self.to_time_minute, self.to_time_second)),
+        ):
+            dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+            date_entry.set_date(dt.date())
+            for entry, value in zip(fields, (dt.hour, dt.minute, dt.second)):
+                entry.delete(0, tk.END)
+                entry.insert(0, f"{value:02d}")
+
+    def _load_records_page(self):
         self.records_tree.delete(*self.records_tree.get_children())
         from_dt, to_dt = self._range_strings()
-        rows = self._fetch_records(from_dt, to_dt)
+        after = self.page_keys[-1]
+        key = ("page", from_dt, to_dt, self.sort_column, self.sort_desc, after)
+        cursor = self.stats_conn.cursor()
+        rows, self.next_page_key = self.query_cache.get_or_load(
+            cursor, key, from_dt, to_dt,
+            lambda: fetch_page(cursor, from_dt, to_dt, self.sort_column, self.sort_desc, after))
         for i, row in enumerate(rows):
             tag = 'evenrow' if i % 2 == 0 else 'oddrow'
             self.records_tree.insert("", tk.END, values=row, tags=(tag,))
+        self.page_var.set(f"Page {len(self.page_keys)}")
+
+    def next_records_page(self):
+        if self.next_page_key is None or not self.records_tree.winfo_manager():
+            return
+        self.page_keys.append(self.next_page_key)
+        self._load_records_page()
+
+    def prev_records_page(self):
+        if len(self.page_keys) <= 1 or not self.records_tree.winfo_manager():
+            return
+        self.page_keys.pop()
+        self._load_records_page()
+
+    def sort_records(self, column):
+        if column == self.sort_column:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_column, self.sort_desc = column, column == "timestamp"
+        arrow = " ▼" if self.sort_desc else " ▲"
+        for col, db_col in zip(self.records_tree["columns"], RECORD_COLUMNS):
+            self.records_tree.heading(col, text=col + (arrow if db_col == column else ""))
+        self.page_keys = [None]
+        self._load_records_page()
 
     def export_to_excel(self):
         from_dt, to_dt = self._range_strings()
-        data = self._fetch_records(from_dt, to_dt)
-        if not data:
+        stats = self._fetch_stats(from_dt, to_dt)
+        total = stats["count"] + stats["anomaly"]
+        if not total:
             messagebox.showinfo("Info", "No data to export")
             return
 
-        df = pd.DataFrame(data, columns=["Timestamp", "Captured value (kg)", "Bottle category", "Remark"])
-
-        # Summary
-        self.cursor.execute("""
-            SELECT remark, COUNT(*) FROM records
-            WHERE timestamp BETWEEN ? AND ?
-            GROUP BY remark
-        """, (from_dt, to_dt))
-        summary = {"Pass": 0, "Fail": 0}
-        for remark, count in self.cursor.fetchall():
-            summary[remark] = count
-
-        summary_rows = [
-            ["", "", "Summary", ""],
-            ["", "", "Number of Pass", summary.get("Pass", 0)],
-            ["", "", "Number of Fail", summary.get("Fail", 0)],
-        ]
-        out_df = pd.concat([df, pd.DataFrame(summary_rows, columns=df.columns)], ignore_index=True)
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
+                                                 filetypes=[("Excel files", "*.xlsx")])
+        if not file_path:
+            return
+
+        def work(job):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                write_excel(conn.cursor(), job.temp_path, from_dt, to_dt, stats, progress=job.report)
+            finally:
+                conn.close()
+
+        self.export_jobs.submit(f"Excel {os.path.basename(file_path)}", work, file_path)
+
+    def export_excel_report(self):
+        from_dt, to_dt = self._range_strings()
+        stats = self._fetch_stats(from_dt, to_dt)
+        total = stats["count"] + stats["anomaly"]
+        if not total:
+            messagebox.showinfo("Info", "No data to export")
+            return
 
         file_path = filedialog.asksaveasfilename(defaultextension=".xlsx",
                                                  filetypes=[("Excel files", "*.xlsx")])
         if not file_path:
             return
-        try:
-            out_df.to_excel(file_path, index=False)
-            messagebox.showinfo("Success", "Data exported successfully")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        def work(job):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                write_excel_report(conn.cursor(), job.temp_path, from_dt, to_dt, stats, progress=job.report)
+            finally:
+                conn.close()
+
+        self.export_jobs.submit(f"Excel report {os.path.basename(file_path)}", work, file_path)
 
     def export_to_pdf(self):
         from_dt, to_dt = self._range_strings()
-        rows = self._fetch_records(from_dt, to_dt)
-        if not rows:
+        stats = self._fetch_stats(from_dt, to_dt)
+        total = stats["count"] + stats["anomaly"]
+        if not total:
             messagebox.showinfo("Info", "No data to export")
             return
 
@@ -483,107 +954,74 @@ class SmartWeighingScale:
         if not out_path:
             return
 
-        try:
-            self._render_pdf(out_path, rows, from_dt, to_dt)
-            messagebox.showinfo("Success", "PDF exported successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export PDF: {e}")
+        def work(job):
+            render_range_pdf(self.db_path, job.temp_path, from_dt, to_dt, total, progress=job.report)
 
-    # ---------------- PDF rendering ----------------
-    def _render_pdf(self, filepath, rows, from_dt, to_dt):
-        page_w, page_h = A4
-        margin_l = 15*mm
-        margin_r = 15*mm
-        margin_b = 18*mm
+        self.export_jobs.submit(f"PDF {os.path.basename(out_path)}", work, out_path, unit="pages")
 
-        header_h = 22*mm
-        row_h = 8.5*mm
-        max_rows_per_page = 20
+    def export_summary_pdf(self):
+        from_dt, to_dt = self._range_strings()
+        stats = self._fetch_stats(from_dt, to_dt)
+        total = stats["count"] + stats["anomaly"]
+        if not total:
+            messagebox.showinfo("Info", "No data to export")
+            return
 
-        cols = [
-            ("Timestamp", 0.34),
-            ("Captured value (kg)", 0.20),
-            ("Bottle category", 0.26),
-            ("Remark", 0.20),
-        ]
-        table_w = page_w - margin_l - margin_r
+        out_path = filedialog.asksaveasfilename(defaultextension=".pdf",
+                                                filetypes=[("PDF files", "*.pdf")])
+        if not out_path:
+            return
 
-        c = canvas.Canvas(filepath, pagesize=A4)
+        def work(job):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                render_summary_pdf(conn.cursor(), job.temp_path, from_dt, to_dt, progress=job.report)
+            finally:
+                conn.close()
 
-        try:
-            coca_reader = ImageReader("coca_logo.png")
-        except Exception:
-            coca_reader = None
-        try:
-            bengal_reader = ImageReader("bengal_beverages.png")
-        except Exception:
-            bengal_reader = None
-
-        def draw_header():
-            c.setFillColor(colors.HexColor(PRIMARY_COLOR))
-            c.rect(0, page_h - header_h, page_w, header_h, fill=1, stroke=0)
-
-            c.setFillColor(colors.white)
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(margin_l, page_h - header_h + 12*mm, "Smart Weighing Scale — Report")
-            c.setFont("Helvetica", 9)
-            c.drawString(margin_l, page_h - header_h + 8*mm, f"From: {from_dt}   To: {to_dt}")
-            c.drawString(margin_l, page_h - header_h + 4*mm, datetime.now().strftime("Generated: %Y-%m-%d %H:%M:%S"))
-
-            if coca_reader:
-                c.drawImage(coca_reader, page_w - margin_r - 35*mm, page_h - header_h + 5*mm,
-                            width=35*mm, height=12*mm, mask='auto')
-            if bengal_reader:
-                c.drawImage(bengal_reader, page_w - margin_r - 50*mm, page_h - header_h + 5*mm,
-                            width=12*mm, height=12*mm, mask='auto')
-
-        def draw_table_header(y):
-            c.setFillColor(colors.HexColor(PRIMARY_COLOR))
-            c.rect(margin_l, y - row_h, table_w, row_h, fill=1, stroke=0)
-            c.setFillColor(colors.white)
-            c.setFont("Helvetica-Bold", 9)
-            x = margin_l
-            for title, frac in cols:
-                w = table_w * frac
-                c.drawString(x + 2.5*mm, y - row_h + 2.8*mm, title)
-                x += w
-
-        def draw_row(y, row, odd):
-            bg = colors.HexColor("#FFF5F6") if odd else colors.white
-            c.setFillColor(bg)
-            c.rect(margin_l, y - row_h, table_w, row_h, fill=1, stroke=0)
-            c.setFillColor(colors.black)
-            c.setFont("Helvetica", 9)
-            x = margin_l
-            data = [str(row[0]), f"{row[1]:.4f}", str(row[2]), str(row[3])]
-            for (title, frac), idx in zip(cols, range(len(cols))):
-                w = table_w * frac
-                c.drawString(x + 2.5*mm, y - row_h + 2.8*mm, data[idx])
-                x += w
-
-        total = len(rows)
-        pages = (total + max_rows_per_page - 1) // max_rows_per_page
-
-        idx = 0
-        for p in range(pages):
-            draw_header()
-            y = page_h - header_h - 10*mm
-            draw_table_header(y)
-            y_start = y - 2
-
-            for r in range(max_rows_per_page):
-                if idx >= total:
-                    break
-                y_row = y_start - r*row_h
-                draw_row(y_row, rows[idx], odd=bool(idx % 2))
-                idx += 1
-
-            c.setFont("Helvetica", 9)
-            c.setFillColor(colors.HexColor(SUBTEXT_COLOR))
-            c.drawRightString(page_w - margin_r, margin_b/2, f"Page {p+1}/{pages}")
-            c.showPage()
-
-        c.save()
+        self.export_jobs.submit(f"Summary {os.path.basename(out_path)}", work, out_path, unit="steps")
+
+    def export_to_csv(self):
+        from_dt, to_dt = self._range_strings()
+        stats = self._fetch_stats(from_dt, to_dt)
+        total = stats["count"] + stats["anomaly"]
+        if not total:
+            messagebox.showinfo("Info", "No data to export")
+            return
+
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                                 filetypes=[("CSV files", "*.csv"),
+                                                            ("Compressed CSV files", "*.csv.gz")])
+        if not file_path:
+            return
+
+        def work(job):
+            conn = sqlite3.connect(self.db_path)
+            try:
+                write_csv(conn.cursor(), job.temp_path, from_dt, to_dt, total=total, progress=job.report)
+            finally:
+                conn.close()
+
+        self.export_jobs.submit(f"CSV {os.path.basename(file_path)}", work, file_path)
+
+    def refresh_export_jobs(self):
+        # Update rows in place; re-inserting them would drop the selection "Cancel export" acts on
+        for job in list(self.export_jobs.jobs):
+            eta = job.eta_seconds()
+            values = (job.name, job.status, job.progress_text(),
+                      "" if eta is None else f"{int(eta) // 60}:{int(eta) % 60:02d}")
+            if self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.item(str(job.id), values=values)
+            else:
+                self.jobs_tree.insert("", 0, iid=str(job.id), values=values)
+            if job.status == "Failed" and job.id not in self.reported_jobs:
+                self.reported_jobs.add(job.id)
+                messagebox.showerror("Error", f"{job.name} failed: {job.error}")
+        self.master.after(500, self.refresh_export_jobs)
+
+    def cancel_export_job(self):
+        for item in self.jobs_tree.selection():
+            self.export_jobs.cancel(int(item))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+Fixed-bin weight histograms per hour and category.
+
+Every reading adds one to its ``BIN_WIDTH`` gram bin in ``rollup_histogram``
+for its hour and category; ``WeightHistogram`` is the ``ingest_worker``
+handler that keeps those counts.  A range query sums the stored bins of
+the hours it overlaps and merges neighbouring fine bins into the number of
+bins asked for, so a distribution over a day or a month reads a few
+thousand small rows and never ``records``.  Ranges are answered at hour
+resolution: partial hours at the edges count whole.
+"""
+import math
+
+import numpy as np
+
+from anomaly_detector import ANOMALY_REMARK
+from records_query import iter_records
+
+BIN_WIDTH = 0.5
+DEFAULT_BINS = 30
+
+
+def bin_of(weight):
+    return math.floor(weight / BIN_WIDTH)
+
+
+def ensure_histograms(cursor):
+    cursor.execute("""CREATE TABLE IF NOT EXISTS rollup_histogram
+                      (hour TEXT, category TEXT, bin INTEGER, n INTEGER,
+                       PRIMARY KEY (hour, category, bin))""")
+    cursor.execute("SELECT 1 FROM rollup_histogram LIMIT 1")
+    if cursor.fetchone() is None:
+        rebuild_histograms(cursor)
+
+
+def rebuild_histograms(cursor):
+    cursor.execute("DELETE FROM rollup_histogram")
+    counts = {}
+    for chunk in iter_records(cursor.connection.cursor(), columns=("timestamp", "category", "weight"),
+                              chunk_size=100_000, descending=False, exclude_remark=ANOMALY_REMARK):
+        for ts, category, weight in chunk:
+            key = (ts[:13], category, bin_of(weight))
+            counts[key] = counts.get(key, 0) + 1
+    cursor.executemany("INSERT INTO rollup_histogram (hour, category, bin, n) VALUES (?, ?, ?, ?)",
+                       [key + (n,) for key, n in counts.items()])
+
+
+class WeightHistogram:
+    """``ingest_worker`` handler adding readings to the hourly bins."""
+
+    def __init__(self):
+        self.pending = {}
+
+    def process(self, cursor, station, category, weight, lower, upper, timestamp):
+        key = (timestamp[:13], category, bin_of(weight))
+        self.pending[key] = self.pending.get(key, 0) + 1
+
+    def flush(self, cursor):
+        if not self.pending:
+            return
+        cursor.executemany("""
+            INSERT INTO rollup_histogram (hour, category, bin, n) VALUES (?, ?, ?, ?)
+            ON CONFLICT(hour, category, bin) DO UPDATE SET n = n + excluded.n
+        """, [key + (n,) for key, n in self.pending.items()])
+        self.pending = {}
+
+
+# ---------------- Queries ----------------
+def weight_histogram(cursor, from_dt, to_dt, category=None, bins=DEFAULT_BINS):
+    """Return the weight distribution of the hours overlapping a range.
+
+    The result holds the hour-aligned range actually covered, the total
+    count, the bin width and a list of {"from", "to", "count"} bins spanning
+    the lightest to the heaviest reading.  Bins are whole multiples of
+    ``BIN_WIDTH``, so a narrow distribution may come back with fewer bins
+    than asked for.
+    """
+    if bins < 1:
+        raise ValueError("bins must be at least 1")
+    sql = "SELECT bin, SUM(n) FROM rollup_histogram WHERE hour BETWEEN ? AND ?"
+    params = [from_dt[:13], to_dt[:13]]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    cursor.execute(sql + " GROUP BY bin ORDER BY bin", params)
+    rows = cursor.fetchall()
+    result = {"from": from_dt[:13] + ":00:00", "to": to_dt[:13] + ":59:59", "category": category,
+              "count": 0, "bin_width": None, "bins": []}
+    if not rows:
+        return result
+
+    fine, counts = np.array(rows, dtype=np.int64).T
+    first = int(fine[0])
+    step = -(-(int(fine[-1]) - first + 1) // bins)
+    merged = np.bincount((fine - first) // step, weights=counts).astype(np.int64)
+    result["count"] = int(counts.sum())
+    result["bin_width"] = step * BIN_WIDTH
+    result["bins"] = [{"from": (first + i * step) * BIN_WIDTH, "to": (first + (i + 1) * step) * BIN_WIDTH,
+                       "count": int(n)} for i, n in enumerate(merged)]
+    return result